@@ -6,81 +6,134 @@ Usage style:
 - Build once (PyInstaller).
 - After that, only edit the external config.json and .env in syncservice_dist.
 - On each run, .env values override config.json.
+- Both files are watched while running; DSN and pool changes apply to new
+  DB connections without a restart.
 - DB DSN = DB_DSN in .env (if set) else "dsn" in config.json.
 - DNS hostname = DNS_NAME in .env (optional).
-- Always auto-select IP and run migrations.
+- Auto-select IP (both probes bounded by "ip_probe_timeout") and run
+  migrations. With "fast_start" (default on) a fixed "ip" skips probing and
+  migrate only runs when the schema fingerprint changed; a startup timing
+  breakdown is printed either way.
+- "server": "threaded" in config.json serves through sync.server (worker
+  pool, keep-alive, graceful stop), "asgi" through uvicorn with the async
+  views; otherwise Django's runserver.
+- "settings": "django_sync.settings_api" serves only the sync API through a
+  short middleware chain (no admin/sessions).
+- Writes syncservice.pid next to the exe (see sync.supervisor); a second
+  copy started while that PID is alive exits immediately.
 """
 
-import json
+import atexit
+import hashlib
 import os
 import socket
 import sys
+import threading
 import time
 from typing import List, Tuple
 
+from sync.config import _strip_comment, get_config
+
 # ----------------------------- helpers ---------------------------------------
 def _exe_dir() -> str:
     if getattr(sys, "frozen", False):
         return os.path.dirname(sys.executable)
     return os.path.dirname(os.path.abspath(__file__))
 
-def _strip_comment(s: str) -> str:
-    if not isinstance(s, str):
-        return s
-    return s.split("#", 1)[0].strip()
-
 # ----------------------------- config ----------------------------------------
+# config.json/.env are parsed by sync.config.ServiceConfig, the same cached
+# object sql_helper reads, so edits are picked up without a restart.
 def load_config(exe_dir: str) -> dict:
-    cfg_path = os.path.join(exe_dir, "config.json")
-    cfg = {
-        "ip": "auto",
-        "port": 8000,
-        "dsn": None,
-        "settings": "django_sync.settings",
-        "env_file": ".env"
-    }
-    if os.path.isfile(cfg_path):
-        with open(cfg_path, "r", encoding="utf-8") as f:
-            user = json.load(f) or {}
-        cfg.update(user)
-    if cfg.get("dsn"):
-        cfg["dsn"] = _strip_comment(cfg["dsn"])
-    return cfg
+    return dict(get_config([exe_dir]).snapshot())
 
 def load_env(exe_dir: str, filename: str) -> dict:
-    path = os.path.join(exe_dir, filename)
-    loaded = {}
-    if os.path.isfile(path):
-        with open(path, "r", encoding="utf-8") as f:
-            for line in f:
-                line = line.strip()
-                if not line or line.startswith("#") or "=" not in line:
-                    continue
-                k, v = line.split("=", 1)
-                k, v = k.strip(), _strip_comment(v.strip())
-                os.environ[k] = v   # overwrite each run
-                loaded[k] = v
+    cfg = get_config([exe_dir])
+    loaded = cfg.env_values
+    for k, v in loaded.items():
+        if k.startswith("DB_"):
+            continue        # sql_helper reads these live from the config object
+        os.environ[k] = v   # overwrite each run (Django settings read os.environ)
     return loaded
 
+# ----------------------------- single instance --------------------------------
+def claim_pid_file(exe_dir: str) -> bool:
+    """
+    Record this process in syncservice.pid; False if another live instance
+    owns it. psutil is only imported when the file names some other process.
+    """
+    from sync.supervisor import PID_FILE, pid_file_alive, read_pid_file, write_pid_file
+    path = os.path.join(exe_dir, PID_FILE)
+    entry = read_pid_file(path)
+    # a onefile build runs under its bootloader, whose PID the supervisor recorded
+    if entry is not None and entry[0] not in (os.getpid(), os.getppid()):
+        owner = pid_file_alive(path)
+        if owner is not None:
+            print(f"🔄 SyncService already running (PID {owner}), exiting", flush=True)
+            return False
+    write_pid_file(path)
+
+    def _release():
+        entry = read_pid_file(path)
+        if entry is not None and entry[0] == os.getpid():
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+    atexit.register(_release)
+    return True
+
+# ----------------------------- startup timing --------------------------------
+class StartupTimer:
+    """Wall time per startup step, printed as one line before serving."""
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.steps = []
+
+    def step(self, name: str, since: float):
+        self.steps.append((name, time.perf_counter() - since))
+
+    def report(self) -> str:
+        total = time.perf_counter() - self.started
+        parts = ", ".join(f"{name} {secs * 1000:.0f}ms" for name, secs in self.steps)
+        return f"⏱️ Startup {total * 1000:.0f}ms: {parts}"
+
 # ----------------------------- IP auto-pick ----------------------------------
-def ipv4_candidates() -> list[str]:
-    cands = []
+def _probe_default_route(out: list):
+    s = None
     try:
         s = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
-        s.connect(("8.8.8.8", 80))
-        cands.append(s.getsockname()[0])
+        s.connect(("8.8.8.8", 80))     # UDP: no packet is sent, only a route lookup
+        out.append(s.getsockname()[0])
     except Exception:
         pass
     finally:
-        try: s.close()
-        except: pass
+        if s is not None:
+            s.close()
+
+def _probe_hostname(out: list):
     try:
         for info in socket.getaddrinfo(socket.gethostname(), None, socket.AF_INET):
             ip = info[4][0]
             if ip and ip != "127.0.0.1":
-                cands.append(ip)
+                out.append(ip)
     except Exception:
         pass
+
+def ipv4_candidates(timeout: float = 1.0) -> list[str]:
+    """
+    Both probes run side by side and are given `timeout` seconds in total;
+    a hostname lookup stuck on an offline LAN is abandoned (daemon thread).
+    """
+    route, host = [], []
+    probes = [threading.Thread(target=_probe_default_route, args=(route,), daemon=True),
+              threading.Thread(target=_probe_hostname, args=(host,), daemon=True)]
+    deadline = time.monotonic() + timeout
+    for t in probes:
+        t.start()
+    for t in probes:
+        t.join(max(0.0, deadline - time.monotonic()))
+    cands = list(route) + list(host)
     seen, uniq = set(), []
     for ip in cands:
         if ip not in seen:
@@ -88,9 +141,9 @@ def ipv4_candidates() -> list[str]:
             uniq.append(ip)
     return uniq
 
-def select_bind_ip(port: int) -> Tuple[str, list[str]]:
+def select_bind_ip(port: int, timeout: float = 1.0) -> Tuple[str, list[str]]:
     tried = []
-    for ip in ipv4_candidates():
+    for ip in ipv4_candidates(timeout):
         tried.append(ip)
         try:
             s = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
@@ -114,27 +167,125 @@ def apply_migrations():
     from django.core.management import call_command
     call_command("migrate", interactive=False, verbosity=1)
 
-def run_server(bind_ip: str, port: int):
+def schema_fingerprint() -> str:
+    """Hash of Django's version, the installed apps and their migration names."""
+    import pkgutil
+    from importlib import import_module
+
+    import django
+    from django.apps import apps
+    from django.conf import settings
+
+    h = hashlib.sha256(django.get_version().encode())
+    h.update(repr(settings.DATABASES["default"].get("NAME")).encode())
+    for app in apps.get_app_configs():
+        h.update(app.label.encode())
+        try:
+            package = import_module(f"{app.name}.migrations")
+        except ImportError:
+            continue
+        for name in sorted(m.name for m in pkgutil.iter_modules(package.__path__)):
+            h.update(name.encode())
+    return h.hexdigest()[:16]
+
+def _migrations_applied() -> bool:
+    """True if the DB already has Django's migration table (a 0-byte file has none)."""
+    from django.db import connection
+    try:
+        return "django_migrations" in connection.introspection.table_names()
+    except Exception:
+        return False
+
+def migrate_if_needed(exe_dir: str) -> bool:
+    """
+    Run migrate only when the schema fingerprint differs from the one stored
+    after the last successful run, or the DB has never been migrated.
+    The stamp lives next to the DB file (exe_dir if the DB has no file), so
+    a fresh DB - e.g. a --onefile build's new extraction - is not mistaken
+    for a migrated one. Returns True if migrate ran.
+    """
+    from django.conf import settings
+
+    db_name = str(settings.DATABASES["default"].get("NAME") or "")
+    stamp_dir = os.path.dirname(os.path.abspath(db_name)) if db_name else exe_dir
+    stamp = os.path.join(stamp_dir, ".schema_fingerprint")
+    current = schema_fingerprint()
+    try:
+        with open(stamp, "r", encoding="utf-8") as f:
+            stored = f.read().strip()
+    except OSError:
+        stored = None
+    if stored == current and _migrations_applied():
+        return False
+    apply_migrations()
+    try:
+        with open(stamp, "w", encoding="utf-8") as f:
+            f.write(current)
+    except OSError:
+        pass
+    return True
+
+def run_server(bind_ip: str, port: int, cfg: dict | None = None):
+    """
+    "server": "threaded"  -> sync.server.ThreadedWSGIServer (production)
+    "server": "asgi"      -> uvicorn + async views (sync/async_views.py)
+    "server": "runserver" -> Django's development server (default)
+    """
+    cfg = cfg or {}
+    mode = cfg.get("server", "runserver")
+    if mode == "asgi":
+        import uvicorn
+        from django_sync.asgi import application
+        print(f"⚡ ASGI server (uvicorn), DB executor {cfg.get('async_db_workers') or cfg.get('pool_max_size', 10)} "
+              f"threads", flush=True)
+        uvicorn.run(
+            application, host=bind_ip, port=port, lifespan="off",
+            backlog=int(cfg.get("server_backlog", 128)),
+            timeout_keep_alive=int(cfg.get("server_keepalive_timeout", 5)),
+            timeout_graceful_shutdown=int(cfg.get("server_shutdown_timeout", 10)),
+        )
+        return
+    if mode == "threaded":
+        from django_sync.wsgi import application
+        from sync.server import ThreadedWSGIServer
+        httpd = ThreadedWSGIServer.from_config((bind_ip, port), application, cfg)
+        print(f"🧵 Threaded server: {httpd.threads} workers, "
+              f"backlog {httpd.request_queue_size}, keep-alive {httpd.keepalive_timeout:g}s", flush=True)
+        httpd.serve()
+        return
     from django.core.management import call_command
     call_command("runserver", f"{bind_ip}:{port}", use_reloader=False)
 
 # ----------------------------- Main ------------------------------------------
 def main():
+    timer = StartupTimer()
     exe_dir = _exe_dir()
+    if not claim_pid_file(exe_dir):
+        sys.exit(0)
+    t = time.perf_counter()
     cfg = load_config(exe_dir)
     env_loaded = load_env(exe_dir, cfg.get("env_file", ".env"))
+    timer.step("config", t)
+    fast_start = bool(cfg.get("fast_start", True))
 
-    # DB DSN: .env overrides config.json
-    dsn = os.environ.get("DB_DSN", cfg.get("dsn") or "")
-    os.environ["DB_DSN"] = _strip_comment(dsn)
+    # DB DSN: .env overrides config.json. Not pinned into os.environ so a
+    # later config.json edit still reaches sql_helper.
     os.environ["DB_UID"] = os.getenv("DB_UID", "dba")
     os.environ["DB_PWD"] = os.getenv("DB_PWD", "(*$^)")
 
     proj_root = exe_dir
+    t = time.perf_counter()
     bootstrap_django(cfg.get("settings", "django_sync.settings"), proj_root)
+    timer.step("django", t)
 
     port = int(cfg.get("port", 8000))
-    bind_ip, tried = select_bind_ip(port)
+    t = time.perf_counter()
+    fixed_ip = cfg.get("ip", "auto")
+    if fast_start and fixed_ip not in ("", "auto", None):
+        bind_ip, tried = fixed_ip, [fixed_ip]        # configured address: no probing
+    else:
+        bind_ip, tried = select_bind_ip(port, float(cfg.get("ip_probe_timeout", 1.0)))
+    timer.step("ip", t)
 
     dns_name = _strip_comment(os.getenv("DNS_NAME", "")) or None
 
@@ -145,8 +296,14 @@ def main():
         print(f"🌍 DNS_NAME: {dns_name}")
         print(f"🔗 http://{dns_name}:{port}/")
     print(f"🔎 IP selection: tried={tried}, chosen={bind_ip}")
-    print("⚙️ Applying migrations...")
-    apply_migrations()
+    t = time.perf_counter()
+    if fast_start:
+        if not migrate_if_needed(exe_dir):
+            print("⚙️ Schema unchanged, migrations skipped")
+    else:
+        print("⚙️ Applying migrations...")
+        apply_migrations()
+    timer.step("migrate", t)
 
     import django
     from datetime import datetime
@@ -157,8 +314,9 @@ def main():
     if dns_name:
         print(f"(Also via http://{dns_name}:{port}/)")
     print("Quit with CTRL-BREAK.")
+    print(timer.report(), flush=True)
 
-    run_server(bind_ip, port)
+    run_server(bind_ip, port, cfg)
 
 if __name__ == "__main__":
     main()
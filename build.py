@@ -25,6 +25,7 @@ REQUIREMENTS = [
     "djangorestframework",
     "djangorestframework-simplejwt",
     "django-cors-headers",
+    "uvicorn",                            # "server": "asgi"
 ]
 
 # === Paths ===================================================================
@@ -106,6 +107,7 @@ def build():
         "--collect-all", "django",
         "--collect-submodules", "django",
         "--collect-submodules", "django_sync",
+        "--collect-submodules", "uvicorn",   # loads its protocol/loop modules by name
     ]
 
     # Ensure Django can import settings at build time (some hooks call django.setup())
@@ -9,8 +9,12 @@ https://docs.djangoproject.com/en/4.2/howto/deployment/asgi/
 
 import os
 
+from django.conf import settings
 from django.core.asgi import get_asgi_application
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'django_sync.settings')
 
 application = get_asgi_application()
+# async views (sync/async_views.py) instead of the blocking ones; set on this
+# process's settings only, so child processes keep the default URLconf
+settings.ROOT_URLCONF = settings.ASGI_ROOT_URLCONF
@@ -0,0 +1,11 @@
+"""
+URL configuration used by the ASGI application (see asgi.py): the same
+routes as urls.py, with the sync app served by its async views.
+"""
+from django.contrib import admin
+from django.urls import path, include
+
+urlpatterns = [
+    path("admin/", admin.site.urls),
+    path("", include("sync.async_urls")),
+]
@@ -38,6 +38,8 @@ INSTALLED_APPS = [
 # ---------- MIDDLEWARE ----------
 MIDDLEWARE = [
     "corsheaders.middleware.CorsMiddleware",        # MUST be top
+    "sync.middleware.ServerTimingMiddleware",       # Server-Timing header (db/rows/json phases)
+    "sync.middleware.CompressionMiddleware",        # gzip/br for JSON, cached per ETag
     "django.middleware.security.SecurityMiddleware",
     "django.contrib.sessions.middleware.SessionMiddleware",
     "django.middleware.common.CommonMiddleware",
@@ -48,6 +50,7 @@ MIDDLEWARE = [
 ]
 
 ROOT_URLCONF = "django_sync.urls"
+ASGI_ROOT_URLCONF = "django_sync.asgi_urls"     # asgi.py swaps it in
 
 # ---------- TEMPLATES ----------
 TEMPLATES = [
@@ -0,0 +1,45 @@
+"""
+API-only settings profile ("settings": "django_sync.settings_api" in config.json)
+
+The tablets only call the sync.urls routes: every view is csrf_exempt or
+GET-only and authenticates with its own JWT, so the browser middleware
+(sessions, CSRF, auth, messages, clickjacking, security headers) is pure
+per-request overhead for them. This profile keeps everything from
+settings.py but
+
+  • routes straight to sync.urls / sync.async_urls (no /admin/)
+  • drops the admin, sessions, messages and staticfiles apps
+  • runs the short MIDDLEWARE chain below
+
+Use the default django_sync.settings when the Django admin is needed.
+`python manage.py bench_sync --middleware` measures the difference.
+"""
+from .settings import *  # noqa: F401,F403
+from .settings import INSTALLED_APPS, TEMPLATES
+
+BROWSER_APPS = (
+    "django.contrib.admin",
+    "django.contrib.sessions",
+    "django.contrib.messages",
+    "django.contrib.staticfiles",
+)
+
+INSTALLED_APPS = [app for app in INSTALLED_APPS if app not in BROWSER_APPS]
+
+MIDDLEWARE = [
+    "corsheaders.middleware.CorsMiddleware",        # MUST be top
+    "sync.middleware.ServerTimingMiddleware",
+    "sync.middleware.CompressionMiddleware",
+    "django.middleware.common.CommonMiddleware",    # APPEND_SLASH, as before
+]
+
+# same views as the full profile, minus the admin
+ROOT_URLCONF = "sync.urls"
+ASGI_ROOT_URLCONF = "sync.async_urls"
+
+TEMPLATES = [
+    {**TEMPLATES[0], "OPTIONS": {"context_processors": [
+        "django.template.context_processors.debug",
+        "django.template.context_processors.request",
+    ]}},
+]
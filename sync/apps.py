@@ -4,3 +4,10 @@ from django.apps import AppConfig
 class SyncConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'sync'
+
+    def ready(self):
+        import sys
+
+        from .logs import configure_logging
+        # `manage.py test` must not write logs/syncservice.log into the source tree
+        configure_logging(log_file=sys.argv[1:2] != ["test"])
@@ -0,0 +1,8 @@
+from django.urls import path
+from . import async_views, urls
+
+# same routes and names as urls.py, pointing at the async wrappers
+urlpatterns = [
+    path(str(p.pattern), getattr(async_views, p.callback.__name__), name=p.name)
+    for p in urls.urlpatterns
+]
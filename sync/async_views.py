@@ -0,0 +1,73 @@
+"""
+Async versions of the sync endpoints, served under ASGI
+
+Under ASGI Django runs plain sync views one at a time on a single shared
+thread, so the views in views.py are wrapped here into coroutines that hand
+the blocking work (JWT check, pooled sqlanydb query, serialization) to a
+bounded executor. A request waiting for the database, or for a worker, is
+just a suspended coroutine, so one process can keep many tablets in flight;
+only `async_db_workers` threads (default: pool_max_size) ever touch the DB.
+
+Streamed lists become async iterators that fetch each batch on the same
+executor, so a slow reader holds no thread between chunks.
+
+async_urls.py mirrors urls.py with these views; django_sync/asgi.py selects
+it. The sync views stay the WSGI path.
+"""
+import asyncio
+import contextvars
+import functools
+
+from . import views
+from .executors import ResizableExecutor
+
+_executor = ResizableExecutor(
+    "async-db",
+    lambda cfg: cfg.get("async_db_workers") or cfg.get("pool_max_size", 10),
+)
+_get_executor = _executor.get
+_DONE = object()
+
+
+async def run_blocking(func, *args, **kwargs):
+    """await func(*args, **kwargs) on the DB executor, in the caller's context (timings)."""
+    call = functools.partial(contextvars.copy_context().run, func, *args, **kwargs)
+    return await asyncio.get_running_loop().run_in_executor(_get_executor(), call)
+
+
+async def _offloaded_chunks(chunks):
+    iterator = iter(chunks)
+    while True:
+        chunk = await run_blocking(next, iterator, _DONE)
+        if chunk is _DONE:
+            return
+        yield chunk
+
+
+def offloaded(view):
+    """Coroutine view running the sync `view` on the DB executor."""
+    @functools.wraps(view)
+    async def _async_view(request, *args, **kwargs):
+        response = await run_blocking(view, request, *args, **kwargs)
+        if response.streaming and not response.is_async:
+            # the original body's close() (cursor back to the pool) stays registered
+            response.streaming_content = _offloaded_chunks(response.streaming_content)
+        return response
+    return _async_view
+
+
+pair_check = offloaded(views.pair_check)
+login = offloaded(views.login)
+verify_token = offloaded(views.verify_token)
+get_status = offloaded(views.get_status)
+get_items = offloaded(views.get_items)
+get_item_image = offloaded(views.get_item_image)
+get_dine_tables = offloaded(views.get_dine_tables)
+get_user_settings = offloaded(views.get_user_settings)
+get_dine_categories = offloaded(views.get_dine_categories)
+get_bootstrap = offloaded(views.get_bootstrap)
+submit_kot = offloaded(views.submit_kot)
+invalidate_cache = offloaded(views.invalidate_cache)
+cache_stats = offloaded(views.cache_stats)
+query_stats_view = offloaded(views.query_stats_view)
+get_metrics = offloaded(views.get_metrics)
@@ -0,0 +1,268 @@
+"""
+Per-endpoint micro-benchmarks for the sync API
+
+Every endpoint is driven through the Django test client (full middleware
+stack, no sockets) against the SQLite stand-in from db_backends, seeded at
+each catalog size. Per request we keep the wall time plus the db / rows /
+json phases reported in the Server-Timing header.
+
+    python manage.py bench_sync                       # run + compare to baseline
+    python manage.py bench_sync --save-baseline       # run + store as new baseline
+    python manage.py bench_sync --sizes 100,5000 --iterations 200
+    python manage.py bench_sync --middleware          # full vs API-only middleware
+
+All times in the report and baseline are milliseconds.
+"""
+import importlib
+import json
+import os
+import platform
+import tempfile
+import time
+from datetime import datetime
+
+from django.conf import settings
+from django.test import Client, override_settings
+
+from .cache import DEFAULT_TTL
+from .config import get_config
+from .timing import parse_server_timing
+
+DEFAULT_SIZES = (100, 1000, 5000)
+DEFAULT_BASELINE = os.path.join(settings.BASE_DIR, "bench_baseline.json")
+PHASES = ("db", "rows", "json")
+
+LOGIN_BODY = json.dumps({"userid": "USER01", "password": "1234"})
+
+# (name, method, path, GET params or POST body, needs token)
+ENDPOINTS = [
+    ("login",           "post", "/login",            LOGIN_BODY,                 False),
+    ("verify-token",    "get",  "/verify-token",     None,                       True),
+    ("status",          "get",  "/status",           None,                       False),
+    ("items",           "get",  "/items/",           None,                       True),
+    ("items?item_code", "get",  "/items/",           {"item_code": "I00001"},    True),
+    ("items?stream",    "get",  "/items/",           {"stream": "1"},            True),
+    ("items?limit=100", "get",  "/items/",           {"limit": "100"},           True),
+    ("items?columnar",  "get",  "/items/",           {"format": "columnar"},     True),
+    ("dine-tables",     "get",  "/dine-tables/",     None,                       True),
+    ("user-settings",   "get",  "/user-settings/",   {"uid": "USER01"},          True),
+    ("dine-categories", "get",  "/dine-categories/", None,                       True),
+    ("bootstrap",       "get",  "/bootstrap/",       None,                       True),
+]
+
+
+# settings modules compared by run_middleware_benchmark
+MIDDLEWARE_PROFILES = (("full", "django_sync.settings"), ("api", "django_sync.settings_api"))
+MIDDLEWARE_ENDPOINTS = ("status", "verify-token", "items?item_code")
+
+
+# every request reaches the DB: no master-data cache, no ETag shortcut
+UNCACHED = {"cache_ttl": {"default": 0, **{name: 0 for name in DEFAULT_TTL}}, "etag_ttl": 0}
+
+
+def percentile(values, pct):
+    """Nearest-rank percentile of an unsorted list (pct in 0..100)."""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    k = max(0, min(len(ordered) - 1, int(round(pct / 100.0 * len(ordered) + 0.5)) - 1))
+    return ordered[k]
+
+
+def _summarize(walls, phases, size_bytes):
+    ms = lambda secs: round(secs * 1000.0, 4)
+    out = {
+        "n": len(walls),
+        "bytes": size_bytes,
+        "p50": ms(percentile(walls, 50)),
+        "p90": ms(percentile(walls, 90)),
+        "p99": ms(percentile(walls, 99)),
+        "mean": ms(sum(walls) / len(walls)) if walls else 0.0,
+    }
+    for name in PHASES:
+        samples = phases[name]
+        out[f"{name}_p50"] = ms(percentile(samples, 50))
+        out[f"{name}_p99"] = ms(percentile(samples, 99))
+    return out
+
+
+def _call(client, method, path, params, headers):
+    if method == "post":
+        return client.post(path, params, content_type="application/json", **headers)
+    return client.get(path, params or {}, **headers)
+
+
+def _drain(resp):
+    """Body size in bytes; streaming bodies are read to the end (and timed)."""
+    if not resp.streaming:
+        return len(resp.content)
+    try:
+        return sum(len(chunk) for chunk in resp.streaming_content)
+    finally:
+        resp.close()
+
+
+def bench_endpoint(client, method, path, params, headers, iterations, warmup):
+    for _ in range(warmup):
+        _drain(_call(client, method, path, params, headers))
+    walls, phases, size_bytes = [], {name: [] for name in PHASES}, 0
+    for _ in range(iterations):
+        started = time.perf_counter()
+        resp = _call(client, method, path, params, headers)
+        size_bytes = _drain(resp)
+        walls.append(time.perf_counter() - started)
+        if resp.status_code != 200:
+            raise RuntimeError(f"{method.upper()} {path} returned {resp.status_code}")
+        timing = parse_server_timing(resp.get("Server-Timing"))
+        for name in PHASES:
+            phases[name].append(timing.get(name, 0.0))
+    return _summarize(walls, phases, size_bytes)
+
+
+def run_benchmarks(sizes=DEFAULT_SIZES, iterations=50, warmup=5, endpoints=None, config=None, log=None):
+    """
+    Returns {"meta": {...}, "results": {"<size>": {"<endpoint>": stats}}}.
+    Caches are off (UNCACHED) so every request measures the DB; `config`
+    adds config.json overrides (e.g. sqlite_query_latency_ms).
+    """
+    selected = [e for e in ENDPOINTS if not endpoints or e[0] in endpoints]
+    results = {}
+    with tempfile.TemporaryDirectory() as tmp:
+        for size in sizes:
+            overrides = {
+                "db_backend": "sqlite",
+                "sqlite_path": os.path.join(tmp, f"bench_{size}.sqlite3"),
+                "sqlite_seed": {"items": size, "tables": max(10, size // 25)},
+                **UNCACHED,
+                **(config or {}),
+            }
+            with get_config().override(**overrides):
+                client = Client()
+                login = client.post("/login", LOGIN_BODY, content_type="application/json")
+                if login.status_code != 200:
+                    raise RuntimeError(f"Benchmark login failed: {login.content[:200]!r}")
+                auth = {"HTTP_AUTHORIZATION": f"Bearer {login.json()['token']}"}
+                per_size = results[str(size)] = {}
+                for name, method, path, params, needs_token in selected:
+                    if log:
+                        log(f"  size={size:<6} {name}")
+                    per_size[name] = bench_endpoint(
+                        client, method, path, params, auth if needs_token else {},
+                        iterations, warmup,
+                    )
+    return {
+        "meta": {
+            "created": datetime.now().isoformat(timespec="seconds"),
+            "python": platform.python_version(),
+            "machine": platform.node(),
+            "iterations": iterations,
+        },
+        "results": results,
+    }
+
+
+def run_middleware_benchmark(iterations=200, warmup=20, endpoints=MIDDLEWARE_ENDPOINTS, size=100,
+                             config=None, log=None):
+    """
+    The same requests through each MIDDLEWARE_PROFILES chain (and URLconf);
+    cheap endpoints, so the difference is the middleware cost per request.
+    Returns {"meta": {...}, "results": {"<profile>": {"<endpoint>": stats}}}.
+    """
+    selected = [e for e in ENDPOINTS if e[0] in endpoints]
+    results = {}
+    with tempfile.TemporaryDirectory() as tmp:
+        overrides = {
+            "db_backend": "sqlite",
+            "sqlite_path": os.path.join(tmp, "bench_middleware.sqlite3"),
+            "sqlite_seed": {"items": size, "tables": max(10, size // 25)},
+            **(config or {}),
+        }
+        with get_config().override(**overrides):
+            for profile, module in MIDDLEWARE_PROFILES:
+                mod = importlib.import_module(module)
+                with override_settings(MIDDLEWARE=mod.MIDDLEWARE, ROOT_URLCONF=mod.ROOT_URLCONF):
+                    client = Client()
+                    login = client.post("/login", LOGIN_BODY, content_type="application/json")
+                    auth = {"HTTP_AUTHORIZATION": f"Bearer {login.json()['token']}"}
+                    per_profile = results[profile] = {}
+                    for name, method, path, params, needs_token in selected:
+                        if log:
+                            log(f"  profile={profile:<5} {name}")
+                        per_profile[name] = bench_endpoint(
+                            client, method, path, params, auth if needs_token else {},
+                            iterations, warmup,
+                        )
+    return {
+        "meta": {
+            "created": datetime.now().isoformat(timespec="seconds"),
+            "python": platform.python_version(),
+            "iterations": iterations,
+            "middleware": {p: len(importlib.import_module(m).MIDDLEWARE) for p, m in MIDDLEWARE_PROFILES},
+        },
+        "results": results,
+    }
+
+
+def format_middleware_report(run):
+    (base, _), (lean, _) = MIDDLEWARE_PROFILES
+    header = f"{'endpoint':<16} {base + ' p50':>10} {lean + ' p50':>10} {'saved':>9} {'saved %':>8}"
+    lines = [header, "-" * len(header)]
+    for name, full in run["results"][base].items():
+        api = run["results"][lean][name]
+        saved = full["p50"] - api["p50"]
+        pct = saved / full["p50"] * 100 if full["p50"] else 0.0
+        lines.append(f"{name:<16} {full['p50']:>10.3f} {api['p50']:>10.3f} {saved:>9.3f} {pct:>7.0f}%")
+    counts = run["meta"]["middleware"]
+    lines.append(f"(milliseconds; {counts[base]} vs {counts[lean]} middleware)")
+    return "\n".join(lines)
+
+
+def compare(run, baseline, tolerance=0.25, min_delta_ms=0.5):
+    """
+    Regressions of `run` against `baseline`: an endpoint whose p50 grew by
+    more than `tolerance` (fraction) *and* by more than `min_delta_ms`.
+    """
+    regressions = []
+    for size, endpoints in run["results"].items():
+        for name, stats in endpoints.items():
+            base = baseline.get("results", {}).get(size, {}).get(name)
+            if not base:
+                continue
+            delta = stats["p50"] - base["p50"]
+            if delta > min_delta_ms and stats["p50"] > base["p50"] * (1 + tolerance):
+                regressions.append(
+                    f"size={size} {name}: p50 {base['p50']:.3f}ms -> {stats['p50']:.3f}ms "
+                    f"(+{delta / base['p50'] * 100 if base['p50'] else 0:.0f}%)"
+                )
+    return regressions
+
+
+def format_report(run, baseline=None):
+    header = (f"{'size':>6} {'endpoint':<16} {'p50':>9} {'p90':>9} {'p99':>9} "
+              f"{'db':>8} {'rows':>8} {'json':>8} {'bytes':>9} {'vs base':>8}")
+    lines = [header, "-" * len(header)]
+    for size, endpoints in run["results"].items():
+        for name, s in endpoints.items():
+            vs = ""
+            base = (baseline or {}).get("results", {}).get(size, {}).get(name)
+            if base and base["p50"]:
+                vs = f"{(s['p50'] / base['p50'] - 1) * 100:+.0f}%"
+            lines.append(
+                f"{size:>6} {name:<16} {s['p50']:>9.3f} {s['p90']:>9.3f} {s['p99']:>9.3f} "
+                f"{s['db_p50']:>8.3f} {s['rows_p50']:>8.3f} {s['json_p50']:>8.3f} "
+                f"{s['bytes']:>9} {vs:>8}"
+            )
+    lines.append("(milliseconds; db/rows/json are p50 of the Server-Timing phases)")
+    return "\n".join(lines)
+
+
+def load_baseline(path=DEFAULT_BASELINE):
+    if not os.path.isfile(path):
+        return None
+    with open(path, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+def save_baseline(run, path=DEFAULT_BASELINE):
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(run, f, indent=2, sort_keys=True)
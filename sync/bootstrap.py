@@ -0,0 +1,44 @@
+"""
+Everything a tablet needs after login, in one round trip
+
+GET /bootstrap/ returns items, tables, categories and the user's settings
+together. The four queries run side by side on a small worker pool (each on
+its own pooled connection, through the master-data cache), so the first
+screen waits for the slowest query instead of the sum of four requests.
+
+config.json:
+  "bootstrap_workers": 4      # capped at pool_max_size
+"""
+import contextvars
+
+from .executors import ResizableExecutor
+from .timing import merge_parallel, run_timed
+
+_executor = ResizableExecutor(
+    "bootstrap",
+    lambda cfg: min(int(cfg.get("bootstrap_workers", 4)), int(cfg.get("pool_max_size", 10))),
+)
+_get_executor = _executor.get
+
+
+def load_sections(sections):
+    """
+    Run dataset.load(params) for every (dataset, params) in `sections`
+    concurrently. Returns {dataset name: (rows, fingerprint)}; the first
+    failing query's exception is raised.
+    """
+    executor = _get_executor()
+    # each worker times into its own dict; merged below, once all are done
+    futures = {
+        dataset.name: executor.submit(contextvars.copy_context().run, run_timed, dataset.load, params)
+        for dataset, params in sections
+    }
+    out, parts = {}, []
+    try:
+        for name, future in futures.items():
+            (rows, version, _), timings = future.result()
+            out[name] = (rows, version)
+            parts.append(timings)
+    finally:
+        merge_parallel(parts)
+    return out
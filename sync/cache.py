@@ -0,0 +1,138 @@
+"""
+Read-through cache for master data
+
+Menu items, tables, categories and user settings hardly change during a
+service, so the rows (and their fingerprint) are kept in process memory and
+served from there until their TTL runs out or someone invalidates them via
+POST /cache/invalidate after a menu edit.
+
+  • key      - dataset + filter (item_code, tableno, uid, catagorycode) + page
+  • TTL      - per dataset, config.json "cache_ttl": {"items": 300, ...};
+               0 turns caching off for that dataset
+  • memory   - LRU bounded by "cache_max_bytes" (rough size of the rows)
+  • herd     - concurrent misses for the same key share one DB query
+"""
+import threading
+import time
+from collections import OrderedDict
+
+from .config import get_config
+from .db_backends import get_backend
+
+DEFAULT_TTL = {"items": 300, "tables": 300, "categories": 300, "settings": 60}
+DEFAULT_MAX_BYTES = 64 * 1024 * 1024
+
+
+def _approx_size(rows):
+    return 64 + sum(len(repr(r)) + 56 for r in rows)
+
+
+class _Flight:
+    __slots__ = ("event", "value")
+
+    def __init__(self):
+        self.event = threading.Event()
+        self.value = None
+
+
+class MasterDataCache:
+    def __init__(self):
+        self._entries = OrderedDict()     # key -> (value, expires_at, size)
+        self._bytes = 0
+        self._inflight = {}
+        self._generations = {}            # dataset name -> bumped on invalidate
+        self._source = None               # backend key the entries came from
+        self._lock = threading.Lock()
+        self.hits = {}
+        self.misses = {}
+
+    def ttl_for(self, name):
+        ttls = get_config().get("cache_ttl") or {}
+        return float(ttls.get(name, ttls.get("default", DEFAULT_TTL.get(name, 0))))
+
+    def get_or_load(self, name, key, loader):
+        """
+        Cached value for (name, key), else loader() - which must return
+        (rows, fingerprint) - stored for the dataset's TTL.
+        """
+        ttl = self.ttl_for(name)
+        if ttl <= 0:
+            return loader()
+        full_key = (name,) + tuple(key)
+        source = get_backend().key
+        if source != self._source:
+            self.invalidate()             # DSN/backend changed: nothing cached is valid
+            self._source = source
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(full_key)
+            if entry is not None and entry[1] > now:
+                self._entries.move_to_end(full_key)
+                self.hits[name] = self.hits.get(name, 0) + 1
+                return entry[0]
+            self.misses[name] = self.misses.get(name, 0) + 1
+            flight = self._inflight.get(full_key)
+            leader = flight is None
+            if leader:
+                flight = self._inflight[full_key] = _Flight()
+            generation = self._generations.get(name, 0)
+
+        if not leader:
+            flight.event.wait(timeout=30)
+            if flight.value is not None:
+                return flight.value
+            return loader()               # leader failed; try ourselves
+
+        try:
+            value = loader()
+            flight.value = value
+            self._store(name, full_key, value, ttl, generation)
+            return value
+        finally:
+            flight.event.set()
+            with self._lock:
+                self._inflight.pop(full_key, None)
+
+    def _store(self, name, full_key, value, ttl, generation):
+        size = _approx_size(value[0])
+        limit = int(get_config().get("cache_max_bytes", DEFAULT_MAX_BYTES))
+        if size > limit:
+            return
+        with self._lock:
+            if self._generations.get(name, 0) != generation:
+                return                    # invalidated while we were loading
+            old = self._entries.pop(full_key, None)
+            if old is not None:
+                self._bytes -= old[2]
+            self._entries[full_key] = (value, time.monotonic() + ttl, size)
+            self._bytes += size
+            while self._bytes > limit and self._entries:
+                _, evicted = self._entries.popitem(last=False)
+                self._bytes -= evicted[2]
+
+    def invalidate(self, name=None):
+        """Drop one dataset (or everything); returns the number of entries removed."""
+        with self._lock:
+            keys = [k for k in self._entries if name is None or k[0] == name]
+            for k in keys:
+                self._bytes -= self._entries.pop(k)[2]
+            names = [name] if name else set(self._generations) | {k[0] for k in keys} | set(DEFAULT_TTL)
+            for n in names:
+                self._generations[n] = self._generations.get(n, 0) + 1
+            return len(keys)
+
+    def stats(self):
+        with self._lock:
+            per = {}
+            for k, (_, _, size) in self._entries.items():
+                s = per.setdefault(k[0], {"entries": 0, "bytes": 0})
+                s["entries"] += 1
+                s["bytes"] += size
+            for name in set(self.hits) | set(self.misses) | set(per):
+                s = per.setdefault(name, {"entries": 0, "bytes": 0})
+                s["hits"] = self.hits.get(name, 0)
+                s["misses"] = self.misses.get(name, 0)
+            return {"bytes": self._bytes, "entries": len(self._entries), "datasets": per}
+
+
+master_cache = MasterDataCache()
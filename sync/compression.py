@@ -0,0 +1,117 @@
+"""
+Response compression with a cache of pre-compressed bodies
+
+The catalog JSON (image paths and longname included) is large and changes
+rarely, so compressing it on every request is wasted CPU. Bodies that carry
+an ETag (a content fingerprint, see datasets.fingerprint) are compressed
+once per (URL, content type, ETag, encoding) and then served from a
+byte-bounded LRU until the data changes. Bodies without an ETag are
+compressed per request; bodies below `compress_min_bytes` are left alone.
+
+Brotli is used when the optional `brotli` package is installed and the
+client asks for it; gzip otherwise.
+
+config.json:
+  "compress_min_bytes": 1024
+  "compress_cache_bytes": 33554432
+  "gzip_level": 6
+  "brotli_quality": 6
+"""
+import gzip
+import threading
+from collections import OrderedDict
+
+try:
+    import brotli
+    BROTLI_AVAILABLE = True
+except ImportError:
+    BROTLI_AVAILABLE = False
+
+from .config import get_config
+
+
+def _accepted(header):
+    """{"gzip": 1.0, "br": 0.5, ...} from an Accept-Encoding header."""
+    out = {}
+    for part in (header or "").split(","):
+        coding, _, params = part.strip().partition(";")
+        coding = coding.strip().lower()
+        if not coding:
+            continue
+        q = 1.0
+        params = params.strip()
+        if params.startswith("q="):
+            try:
+                q = float(params[2:])
+            except ValueError:
+                q = 0.0
+        out[coding] = q
+    return out
+
+
+def choose_encoding(accept_encoding):
+    """Best of br/gzip the client accepts, or None."""
+    accepted = _accepted(accept_encoding)
+    wildcard = accepted.get("*", 0.0)
+    candidates = (["br"] if BROTLI_AVAILABLE else []) + ["gzip"]
+    best, best_q = None, 0.0
+    for coding in candidates:
+        q = accepted.get(coding, wildcard)
+        if q > best_q:
+            best, best_q = coding, q
+    return best
+
+
+def compress(body, encoding):
+    cfg = get_config()
+    if encoding == "br":
+        return brotli.compress(body, quality=int(cfg.get("brotli_quality", 6)))
+    # mtime=0 keeps the output byte-identical for identical input
+    return gzip.compress(body, compresslevel=int(cfg.get("gzip_level", 6)), mtime=0)
+
+
+class CompressedCache:
+    """LRU of compressed bodies bounded by total compressed size."""
+
+    def __init__(self):
+        self._entries = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.hits = self.misses = 0
+
+    def get(self, key):
+        with self._lock:
+            body = self._entries.get(key)
+            if body is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return body
+
+    def put(self, key, body):
+        limit = int(get_config().get("compress_cache_bytes", 32 * 1024 * 1024))
+        if len(body) > limit:
+            return
+        with self._lock:
+            old = self._entries.pop(key, None)
+            if old is not None:
+                self._bytes -= len(old)
+            self._entries[key] = body
+            self._bytes += len(body)
+            while self._bytes > limit and self._entries:
+                _, evicted = self._entries.popitem(last=False)
+                self._bytes -= len(evicted)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+
+    def stats(self):
+        with self._lock:
+            return {"entries": len(self._entries), "bytes": self._bytes,
+                    "hits": self.hits, "misses": self.misses}
+
+
+compressed_bodies = CompressedCache()
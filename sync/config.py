@@ -0,0 +1,219 @@
+"""
+Service configuration - one cached view of config.json + .env
+
+Both files are parsed once and kept in memory. Readers only touch that
+in-memory copy; at most every `config_check_interval` seconds the files are
+stat()ed and, if their mtime/inode/size changed, parsed again. A bad edit
+keeps the last good configuration.
+
+Precedence for DB settings: .env > process environment > config.json.
+"""
+import json
+import os
+import sys
+import threading
+import time
+from contextlib import contextmanager
+from pathlib import Path
+
+DEFAULTS = {
+    "ip": "auto",
+    "port": 8000,
+    "dsn": "pktc",
+    "db_uid": "dba",
+    "db_pwd": "sql",
+    "settings": "django_sync.settings",
+    "env_file": ".env",
+    "config_check_interval": 2,
+}
+
+
+def _strip_comment(s):
+    if not isinstance(s, str):
+        return s
+    return s.split("#", 1)[0].strip()
+
+
+def _default_search_dirs():
+    here = Path(__file__).resolve().parent
+    dirs = []
+    if getattr(sys, "frozen", False):
+        dirs.append(Path(sys.executable).resolve().parent)
+    dirs += [here.parent, here, here.parent.parent]
+    return dirs
+
+
+def _signature(path):
+    try:
+        st = os.stat(path)
+    except OSError:
+        return None
+    return (st.st_mtime_ns, st.st_ino, st.st_size)
+
+
+def parse_env_file(path):
+    """KEY=VALUE lines; blank lines and # comments ignored."""
+    loaded = {}
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            line = line.strip()
+            if not line or line.startswith("#") or "=" not in line:
+                continue
+            k, v = line.split("=", 1)
+            loaded[k.strip()] = _strip_comment(v.strip())
+    return loaded
+
+
+class ServiceConfig:
+    def __init__(self, search_dirs=None):
+        self._search_dirs = [Path(d) for d in (search_dirs or _default_search_dirs())]
+        self._lock = threading.Lock()
+        self._data = dict(DEFAULTS)
+        self._env = {}
+        self._overrides = {}
+        self._signatures = None
+        self._next_check = 0.0
+        self.config_path = None
+        self.env_path = None
+        self.version = 0
+        self.reload()
+
+    # -- reading (memory only, except for the throttled change check) --------
+    def get(self, key, default=None):
+        self._maybe_reload()
+        return self._data.get(key, default)
+
+    def __getitem__(self, key):
+        self._maybe_reload()
+        return self._data[key]
+
+    def snapshot(self):
+        """Current merged config dict. Treat as read-only."""
+        self._maybe_reload()
+        return self._data
+
+    def env(self, key, default=None):
+        """Value from .env, else from the process environment."""
+        self._maybe_reload()
+        if key in self._env:
+            return self._env[key]
+        return os.environ.get(key, default)
+
+    @property
+    def service_dir(self):
+        """Folder of config.json (the exe's folder when frozen); relative paths in config resolve here."""
+        self._maybe_reload()
+        return self.config_path.parent if self.config_path else self._search_dirs[0]
+
+    @property
+    def env_values(self):
+        self._maybe_reload()
+        return dict(self._env)
+
+    def db_params(self):
+        """(dsn, uid, pwd) for the SQL Anywhere connection."""
+        data = self.snapshot()
+        return (
+            _strip_comment(self.env("DB_DSN", data.get("dsn"))),
+            self.env("DB_UID", data.get("db_uid")),
+            self.env("DB_PWD", data.get("db_pwd")),
+        )
+
+    # -- reloading -------------------------------------------------------------
+    def _maybe_reload(self):
+        if time.monotonic() < self._next_check:
+            return
+        with self._lock:
+            if time.monotonic() < self._next_check:
+                return
+            if self._current_signatures() != self._signatures:
+                self._reload_locked()
+            self._schedule_next_check()
+
+    def reload(self):
+        """Force a re-read of config.json and .env."""
+        with self._lock:
+            self._reload_locked()
+            self._schedule_next_check()
+
+    def _schedule_next_check(self):
+        try:
+            interval = float(self._data.get("config_check_interval", 2))
+        except (TypeError, ValueError):
+            interval = 2.0
+        self._next_check = time.monotonic() + interval
+
+    def _locate(self):
+        config_path = None
+        for d in self._search_dirs:
+            if (d / "config.json").exists():
+                config_path = d / "config.json"
+                break
+        return config_path
+
+    def _env_path_for(self, config_path, data):
+        base = config_path.parent if config_path else self._search_dirs[0]
+        return base / data.get("env_file", ".env")
+
+    def _current_signatures(self):
+        config_path = self._locate()
+        env_path = self._env_path_for(config_path, self._data)
+        return (str(config_path), _signature(config_path) if config_path else None,
+                str(env_path), _signature(env_path))
+
+    def _reload_locked(self):
+        config_path = self._locate()
+        data = dict(DEFAULTS)
+        try:
+            if config_path:
+                with open(config_path, "r", encoding="utf-8") as f:
+                    data.update(json.load(f) or {})
+            if data.get("dsn"):
+                data["dsn"] = _strip_comment(data["dsn"])
+            env_path = self._env_path_for(config_path, data)
+            env = parse_env_file(env_path) if env_path.is_file() else {}
+        except Exception as e:
+            print(f"Error loading config: {e}")
+            if self.version:
+                # keep serving the last good config; retry when the file changes again
+                self._signatures = self._current_signatures()
+                return
+            env_path, env = None, {}
+        data.update(self._overrides)
+        self._data, self._env = data, env
+        self.config_path, self.env_path = config_path, env_path
+        self._signatures = self._current_signatures()
+        self.version += 1
+
+    # -- tests / tooling -------------------------------------------------------
+    @contextmanager
+    def override(self, **values):
+        """
+        Temporarily layer values over config.json:
+            with get_config().override(db_backend="sqlite"): ...
+        """
+        saved = dict(self._overrides)
+        self._overrides.update(values)
+        self.reload()
+        try:
+            yield self
+        finally:
+            self._overrides = saved
+            self.reload()
+
+
+_config = None
+_config_lock = threading.Lock()
+
+
+def get_config(search_dirs=None):
+    """
+    The process-wide ServiceConfig. `search_dirs` only matters on the first
+    call (SyncService passes the exe folder); later calls share the instance.
+    """
+    global _config
+    if _config is None:
+        with _config_lock:
+            if _config is None:
+                _config = ServiceConfig(search_dirs)
+    return _config
@@ -0,0 +1,289 @@
+"""
+Master-data datasets served by the list endpoints
+
+Each Dataset knows its SELECT, the optional ?param=value filter and the JSON
+field names of its columns, so the views, fingerprinting and caching layers
+share one definition of what /items/, /dine-tables/, ... return.
+"""
+import base64
+import hashlib
+import json
+import threading
+import time
+from collections import OrderedDict
+from decimal import Decimal
+from operator import itemgetter
+
+from django.core.serializers.json import DjangoJSONEncoder
+
+from .cache import master_cache
+from .db_backends import get_backend
+from .sql_helper import db_cursor
+from .timing import phase
+
+_NATIVE = (str, int, float, bool, type(None))
+_encoder = DjangoJSONEncoder()
+
+
+class Dataset:
+    def __init__(self, name, sql, columns, filters, key, optional=()):
+        self.name = name              # also the key of the list in the JSON body
+        self.sql = sql
+        self.columns = columns        # JSON field name per selected column
+        self.filters = filters        # GET param -> SQL column
+        self.key = key                # natural key: ((SQL column, row index), ...)
+        self.optional = optional      # columns left out of the JSON unless asked for
+        self.index = {c: i for i, c in enumerate(columns)}
+        default = [i for i, c in enumerate(columns) if c not in optional]
+        self._default_fields = (tuple(columns[i] for i in default),
+                                itemgetter(*default) if len(default) > 1 else None)
+
+    def fields(self, with_optional=False):
+        """(JSON names, row picker or None for "whole row") of the output columns."""
+        if with_optional or not self.optional:
+            return self.columns, None
+        return self._default_fields
+
+    def select(self, params, after=None, limit=None):
+        """
+        SQL + args for this request; the first filter param present wins.
+        With `limit`, rows come in natural-key order, `limit` at most, starting
+        after the key values in `after` (keyset pagination, no OFFSET scan).
+        """
+        where, args = [], []
+        for param, column in self.filters.items():
+            value = params.get(param)
+            if value:
+                where.append(f"{column} = ?")
+                args.append(value)
+                break
+        if after is not None:
+            # (k1 > v1) OR (k1 = v1 AND k2 > v2) ... - SQL Anywhere has no row-value compare
+            ors = []
+            for i, (column, _) in enumerate(self.key):
+                terms = [f"{c} = ?" for c, _ in self.key[:i]] + [f"{column} > ?"]
+                ors.append("(" + " AND ".join(terms) + ")")
+                args.extend(after[:i + 1])
+            where.append("(" + " OR ".join(ors) + ")")
+        sql = self.sql
+        if where:
+            sql += "\nWHERE " + " AND ".join(where)
+        if limit is not None:
+            sql += "\nORDER BY " + ", ".join(c for c, _ in self.key)
+            sql = get_backend().limit_sql(sql, limit)
+        return sql, tuple(args)
+
+    def filter_key(self, params):
+        """Hashable identity of the filter this request uses."""
+        return tuple((p, params.get(p)) for p in self.filters if params.get(p))
+
+    def row_key(self, row):
+        return [row[i] for _, i in self.key]
+
+    def fetch(self, params, after=None, limit=None):
+        sql, args = self.select(params, after, limit)
+        with db_cursor() as cur:
+            cur.execute(sql, args)
+            return cur.fetchall()
+
+    def fetch_page(self, params, after, limit):
+        """(rows, key of the last row or None when this is the last page)"""
+        rows = self.fetch(params, after, limit + 1)
+        if len(rows) > limit:
+            rows = rows[:limit]
+            return rows, self.row_key(rows[-1])
+        return rows, None
+
+    def load(self, params, page=None):
+        """
+        (rows, fingerprint, next-page key) for a request, served from the
+        read-through cache when possible (see cache.py). `page` is the
+        (after, limit) pair from keyset pagination, or None.
+        """
+        def loader():
+            if page:
+                rows, next_key = self.fetch_page(params, *page)
+            else:
+                rows, next_key = self.fetch(params), None
+            with phase("etag"):
+                # whether more rows follow is part of the page's content
+                return rows, fingerprint(rows, next_key), next_key
+
+        key = (self.filter_key(params), page and (tuple(page[0] or ()), page[1]))
+        return master_cache.get_or_load(self.name, key, loader)
+
+    def to_dicts(self, rows, with_optional=False):
+        columns, pick = self.fields(with_optional)
+        with phase("rows"):
+            if pick is None:
+                return [dict(zip(columns, r)) for r in rows]
+            return [dict(zip(columns, pick(r))) for r in rows]
+
+    def to_columns(self, rows, with_optional=False):
+        """
+        (column names, row lists) for the columnar format. Values that plain
+        json can't encode (Decimal rates) are converted column by column here,
+        so the encoder never has to fall back to DjangoJSONEncoder per value.
+        """
+        columns, pick = self.fields(with_optional)
+        with phase("rows"):
+            if pick is not None:
+                rows = [pick(r) for r in rows]
+            if not rows:
+                return columns, []
+            converted = [_jsonable(values) for values in zip(*rows)]
+            return columns, [list(r) for r in zip(*converted)]
+
+
+ITEMS = Dataset(
+    "items",
+    """
+    SELECT
+        i.item_code,
+        i.item_name,
+        i.rate,
+        i.rate1,
+        i.rate2,
+        i.kitchen,
+        i.activity,
+        i.image,
+        c.name,
+        i.taxper,
+        i.longname
+    FROM tb_item_master i
+    LEFT JOIN dine_itemcategory c
+        ON i.category = c.code""",
+    # "category" is the category NAME from dine_itemcategory, not the code
+    ("item_code", "item_name", "rate", "rate1", "rate2", "kitchen", "activity",
+     "image", "category", "taxper", "longname"),
+    {"item_code": "i.item_code"},
+    (("i.item_code", 0),),
+    optional=("image",),              # opt-in with ?images=1, see images.py
+)
+
+DINE_TABLES = Dataset(
+    "tables",
+    """
+    SELECT
+        tableno,
+        description,
+        section
+    FROM dine_tables""",
+    ("tableno", "description", "section"),
+    {"tableno": "tableno"},
+    (("tableno", 0),),
+)
+
+USER_SETTINGS = Dataset(
+    "settings",
+    """
+    SELECT
+        uid,
+        code
+    FROM acc_userssettings""",
+    ("uid", "code"),
+    {"uid": "uid"},
+    (("uid", 0), ("code", 1)),
+)
+
+DINE_CATEGORIES = Dataset(
+    "categories",
+    """
+    SELECT
+        catagorycode,
+        name
+    FROM dine_catagory""",
+    ("catagorycode", "name"),
+    {"catagorycode": "catagorycode"},
+    (("catagorycode", 0),),
+)
+
+
+def _jsonable(values):
+    """One column's values, with anything json can't take turned into what DjangoJSONEncoder emits."""
+    for v in values:
+        if type(v) not in _NATIVE:
+            break
+    else:
+        return values
+    default = _encoder.default
+    return [v if type(v) in _NATIVE else str(v) if type(v) is Decimal else default(v)
+            for v in values]
+
+
+# ----------------------------- page cursors ----------------------------------
+def encode_cursor(key_values):
+    """Opaque next-page token for a row key."""
+    raw = json.dumps(key_values, cls=DjangoJSONEncoder, separators=(",", ":"))
+    return base64.urlsafe_b64encode(raw.encode("utf-8")).decode("ascii").rstrip("=")
+
+
+def decode_cursor(token, dataset):
+    """Row key from a token; ValueError if it is not one of ours."""
+    try:
+        padded = token + "=" * (-len(token) % 4)
+        values = json.loads(base64.urlsafe_b64decode(padded.encode("ascii")))
+    except Exception:
+        raise ValueError("Invalid cursor")
+    if (not isinstance(values, list) or len(values) != len(dataset.key)
+            or not all(v is None or type(v) in (str, int, float) for v in values)):
+        raise ValueError("Invalid cursor")
+    return values
+
+
+# ----------------------------- fingerprints ----------------------------------
+def fingerprint(rows, next_key=None):
+    """
+    Stable content hash of a result set (same rows -> same value, any
+    process). A page's `next_key` is included, so a page that gains a
+    successor gets a new ETag even when its own rows are unchanged.
+    """
+    h = hashlib.blake2b(digest_size=12)
+    for row in rows:
+        h.update(repr(tuple(row)).encode("utf-8"))
+        h.update(b"\x1e")
+    if next_key is not None:
+        h.update(b"\x1d" + repr(tuple(next_key)).encode("utf-8"))
+    return h.hexdigest()
+
+
+class FingerprintCache:
+    """
+    Last known fingerprint per (dataset, filter), trusted for `ttl` seconds.
+    Lets a matching If-None-Match be answered with 304 without touching the DB.
+    """
+
+    def __init__(self, max_entries=1024):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+        if entry is None or entry[1] < time.monotonic():
+            return None
+        return entry[0]
+
+    def put(self, key, value, ttl):
+        if ttl <= 0:
+            return
+        with self._lock:
+            self._entries[key] = (value, time.monotonic() + ttl)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def clear(self, dataset_name=None):
+        with self._lock:
+            if dataset_name is None:
+                self._entries.clear()
+            else:
+                for key in [k for k in self._entries if k[0] == dataset_name]:
+                    del self._entries[key]
+
+
+fingerprints = FingerprintCache()
+
+
+DATASETS = {d.name: d for d in (ITEMS, DINE_TABLES, USER_SETTINGS, DINE_CATEGORIES)}
@@ -0,0 +1,391 @@
+"""
+Database backends for sql_helper
+
+config.json "db_backend" picks one:
+  • "sqlanydb" (default) - SAP SQL Anywhere through the DSN, as in production
+  • "sqlite"             - local stand-in with the same tables, seeded with
+                           generated rows, for measuring the service on any box
+
+SQLite stand-in settings (all optional):
+  "sqlite_path": "C:/temp/dine_stub.sqlite3"     default: OS temp dir
+  "sqlite_seed": {"items": 500, "tables": 40, ...} row counts, see SEED_DEFAULTS
+  "sqlite_connect_latency_ms": 20                  sleep on every connect
+  "sqlite_query_latency_ms": 2                     sleep on every execute
+
+Seeded logins are USER01, USER02, ... with password "1234".
+"""
+import json
+import os
+import sqlite3
+import tempfile
+import threading
+import time
+from decimal import Decimal
+
+from .config import get_config
+
+# Try to import sqlanydb, but don't fail if it's not available
+try:
+    import sqlanydb
+    SQLANYDB_AVAILABLE = True
+except ImportError:
+    SQLANYDB_AVAILABLE = False
+    print("WARNING: sqlanydb module not found. Database connections will not work.")
+    print("Install SAP SQL Anywhere client and run: pip install sqlanydb")
+
+
+class DatabaseBackend:
+    """A way of opening DB-API connections that accept the views' `?` SQL."""
+    name = None
+
+    def connect(self):
+        raise NotImplementedError
+
+    def limit_sql(self, sql, n):
+        """`sql` returning at most n rows."""
+        return f"{sql}\nLIMIT {int(n)}"
+
+    def last_id_sql(self):
+        """SELECT returning the autoincrement value of this connection's last INSERT."""
+        raise NotImplementedError
+
+    def table_exists_sql(self):
+        """SELECT returning a row when the table named by the one `?` exists."""
+        raise NotImplementedError
+
+    def kot_ddl(self):
+        """((table, CREATE TABLE statement), ...) for the KOT tables, in creation order."""
+        raise NotImplementedError
+
+    @property
+    def key(self):
+        """Identity of the target DB; the pool retires connections when it changes."""
+        raise NotImplementedError
+
+
+# ----------------------------- SQL Anywhere ----------------------------------
+class SqlAnywhereBackend(DatabaseBackend):
+    name = "sqlanydb"
+
+    def __init__(self, dsn, uid, pwd):
+        self.dsn, self.uid, self.pwd = dsn, uid, pwd
+
+    @property
+    def key(self):
+        return (self.name, self.dsn, self.uid, self.pwd)
+
+    def limit_sql(self, sql, n):
+        # SQL Anywhere: SELECT TOP n ... ORDER BY ...
+        return sql.replace("SELECT", f"SELECT TOP {int(n)}", 1)
+
+    def last_id_sql(self):
+        return "SELECT @@identity"
+
+    def table_exists_sql(self):
+        return "SELECT 1 FROM SYS.SYSTAB WHERE table_name = ?"
+
+    def kot_ddl(self):
+        return SQLANYWHERE_KOT_DDL
+
+    def connect(self):
+        if not SQLANYDB_AVAILABLE:
+            raise ImportError(
+                "sqlanydb module not installed. "
+                "Install SAP SQL Anywhere client and run: pip install sqlanydb"
+            )
+        try:
+            return sqlanydb.connect(DSN=self.dsn, UID=self.uid, PWD=self.pwd)
+        except Exception as e:
+            print(f"Database connection failed: {e}")
+            print(f"DSN: {self.dsn}, UID: {self.uid}")
+            raise
+
+
+# ----------------------------- SQLite stand-in -------------------------------
+SEED_DEFAULTS = {
+    "items": 500,              # tb_item_master
+    "item_categories": 12,     # dine_itemcategory
+    "tables": 40,              # dine_tables
+    "users": 10,               # acc_users
+    "settings_per_user": 8,    # acc_userssettings rows per user
+    "dine_categories": 8,      # dine_catagory
+}
+
+# Column types mirror what sqlanydb hands back: DECIMAL columns come out as
+# Decimal (see the converter below), everything else as str.
+SCHEMA = """
+CREATE TABLE dine_itemcategory (
+    code        VARCHAR(20) PRIMARY KEY,
+    name        VARCHAR(60)
+);
+CREATE TABLE tb_item_master (
+    item_code   VARCHAR(20) PRIMARY KEY,
+    item_name   VARCHAR(100),
+    rate        DECIMAL(12,2),
+    rate1       DECIMAL(12,2),
+    rate2       DECIMAL(12,2),
+    kitchen     VARCHAR(20),
+    activity    VARCHAR(5),
+    image       VARCHAR(255),
+    category    VARCHAR(20),
+    taxper      DECIMAL(6,2),
+    longname    VARCHAR(255)
+);
+CREATE TABLE dine_tables (
+    tableno     VARCHAR(20) PRIMARY KEY,
+    description VARCHAR(60),
+    section     VARCHAR(30)
+);
+CREATE TABLE acc_users (
+    id          VARCHAR(20) PRIMARY KEY,
+    pass        VARCHAR(40)
+);
+CREATE TABLE acc_userssettings (
+    uid         VARCHAR(20),
+    code        VARCHAR(20),
+    PRIMARY KEY (uid, code)
+);
+CREATE TABLE dine_catagory (
+    catagorycode VARCHAR(20) PRIMARY KEY,
+    name         VARCHAR(60)
+);
+CREATE TABLE _stub_meta (
+    seed        TEXT
+);
+"""
+
+# The KOT tables (kot.py) are this service's own, not the POS's: they are
+# created on first use on either backend, see kot.ensure_tables().
+_KOT_DETAIL_DDL = """
+CREATE TABLE dine_kot_detail (
+    kotno       INTEGER NOT NULL,
+    lineno      INTEGER NOT NULL,
+    item_code   VARCHAR(20),
+    qty         DECIMAL(10,2),
+    rate        DECIMAL(12,2),
+    amount      DECIMAL(12,2),
+    kitchen     VARCHAR(20),
+    notes       VARCHAR(255),
+    PRIMARY KEY (kotno, lineno)
+)"""
+
+SQLITE_KOT_DDL = (
+    ("dine_kot", """
+CREATE TABLE dine_kot (
+    kotno           INTEGER PRIMARY KEY AUTOINCREMENT,
+    tableno         VARCHAR(20),
+    userid          VARCHAR(20),
+    created         VARCHAR(26),
+    item_count      INTEGER,
+    total           DECIMAL(12,2),
+    idempotency_key VARCHAR(64),
+    payload_hash    VARCHAR(32),
+    UNIQUE (userid, idempotency_key)
+)"""),
+    ("dine_kot_detail", _KOT_DETAIL_DDL),
+)
+
+SQLANYWHERE_KOT_DDL = (
+    ("dine_kot", """
+CREATE TABLE dine_kot (
+    kotno           INTEGER NOT NULL DEFAULT AUTOINCREMENT PRIMARY KEY,
+    tableno         VARCHAR(20),
+    userid          VARCHAR(20),
+    created         VARCHAR(26),
+    item_count      INTEGER,
+    total           DECIMAL(12,2),
+    idempotency_key VARCHAR(64),
+    payload_hash    VARCHAR(32),
+    UNIQUE (userid, idempotency_key)
+)"""),
+    ("dine_kot_detail", _KOT_DETAIL_DDL),
+)
+
+STUB_TABLES = ("tb_item_master", "dine_itemcategory", "dine_tables",
+               "acc_userssettings", "dine_catagory", "acc_users",
+               "dine_kot", "dine_kot_detail", "_stub_meta")
+SCHEMA_VERSION = 4            # bump when SCHEMA changes; older stub files are re-seeded
+
+# SQLite stores DECIMAL as a plain number and loses the scale; every stub
+# DECIMAL column has two places, which is what SQL Anywhere returns.
+_CENTS = Decimal("0.01")
+sqlite3.register_adapter(Decimal, str)
+sqlite3.register_converter("DECIMAL", lambda b: Decimal(b.decode()).quantize(_CENTS))
+
+
+def _meta(counts):
+    return json.dumps({**counts, "schema": SCHEMA_VERSION}, sort_keys=True)
+
+
+def seed_sqlite(conn, counts):
+    """(Re)create the stand-in tables and fill them with deterministic rows."""
+    n = {**SEED_DEFAULTS, **(counts or {})}
+    cur = conn.cursor()
+    for table in STUB_TABLES:
+        cur.execute(f"DROP TABLE IF EXISTS {table}")
+    cur.executescript(SCHEMA)
+    for _, ddl in SQLITE_KOT_DDL:
+        cur.execute(ddl)
+
+    sections = ("AC", "NON-AC", "GARDEN", "ROOF")
+    cats = [(f"C{c:03d}", f"Category {c}") for c in range(1, n["item_categories"] + 1)]
+    cur.executemany("INSERT INTO dine_itemcategory VALUES (?, ?)", cats)
+    cur.executemany(
+        "INSERT INTO tb_item_master VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+        (
+            (
+                f"I{i:05d}",
+                f"Item {i}",
+                Decimal(40 + (i * 7) % 460).quantize(_CENTS),
+                Decimal(45 + (i * 7) % 460).quantize(_CENTS),
+                Decimal(50 + (i * 7) % 460).quantize(_CENTS),
+                f"K{i % 3 + 1}",
+                "Y" if i % 17 else "N",
+                None,
+                cats[i % len(cats)][0] if cats else None,
+                Decimal("5.00") if i % 4 else Decimal("18.00"),
+                f"Item {i} - house special, serves {i % 4 + 1}",
+            )
+            for i in range(1, n["items"] + 1)
+        ),
+    )
+    cur.executemany(
+        "INSERT INTO dine_tables VALUES (?, ?, ?)",
+        ((f"T{t:02d}", f"Table {t}", sections[t % len(sections)])
+         for t in range(1, n["tables"] + 1)),
+    )
+    users = [f"USER{u:02d}" for u in range(1, n["users"] + 1)]
+    cur.executemany("INSERT INTO acc_users VALUES (?, ?)", ((u, "1234") for u in users))
+    cur.executemany(
+        "INSERT INTO acc_userssettings VALUES (?, ?)",
+        ((u, f"S{s:03d}") for u in users for s in range(1, n["settings_per_user"] + 1)),
+    )
+    cur.executemany(
+        "INSERT INTO dine_catagory VALUES (?, ?)",
+        ((f"CT{c:02d}", f"Menu {c}") for c in range(1, n["dine_categories"] + 1)),
+    )
+    cur.execute("INSERT INTO _stub_meta VALUES (?)", (_meta(n),))
+    conn.commit()
+    cur.close()
+
+
+class _SlowCursor:
+    """Cursor proxy that sleeps before each execute to mimic a LAN round trip."""
+
+    def __init__(self, cur, delay):
+        self._cur, self._delay = cur, delay
+
+    def execute(self, *args):
+        time.sleep(self._delay)
+        return self._cur.execute(*args)
+
+    def executemany(self, *args):
+        time.sleep(self._delay)
+        return self._cur.executemany(*args)
+
+    def __getattr__(self, name):
+        return getattr(self._cur, name)
+
+    def __iter__(self):
+        return iter(self._cur)
+
+
+class _SlowConnection:
+    def __init__(self, conn, delay):
+        self._conn, self._delay = conn, delay
+
+    def cursor(self):
+        return _SlowCursor(self._conn.cursor(), self._delay)
+
+    def __getattr__(self, name):
+        return getattr(self._conn, name)
+
+
+class SQLiteBackend(DatabaseBackend):
+    name = "sqlite"
+
+    def __init__(self, path, seed=None, connect_latency_ms=0, query_latency_ms=0):
+        self.path = path
+        self.seed = {**SEED_DEFAULTS, **(seed or {})}
+        self.connect_latency = connect_latency_ms / 1000.0
+        self.query_latency = query_latency_ms / 1000.0
+        self._seeded = False
+        self._lock = threading.Lock()
+
+    @property
+    def key(self):
+        return (self.name, self.path, json.dumps(self.seed, sort_keys=True),
+                self.connect_latency, self.query_latency)
+
+    def last_id_sql(self):
+        return "SELECT last_insert_rowid()"
+
+    def table_exists_sql(self):
+        return "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = ?"
+
+    def kot_ddl(self):
+        return SQLITE_KOT_DDL
+
+    def connect(self):
+        if self.connect_latency:
+            time.sleep(self.connect_latency)
+        conn = sqlite3.connect(self.path, detect_types=sqlite3.PARSE_DECLTYPES,
+                               check_same_thread=False)
+        if not self._seeded:
+            with self._lock:
+                if not self._seeded:
+                    self._ensure_seeded(conn)
+                    self._seeded = True
+        if self.query_latency:
+            return _SlowConnection(conn, self.query_latency)
+        return conn
+
+    def _ensure_seeded(self, conn):
+        wanted = _meta(self.seed)
+        try:
+            row = conn.execute("SELECT seed FROM _stub_meta").fetchone()
+        except sqlite3.Error:
+            row = None
+        if not row or row[0] != wanted:
+            seed_sqlite(conn, self.seed)
+
+
+# ----------------------------- selection -------------------------------------
+BACKENDS = {
+    SqlAnywhereBackend.name: SqlAnywhereBackend,
+    SQLiteBackend.name: SQLiteBackend,
+}
+
+_backend = None
+_backend_version = None
+_backend_lock = threading.Lock()
+
+
+def _backend_from_config(cfg):
+    name = cfg.get("db_backend") or SqlAnywhereBackend.name
+    if name == SQLiteBackend.name:
+        return SQLiteBackend(
+            cfg.get("sqlite_path") or os.path.join(tempfile.gettempdir(), "dine_kot_sync_stub.sqlite3"),
+            seed=cfg.get("sqlite_seed"),
+            connect_latency_ms=float(cfg.get("sqlite_connect_latency_ms", 0)),
+            query_latency_ms=float(cfg.get("sqlite_query_latency_ms", 0)),
+        )
+    if name == SqlAnywhereBackend.name:
+        return SqlAnywhereBackend(*cfg.db_params())
+    raise ValueError(f"Unknown db_backend {name!r}; expected one of {sorted(BACKENDS)}")
+
+
+def get_backend():
+    """Backend described by the current config; rebuilt only when the config changes."""
+    global _backend, _backend_version
+    cfg = get_config()
+    cfg.snapshot()                        # notices config.json/.env edits
+    if _backend is not None and _backend_version == cfg.version:
+        return _backend
+    with _backend_lock:
+        if _backend_version != cfg.version:
+            candidate = _backend_from_config(cfg)
+            if _backend is None or _backend.key != candidate.key:
+                _backend = candidate     # keeps the seeded flag when nothing changed
+            _backend_version = cfg.version
+    return _backend
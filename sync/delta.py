@@ -0,0 +1,87 @@
+"""
+Delta sync for the item catalog
+
+SQL Anywhere's tb_item_master has no change-tracking columns, so changes are
+found by diffing snapshots: every time the full catalog is read, its
+fingerprint (the same value as the /items/ ETag) becomes the version token,
+and if it differs from the previous one, the per-item row hashes are
+compared to record which item_codes were added/changed or removed.
+
+The last `delta_history` versions (config.json, default 50) are kept in
+memory. A client presenting a token from that window gets only the
+differences; anything older (or from before a service restart) gets the
+full catalog. Because tokens are content hashes, an unchanged catalog keeps
+its token across restarts.
+"""
+import hashlib
+import threading
+from collections import deque
+
+from .config import get_config
+from .datasets import ITEMS, fingerprint
+
+
+def _row_hash(row):
+    return hashlib.blake2b(repr(tuple(row)).encode("utf-8"), digest_size=8).digest()
+
+
+class DeltaTracker:
+    def __init__(self, dataset, key_index=0):
+        self.dataset = dataset
+        self.key_index = key_index
+        self._lock = threading.Lock()
+        self._hashes = {}              # key -> row hash at the current version
+        self._versions = deque()       # (token, changed keys, removed keys) oldest first
+        self.current = None
+
+    def observe(self, rows, token=None):
+        """Record a full snapshot; returns its version token."""
+        token = token or fingerprint(rows)
+        if token == self.current:
+            return token               # nothing changed; skip per-row hashing
+        ki = self.key_index
+        hashes = {row[ki]: _row_hash(row) for row in rows}
+        with self._lock:
+            if token == self.current:
+                return token
+            old = self._hashes
+            changed = frozenset(k for k, h in hashes.items() if old.get(k) != h)
+            removed = frozenset(k for k in old if k not in hashes)
+            if self.current is None:
+                changed = removed = frozenset()   # first snapshot: nothing to diff against
+            self._versions.append((token, changed, removed))
+            limit = max(1, int(get_config().get("delta_history", 50)))
+            while len(self._versions) > limit:
+                self._versions.popleft()
+            self._hashes, self.current = hashes, token
+        return token
+
+    def changes_since(self, since):
+        """
+        (changed keys, removed keys) between `since` and the current version,
+        or None if `since` is unknown / too old and a full payload is needed.
+        """
+        with self._lock:
+            versions = list(self._versions)
+        # newest match: data can return to an earlier state (A -> B -> A)
+        for i in range(len(versions) - 1, -1, -1):
+            if versions[i][0] == since:
+                break
+        else:
+            return None
+        changed, removed = set(), set()
+        for _, step_changed, step_removed in versions[i + 1:]:
+            changed |= step_changed
+            removed -= step_changed
+            removed |= step_removed
+            changed -= step_removed
+        return changed, removed
+
+
+item_versions = DeltaTracker(ITEMS)
+
+_trackers = {ITEMS.name: item_versions}
+
+
+def tracker_for(dataset):
+    return _trackers.get(dataset.name)
@@ -0,0 +1,33 @@
+"""
+Process-wide worker pools sized from config.json
+
+bootstrap.py (parallel section loads) and async_views.py (the ASGI DB
+executor) each keep one ThreadPoolExecutor. A ResizableExecutor reads its
+size from the live config on every get() and swaps in a new pool when the
+size changes; work already queued on the old pool still finishes there.
+"""
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from .config import get_config
+
+
+class ResizableExecutor:
+    def __init__(self, name, size):
+        self.name = name              # worker thread name prefix
+        self._size = size             # callable(config) -> worker count
+        self._executor = None
+        self._workers = 0
+        self._lock = threading.Lock()
+
+    def get(self):
+        """The pool for the current config, rebuilt when the configured size changed."""
+        workers = max(1, int(self._size(get_config())))
+        with self._lock:
+            if self._executor is None or workers != self._workers:
+                old = self._executor
+                self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix=self.name)
+                self._workers = workers
+                if old is not None:
+                    old.shutdown(wait=False)
+            return self._executor
@@ -0,0 +1,139 @@
+"""
+Item images and thumbnails
+
+tb_item_master.image holds a file path (absolute, or relative to
+"image_root"). /items/ no longer carries it by default; clients ask for
+?images=1 to get "image" and a versioned "image_url", then fetch
+
+    GET /items/<code>/image?v=<digest>[&size=256]
+
+The digest is a hash of the file contents, so a URL carrying the current
+digest never changes meaning and is sent with a one-year immutable
+Cache-Control. Thumbnails (the sizes listed in "image_sizes", longest side
+in px) are made once per digest and size and kept in "thumbnail_dir"; an
+edited image gets a new digest and therefore new thumbnail files.
+
+Resizing needs Pillow; without it the original file is served for every size.
+
+config.json:
+  "image_root": "D:/POS/Images"
+  "image_sizes": [128, 256, 512]
+  "thumbnail_dir": "thumbnails"        # relative to the service directory
+"""
+import hashlib
+import logging
+import mimetypes
+import os
+import threading
+
+try:
+    from PIL import Image
+    PIL_AVAILABLE = True
+except ImportError:
+    PIL_AVAILABLE = False
+
+from .config import get_config
+
+DEFAULT_SIZES = (128, 256, 512)
+
+_digests = {}                     # path -> ((mtime_ns, size), digest)
+_digest_lock = threading.Lock()
+_thumb_locks = {}
+_thumb_locks_guard = threading.Lock()
+
+
+class ImageNotFound(Exception):
+    pass
+
+
+def resolve_path(value):
+    """Absolute file path for a tb_item_master.image value, or None."""
+    if not value:
+        return None
+    value = str(value).strip()
+    root = get_config().get("image_root") or ""
+    path = value if os.path.isabs(value) or not root else os.path.join(root, value)
+    return os.path.normpath(path)
+
+
+def digest(path):
+    """Content hash of the file, recomputed only when its mtime/size change."""
+    try:
+        st = os.stat(path)
+    except OSError:
+        raise ImageNotFound(path)
+    stamp = (st.st_mtime_ns, st.st_size)
+    with _digest_lock:
+        known = _digests.get(path)
+    if known and known[0] == stamp:
+        return known[1]
+    h = hashlib.blake2b(digest_size=10)
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 16), b""):
+            h.update(block)
+    value = h.hexdigest()
+    with _digest_lock:
+        _digests[path] = (stamp, value)
+    return value
+
+
+def image_url(item_code, value):
+    """Versioned URL for an item's image, or None when it has none / the file is missing."""
+    path = resolve_path(value)
+    if not path:
+        return None
+    try:
+        return f"/items/{item_code}/image?v={digest(path)}"
+    except ImageNotFound:
+        return None
+
+
+def allowed_sizes():
+    return [int(s) for s in (get_config().get("image_sizes") or DEFAULT_SIZES)]
+
+
+def thumbnail_dir():
+    folder = get_config().get("thumbnail_dir") or "thumbnails"
+    return folder if os.path.isabs(folder) else os.path.join(get_config().service_dir, folder)
+
+
+def _thumb_lock(key):
+    with _thumb_locks_guard:
+        return _thumb_locks.setdefault(key, threading.Lock())
+
+
+def thumbnail(path, version, size):
+    """
+    Path of the `size` px thumbnail of `path` (content hash `version`),
+    creating it on first use. Concurrent requests wait for one resize.
+    """
+    ext = os.path.splitext(path)[1].lower() or ".jpg"
+    folder = thumbnail_dir()
+    target = os.path.join(folder, f"{version}_{size}{ext}")
+    if os.path.exists(target):
+        return target
+    with _thumb_lock(target):
+        if os.path.exists(target):
+            return target
+        os.makedirs(folder, exist_ok=True)
+        tmp = f"{target}.{threading.get_ident()}.tmp"
+        with Image.open(path) as img:
+            img.thumbnail((size, size))
+            if ext in (".jpg", ".jpeg") and img.mode not in ("RGB", "L"):
+                img = img.convert("RGB")
+            img.save(tmp, format=Image.registered_extensions().get(ext, "PNG"))
+        os.replace(tmp, target)
+        logging.info("🖼️ Thumbnail %spx created for %s", size, os.path.basename(path))
+    return target
+
+
+def image_file(value, size=None):
+    """(file path to send, content type, digest) for an image column value."""
+    path = resolve_path(value)
+    if not path:
+        raise ImageNotFound(value)
+    version = digest(path)
+    content_type = mimetypes.guess_type(path)[0] or "application/octet-stream"
+    if size and PIL_AVAILABLE:
+        return thumbnail(path, version, size), content_type, version
+    return path, content_type, version
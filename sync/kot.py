@@ -0,0 +1,224 @@
+"""
+Kitchen order tickets (KOT) pushed by the tablets
+
+    POST /kot/
+    Idempotency-Key: 6f1c...          (or "idempotency_key" in the body)
+    {"tableno": "T01",
+     "lines": [{"item_code": "I00001", "qty": 2, "notes": "less spicy"}, ...]}
+
+  • validation - the table and every item code are checked against the
+                 cached dine_tables / tb_item_master data (cache.py); items
+                 with activity "N" can't be ordered. Rates and kitchens come
+                 from the item master, never the client
+  • one write  - header INSERT, then all lines in one executemany, committed
+                 together (sql_helper.db_transaction)
+  • retries    - the key is stored on the header, unique per user (two
+                 tablets may pick the same key). Sending the same key and
+                 order again returns the existing ticket instead of a new
+                 one; the same key with a different order is a conflict
+
+Tables (the POS database doesn't have them; ensure_tables() creates them
+on the first order, or run `manage.py create_kot_tables`; DDL per backend in
+db_backends.SQLANYWHERE_KOT_DDL / SQLITE_KOT_DDL):
+    dine_kot        (kotno autoincrement, tableno, userid, created, item_count,
+                     total, idempotency_key, payload_hash,
+                     UNIQUE (userid, idempotency_key))
+    dine_kot_detail (kotno, lineno, item_code, qty, rate, amount, kitchen, notes)
+
+config.json:
+  "kot_create_tables": true     # false: never run DDL, the DBA creates them
+"""
+import hashlib
+import json
+import logging
+import threading
+from datetime import datetime
+from decimal import ROUND_HALF_UP, Decimal, InvalidOperation
+
+from .config import get_config
+from .datasets import DINE_TABLES, ITEMS
+from .db_backends import get_backend
+from .sql_helper import db_cursor, db_transaction
+
+CENTS = Decimal("0.01")
+MAX_QTY = Decimal("9999")
+
+
+class KotInvalid(ValueError):
+    """The order can't be accepted as sent (400)."""
+
+
+class KotConflict(Exception):
+    """The idempotency key was already used for a different order (409)."""
+
+
+# ----------------------------- master data lookups ----------------------------
+_lookups = {}                  # dataset name -> (fingerprint, {code: row})
+_lookups_lock = threading.Lock()
+
+
+def _lookup(dataset):
+    """{natural key: row} for a cached dataset, rebuilt only when its fingerprint changes."""
+    rows, fp, _ = dataset.load({})
+    with _lookups_lock:
+        cached = _lookups.get(dataset.name)
+        if cached and cached[0] == fp:
+            return cached[1]
+    index = {row[0]: row for row in rows}
+    with _lookups_lock:
+        _lookups[dataset.name] = (fp, index)
+    return index
+
+
+# ----------------------------- parsing ----------------------------------------
+def idempotency_key(request, data):
+    key = request.headers.get("Idempotency-Key") or data.get("idempotency_key")
+    if not isinstance(key, str) or not 1 <= len(key.strip()) <= 64:
+        raise KotInvalid("Idempotency-Key header (1-64 characters) is required")
+    return key.strip()
+
+
+def _quantity(value, lineno):
+    try:
+        qty = Decimal(str(value))
+    except (InvalidOperation, ValueError):
+        raise KotInvalid(f"line {lineno}: qty must be a number")
+    if not qty.is_finite() or qty <= 0 or qty > MAX_QTY or qty != qty.quantize(CENTS):
+        raise KotInvalid(f"line {lineno}: qty must be between 0.01 and {MAX_QTY}, two decimals at most")
+    return qty.quantize(CENTS)
+
+
+def parse_order(data):
+    """(tableno, [(item_code, qty, notes), ...]) from the request body, shape-checked."""
+    tableno = data.get("tableno")
+    lines = data.get("lines")
+    if not isinstance(tableno, str) or not tableno:
+        raise KotInvalid("tableno is required")
+    max_lines = int(get_config().get("kot_max_lines", 200))
+    if not isinstance(lines, list) or not 1 <= len(lines) <= max_lines:
+        raise KotInvalid(f"lines must be a list of 1 to {max_lines} items")
+    parsed = []
+    for lineno, line in enumerate(lines, 1):
+        if not isinstance(line, dict) or not isinstance(line.get("item_code"), str):
+            raise KotInvalid(f"line {lineno}: item_code is required")
+        notes = line.get("notes") or ""
+        if not isinstance(notes, str) or len(notes) > 255:
+            raise KotInvalid(f"line {lineno}: notes must be text of at most 255 characters")
+        parsed.append((line["item_code"], _quantity(line.get("qty", 1), lineno), notes))
+    return tableno, parsed
+
+
+def payload_hash(tableno, lines):
+    canonical = json.dumps([tableno, [[c, str(q), n] for c, q, n in lines]], separators=(",", ":"))
+    return hashlib.blake2b(canonical.encode("utf-8"), digest_size=16).hexdigest()
+
+
+def price_order(tableno, lines):
+    """Detail rows (lineno, item_code, qty, rate, amount, kitchen, notes) priced from the item master."""
+    if tableno not in _lookup(DINE_TABLES):
+        raise KotInvalid(f"Unknown table {tableno}")
+    items = _lookup(ITEMS)
+    rate_at, kitchen_at = ITEMS.index["rate"], ITEMS.index["kitchen"]
+    activity_at = ITEMS.index["activity"]
+    unknown = sorted({code for code, _, _ in lines if code not in items})
+    if unknown:
+        raise KotInvalid(f"Unknown item code(s): {', '.join(unknown)}")
+    inactive = sorted({code for code, _, _ in lines if items[code][activity_at] == "N"})
+    if inactive:
+        raise KotInvalid(f"Inactive item code(s): {', '.join(inactive)}")
+    detail = []
+    for lineno, (code, qty, notes) in enumerate(lines, 1):
+        item = items[code]
+        rate = Decimal(item[rate_at] or 0).quantize(CENTS)
+        amount = (qty * rate).quantize(CENTS, rounding=ROUND_HALF_UP)
+        detail.append((lineno, code, qty, rate, amount, item[kitchen_at], notes))
+    return detail
+
+
+# ----------------------------- storage ----------------------------------------
+_tables_ready = set()          # backend keys whose KOT tables are known to exist
+_tables_lock = threading.Lock()
+
+
+def ensure_tables():
+    """Create whichever KOT tables are missing on the current backend; returns their names."""
+    backend = get_backend()
+    if backend.key in _tables_ready:
+        return []
+    with _tables_lock:
+        if backend.key in _tables_ready:
+            return []
+        created = []
+        with db_transaction() as cur:
+            for table, ddl in backend.kot_ddl():
+                cur.execute(backend.table_exists_sql(), (table,))
+                if cur.fetchone() is None:
+                    cur.execute(ddl)
+                    created.append(table)
+        _tables_ready.add(backend.key)
+    if created:
+        logging.info("🧾 Created KOT table(s): %s", ", ".join(created))
+    return created
+
+
+DETAIL_COLUMNS = ("lineno", "item_code", "qty", "rate", "amount", "kitchen", "notes")
+
+
+def _ticket(header, detail):
+    kotno, tableno, userid, created, item_count, total = header
+    return {"kotno": kotno, "tableno": tableno, "userid": userid, "created": created,
+            "item_count": item_count, "total": total,
+            "lines": [dict(zip(DETAIL_COLUMNS, row)) for row in detail]}
+
+
+def find_ticket(userid, key):
+    """(ticket, payload hash) `userid` stored under an idempotency key, or None."""
+    with db_cursor() as cur:
+        cur.execute("SELECT kotno, tableno, userid, created, item_count, total, payload_hash "
+                    "FROM dine_kot WHERE userid = ? AND idempotency_key = ?", (userid, key))
+        row = cur.fetchone()
+        if row is None:
+            return None
+        cur.execute("SELECT lineno, item_code, qty, rate, amount, kitchen, notes "
+                    "FROM dine_kot_detail WHERE kotno = ? ORDER BY lineno", (row[0],))
+        return _ticket(row[:6], cur.fetchall()), row[6]
+
+
+def _replay(existing, digest):
+    ticket, stored = existing
+    if stored != digest:
+        raise KotConflict("Idempotency-Key was already used for a different order")
+    return ticket, True
+
+
+def submit_order(userid, key, data):
+    """(ticket dict, replayed) - stores a new KOT, or returns the one `userid` already stored under `key`."""
+    tableno, lines = parse_order(data)
+    digest = payload_hash(tableno, lines)
+    if get_config().get("kot_create_tables", True):
+        ensure_tables()
+    existing = find_ticket(userid, key)
+    if existing:
+        return _replay(existing, digest)
+
+    detail = price_order(tableno, lines)
+    total = sum((row[4] for row in detail), Decimal("0.00"))
+    created = datetime.now().isoformat(timespec="seconds")
+    try:
+        with db_transaction() as cur:
+            cur.execute("INSERT INTO dine_kot (tableno, userid, created, item_count, total, "
+                        "idempotency_key, payload_hash) VALUES (?, ?, ?, ?, ?, ?, ?)",
+                        (tableno, userid, created, len(detail), total, key, digest))
+            cur.execute(get_backend().last_id_sql())
+            kotno = int(cur.fetchone()[0])
+            cur.executemany("INSERT INTO dine_kot_detail (kotno, lineno, item_code, qty, rate, "
+                            "amount, kitchen, notes) VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                            [(kotno, *row) for row in detail])
+    except Exception:
+        # a concurrent retry with the same key may have won the UNIQUE index
+        existing = find_ticket(userid, key)
+        if existing:
+            return _replay(existing, digest)
+        raise
+    logging.info("🧾 KOT %s for table %s: %d line(s) by %s", kotno, tableno, len(detail), userid)
+    return _ticket((kotno, tableno, userid, created, len(detail), total), detail), False
@@ -0,0 +1,167 @@
+"""
+Queued logging: request threads never write to the console or a file
+
+configure_logging() (called from SyncConfig.ready) puts one QueueHandler on
+the root logger. A background QueueListener thread does the slow part:
+
+  • console     - the usual "time - LEVEL - message" lines
+  • log_file    - JSON lines ({"ts", "level", "logger", "msg", ...}) rotated
+                  by size (`log_max_bytes`) or, with "log_rotate": "time", at
+                  `log_when` (default midnight); `log_backup_count` files kept
+
+When the queue (`log_queue_size`, default 10000) is full a record is dropped
+and counted instead of waiting; the count is logged once there is room.
+
+config.json:
+  "log_level": "INFO"                                          # everything
+  "log_level": {"root": "INFO", "sync.slow_queries": "WARNING",
+                "django.server": "WARNING"}                    # per logger
+  "log_file": "logs/syncservice.log"     # relative to the service directory; "" = console only
+"""
+import atexit
+import json
+import logging
+import logging.handlers
+import os
+import queue
+import threading
+from datetime import datetime
+
+from .config import get_config
+
+CONSOLE_FORMAT = "%(asctime)s - %(levelname)s - %(message)s"
+LOG_DEFAULTS = {
+    "log_level": "INFO",
+    "log_file": "logs/syncservice.log",
+    "log_rotate": "size",
+    "log_max_bytes": 10 * 1024 * 1024,
+    "log_backup_count": 5,
+    "log_when": "midnight",
+    "log_queue_size": 10000,
+    "log_console": True,
+}
+
+# LogRecord attributes that are not user `extra=` fields
+_STANDARD = set(vars(logging.LogRecord("", 0, "", 0, "", (), None))) | {"message", "asctime"}
+
+
+class JsonFormatter(logging.Formatter):
+    def format(self, record):
+        out = {
+            "ts": datetime.fromtimestamp(record.created).isoformat(timespec="milliseconds"),
+            "level": record.levelname,
+            "logger": record.name,
+            "msg": record.getMessage(),
+            "thread": record.threadName,
+        }
+        for key, value in record.__dict__.items():
+            if key not in _STANDARD and not key.startswith("_"):
+                out[key] = value
+        if record.exc_info:                    # queued records carry it in msg already
+            out["exc"] = self.formatException(record.exc_info)
+        return json.dumps(out, ensure_ascii=False, default=str)
+
+
+class _DroppingQueueHandler(logging.handlers.QueueHandler):
+    """QueueHandler that drops (and counts) records instead of blocking on a full queue."""
+
+    def __init__(self, q):
+        super().__init__(q)
+        self.dropped = 0
+
+    def enqueue(self, record):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+            return
+        if self.dropped:
+            count, self.dropped = self.dropped, 0
+            note = logging.LogRecord("sync.logs", logging.WARNING, __file__, 0,
+                                     "⚠️ %d log record(s) dropped (queue full)", (count,), None)
+            try:
+                self.queue.put_nowait(note)
+            except queue.Full:
+                self.dropped += count
+
+
+def _file_handler(cfg):
+    path = cfg["log_file"]
+    if not os.path.isabs(path):
+        path = os.path.join(get_config().service_dir, path)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    if cfg["log_rotate"] == "time":
+        handler = logging.handlers.TimedRotatingFileHandler(
+            path, when=cfg["log_when"], backupCount=int(cfg["log_backup_count"]), encoding="utf-8")
+    else:
+        handler = logging.handlers.RotatingFileHandler(
+            path, maxBytes=int(cfg["log_max_bytes"]), backupCount=int(cfg["log_backup_count"]),
+            encoding="utf-8")
+    handler.setFormatter(JsonFormatter())
+    return handler
+
+
+def _apply_levels(level):
+    levels = level if isinstance(level, dict) else {"root": level}
+    for name, value in levels.items():
+        logger = logging.getLogger(None if name == "root" else name)
+        logger.setLevel(str(value).upper())
+
+
+_listener = None
+_lock = threading.Lock()
+
+
+def configure_logging(log_file=True):
+    """
+    (Re)build the queue, listener and handlers from config.json; returns the
+    QueueHandler. `log_file=False` leaves out the file handler (test runs).
+    """
+    global _listener
+    cfg = {**LOG_DEFAULTS, **get_config().snapshot()}
+    with _lock:
+        handlers = []
+        if cfg["log_console"]:
+            console = logging.StreamHandler()
+            console.setFormatter(logging.Formatter(CONSOLE_FORMAT))
+            handlers.append(console)
+        if log_file and cfg["log_file"]:
+            handlers.append(_file_handler(cfg))
+
+        q = queue.Queue(int(cfg["log_queue_size"]))
+        queue_handler = _DroppingQueueHandler(q)
+        root = logging.getLogger()
+        previous = list(root.handlers)
+        root.addHandler(queue_handler)
+        for old in previous:
+            root.removeHandler(old)
+            if not isinstance(old, logging.handlers.QueueHandler):
+                old.close()
+        # runserver's access log has its own synchronous console handler
+        server_log = logging.getLogger("django.server")
+        server_log.handlers = []
+        server_log.propagate = True
+        _apply_levels(cfg["log_level"])
+
+        _stop_locked()                         # the old listener drains its queue first
+        _listener = logging.handlers.QueueListener(q, *handlers, respect_handler_level=True)
+        _listener.start()
+        return queue_handler
+
+
+def _stop_locked():
+    global _listener
+    if _listener is not None:
+        _listener.stop()                       # flushes what is queued
+        for handler in _listener.handlers:
+            handler.close()
+        _listener = None
+
+
+def stop_logging():
+    """Flush and stop the listener thread (process exit)."""
+    with _lock:
+        _stop_locked()
+
+
+atexit.register(stop_logging)
@@ -0,0 +1,70 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from sync import benchmarks
+
+
+class Command(BaseCommand):
+    help = "Benchmark every sync endpoint against the seeded SQLite stand-in and compare to a baseline."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--sizes", default=",".join(map(str, benchmarks.DEFAULT_SIZES)),
+                            help="comma-separated tb_item_master row counts (default: %(default)s)")
+        parser.add_argument("--iterations", type=int, default=50)
+        parser.add_argument("--warmup", type=int, default=5)
+        parser.add_argument("--endpoint", action="append", dest="endpoints",
+                            help="only this endpoint (repeatable), e.g. --endpoint items")
+        parser.add_argument("--query-latency-ms", type=float, default=0,
+                            help="injected per-execute latency on the stand-in")
+        parser.add_argument("--connect-latency-ms", type=float, default=0,
+                            help="injected per-connect latency on the stand-in")
+        parser.add_argument("--baseline", default=benchmarks.DEFAULT_BASELINE)
+        parser.add_argument("--save-baseline", action="store_true",
+                            help="store this run as the new baseline")
+        parser.add_argument("--middleware", action="store_true",
+                            help="compare the full and API-only middleware profiles instead")
+        parser.add_argument("--tolerance", type=float, default=0.25,
+                            help="allowed p50 slowdown vs baseline, as a fraction (default: %(default)s)")
+
+    def handle(self, *args, **opts):
+        try:
+            sizes = [int(s) for s in opts["sizes"].split(",") if s.strip()]
+        except ValueError:
+            raise CommandError("--sizes must be comma-separated integers")
+
+        if opts["middleware"]:
+            run = benchmarks.run_middleware_benchmark(
+                iterations=opts["iterations"],
+                warmup=opts["warmup"],
+                endpoints=opts["endpoints"] or benchmarks.MIDDLEWARE_ENDPOINTS,
+                size=sizes[0],
+                log=lambda msg: self.stderr.write(msg),
+            )
+            self.stdout.write(benchmarks.format_middleware_report(run))
+            return
+
+        run = benchmarks.run_benchmarks(
+            sizes=sizes,
+            iterations=opts["iterations"],
+            warmup=opts["warmup"],
+            endpoints=opts["endpoints"],
+            config={
+                "sqlite_query_latency_ms": opts["query_latency_ms"],
+                "sqlite_connect_latency_ms": opts["connect_latency_ms"],
+            },
+            log=lambda msg: self.stderr.write(msg),
+        )
+        baseline = None if opts["save_baseline"] else benchmarks.load_baseline(opts["baseline"])
+        self.stdout.write(benchmarks.format_report(run, baseline))
+
+        if opts["save_baseline"]:
+            benchmarks.save_baseline(run, opts["baseline"])
+            self.stdout.write(self.style.SUCCESS(f"Baseline saved to {opts['baseline']}"))
+            return
+        if baseline is None:
+            self.stdout.write(f"No baseline at {opts['baseline']}; run with --save-baseline to create one.")
+            return
+
+        regressions = benchmarks.compare(run, baseline, tolerance=opts["tolerance"])
+        if regressions:
+            raise CommandError("Performance regressions:\n  " + "\n  ".join(regressions))
+        self.stdout.write(self.style.SUCCESS("No regressions against baseline."))
@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+
+from sync.kot import ensure_tables
+
+
+class Command(BaseCommand):
+    help = "Create the dine_kot / dine_kot_detail tables POST /kot/ writes to, if they are missing."
+
+    def handle(self, *args, **opts):
+        created = ensure_tables()
+        if created:
+            self.stdout.write(f"Created: {', '.join(created)}")
+        else:
+            self.stdout.write("KOT tables already exist")
@@ -0,0 +1,164 @@
+"""
+In-process request metrics, exposed at GET /metrics (Prometheus text format)
+
+ServerTimingMiddleware hands every finished request to metrics.observe():
+
+    sync_requests_total{route, method, status}              counter
+    sync_request_duration_seconds{route}                    histogram
+    sync_phase_duration_seconds{route, phase}               histogram
+        phase = queue, connect, query, fetch, db, rows, json, compress, ...
+                (the Server-Timing phases, see timing.py)
+
+`route` is the URL pattern ("/items/<str:item_code>/image"), never the raw
+path, so the label set stays small; requests that match no route count as
+"unmatched". Streamed bodies are measured up to the first byte.
+
+Recording is a bisect and a few integer adds under one lock. Gauges (pool,
+DB admission, caches) are read from their owners only when /metrics is
+scraped.
+"""
+import threading
+from bisect import bisect_left
+
+BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+
+class Histogram:
+    __slots__ = ("counts", "sum")
+
+    def __init__(self):
+        self.counts = [0] * (len(BUCKETS) + 1)        # last slot: above the largest bucket
+        self.sum = 0.0
+
+    def observe(self, seconds):
+        self.counts[bisect_left(BUCKETS, seconds)] += 1
+        self.sum += seconds
+
+
+def _label(value):
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _labels(**labels):
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{k}="{_label(v)}"' for k, v in labels.items()) + "}"
+
+
+def route_of(request):
+    match = getattr(request, "resolver_match", None)
+    return "/" + match.route if match is not None and match.route is not None else "unmatched"
+
+
+class Metrics:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.requests = {}            # (route, method, status) -> count
+        self.durations = {}           # route -> Histogram
+        self.phases = {}              # (route, phase) -> Histogram
+
+    def observe(self, request, status, timings):
+        route = route_of(request)
+        with self._lock:
+            key = (route, request.method, status)
+            self.requests[key] = self.requests.get(key, 0) + 1
+            for name, seconds in timings.items():
+                if name == "total":
+                    hist = self.durations.get(route) or self.durations.setdefault(route, Histogram())
+                else:
+                    hist = self.phases.get((route, name)) or self.phases.setdefault((route, name), Histogram())
+                hist.observe(seconds)
+
+    def reset(self):
+        with self._lock:
+            self.requests.clear()
+            self.durations.clear()
+            self.phases.clear()
+
+    # -------------------------- exposition ----------------------------------
+    def _histogram_lines(self, name, labels, hist):
+        cumulative = 0
+        for le, count in zip(BUCKETS, hist.counts):
+            cumulative += count
+            yield f"{name}_bucket{_labels(**labels, le=le)} {cumulative}"
+        total = cumulative + hist.counts[-1]
+        yield f'{name}_bucket{_labels(**labels, le="+Inf")} {total}'
+        yield f"{name}_sum{_labels(**labels)} {hist.sum:.6f}"
+        yield f"{name}_count{_labels(**labels)} {total}"
+
+    def render(self):
+        lines = []
+        with self._lock:
+            lines += ["# HELP sync_requests_total Requests handled, by route, method and status.",
+                      "# TYPE sync_requests_total counter"]
+            for (route, method, status), count in sorted(self.requests.items()):
+                lines.append(f"sync_requests_total{_labels(route=route, method=method, status=status)} {count}")
+            lines += ["# HELP sync_request_duration_seconds Time until the response (first byte when streamed).",
+                      "# TYPE sync_request_duration_seconds histogram"]
+            for route, hist in sorted(self.durations.items()):
+                lines += self._histogram_lines("sync_request_duration_seconds", {"route": route}, hist)
+            lines += ["# HELP sync_phase_duration_seconds Time per request phase (see Server-Timing).",
+                      "# TYPE sync_phase_duration_seconds histogram"]
+            for (route, name), hist in sorted(self.phases.items()):
+                lines += self._histogram_lines("sync_phase_duration_seconds",
+                                               {"route": route, "phase": name}, hist)
+        lines += _gauge_lines()
+        return "\n".join(lines) + "\n"
+
+
+def _gauges():
+    """(name, type, help, [(labels, value)]) read from the pool, limiter and caches."""
+    from .cache import master_cache
+    from .compression import compressed_bodies
+    from .sql_helper import get_limiter, pool_stats
+    from .user_context import user_contexts
+
+    out = []
+    pool = pool_stats()
+    if pool is not None:
+        for key in ("size", "idle", "in_use", "max_size"):
+            out.append((f"sync_db_pool_{key}", "gauge", f"Connection pool {key.replace('_', ' ')}.",
+                        [({}, pool[key])]))
+    admission = get_limiter().stats()
+    out += [
+        ("sync_db_admission_active", "gauge", "Requests holding a DB slot.", [({}, admission["active"])]),
+        ("sync_db_admission_waiting", "gauge", "Requests queued for a DB slot.", [({}, admission["waiting"])]),
+        ("sync_db_admission_rejected_total", "counter", "Requests answered 503 (queue full or wait timed out).",
+         [({}, admission["rejected"] + admission["timed_out"])]),
+    ]
+    cache = master_cache.stats()
+    datasets = sorted(cache["datasets"].items())
+    out += [
+        ("sync_cache_bytes", "gauge", "Master data cache size.", [({}, cache["bytes"])]),
+        ("sync_cache_entries", "gauge", "Master data cache entries, by dataset.",
+         [({"dataset": name}, s["entries"]) for name, s in datasets]),
+        ("sync_cache_hits_total", "counter", "Master data cache hits, by dataset.",
+         [({"dataset": name}, s.get("hits", 0)) for name, s in datasets]),
+        ("sync_cache_misses_total", "counter", "Master data cache misses, by dataset.",
+         [({"dataset": name}, s.get("misses", 0)) for name, s in datasets]),
+    ]
+    compressed = compressed_bodies.stats()
+    out += [
+        ("sync_compressed_cache_bytes", "gauge", "Cached compressed bodies size.", [({}, compressed["bytes"])]),
+        ("sync_compressed_cache_hits_total", "counter", "Compressed body cache hits.", [({}, compressed["hits"])]),
+    ]
+    users = user_contexts.stats()
+    out += [
+        ("sync_user_contexts", "gauge", "Cached user contexts.", [({}, users["users"])]),
+        ("sync_user_context_db_loads_total", "counter", "User settings reads from the DB.",
+         [({}, users["db_loads"])]),
+    ]
+    return out
+
+
+def _gauge_lines():
+    lines = []
+    for name, kind, help_text, samples in _gauges():
+        lines += [f"# HELP {name} {help_text}", f"# TYPE {name} {kind}"]
+        for labels, value in samples:
+            lines.append(f"{name}{_labels(**labels)} {value}")
+    return lines
+
+
+metrics = Metrics()
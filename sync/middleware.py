@@ -0,0 +1,98 @@
+import time
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.utils.cache import patch_vary_headers
+
+from .compression import choose_encoding, compress, compressed_bodies
+from .config import get_config
+from .metrics import metrics
+from .timing import end_request, format_server_timing, phase, start_request
+
+
+class ServerTimingMiddleware:
+    """Collect phase timings for each request, expose them as Server-Timing and record them for /metrics."""
+    sync_capable = async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        timings, token = start_request()
+        started = time.perf_counter()
+        try:
+            response = self.get_response(request)
+            timings["total"] = time.perf_counter() - started
+            response["Server-Timing"] = format_server_timing(timings)
+            metrics.observe(request, response.status_code, timings)
+            return response
+        finally:
+            end_request(token)
+
+    async def __acall__(self, request):
+        timings, token = start_request()
+        started = time.perf_counter()
+        try:
+            response = await self.get_response(request)
+            timings["total"] = time.perf_counter() - started
+            response["Server-Timing"] = format_server_timing(timings)
+            metrics.observe(request, response.status_code, timings)
+            return response
+        finally:
+            end_request(token)
+
+
+class CompressionMiddleware:
+    """
+    gzip/brotli for the API responses (JSON, msgpack, CBOR), negotiated via
+    Accept-Encoding. Bodies with an ETag are compressed once and reused
+    (see compression.py).
+    """
+    COMPRESSIBLE = ("application/json", "application/msgpack", "application/cbor")
+    sync_capable = async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        return self.process(request, self.get_response(request))
+
+    async def __acall__(self, request):
+        return self.process(request, await self.get_response(request))
+
+    def process(self, request, response):
+        if (response.streaming or response.status_code != 200
+                or response.has_header("Content-Encoding")
+                or not response.get("Content-Type", "").startswith(self.COMPRESSIBLE)):
+            return response
+
+        patch_vary_headers(response, ("Accept-Encoding",))
+        body = response.content
+        if len(body) < int(get_config().get("compress_min_bytes", 1024)):
+            return response
+        encoding = choose_encoding(request.headers.get("Accept-Encoding"))
+        if encoding is None:
+            return response
+
+        etag = response.get("ETag")
+        key = (request.get_full_path(), response["Content-Type"], etag, encoding) if etag else None
+        with phase("compress"):
+            compressed = compressed_bodies.get(key) if key else None
+            if compressed is None:
+                compressed = compress(body, encoding)
+                if key:
+                    compressed_bodies.put(key, compressed)
+        if len(compressed) >= len(body):
+            return response
+
+        response.content = compressed
+        response["Content-Encoding"] = encoding
+        response["Content-Length"] = str(len(compressed))
+        return response
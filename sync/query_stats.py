@@ -0,0 +1,112 @@
+"""
+Rolling per-query statistics and the slow-query log
+
+sql_helper.db_cursor() hands out an InstrumentedCursor, which reports each
+statement here once it is done (next execute, or cursor close):
+
+    fingerprint   SQL with literals, numbers and IN-lists replaced by ?,
+                  whitespace collapsed ("... WHERE item_code = ?"), plus a
+                  short hash of it used as the id
+    calls / errors / rows / bytes (approximate payload: text and binary
+    column lengths, 8 per other non-NULL value)
+    total / max time, execute and fetch included
+
+Statements slower than `slow_query_ms` (config.json, default 500; 0 turns
+it off) are logged on the "sync.slow_queries" logger without their
+parameters, and the last 50 are kept for GET /db/queries.
+At most `query_stats_max` fingerprints (default 500) are tracked; the one
+with the least total time makes room for a new one.
+"""
+import hashlib
+import logging
+import re
+import threading
+import time
+from collections import deque
+from functools import lru_cache
+from itertools import chain
+
+from .config import get_config
+
+slow_log = logging.getLogger("sync.slow_queries")
+
+_STRING = re.compile(r"'(?:[^']|'')*'")
+_NUMBER = re.compile(r"\b\d+(?:\.\d+)?\b")
+_IN_LIST = re.compile(r"\bIN\s*\(\s*\?(?:\s*,\s*\?)*\s*\)", re.IGNORECASE)
+_SPACE = re.compile(r"\s+")
+
+
+@lru_cache(maxsize=1024)
+def fingerprint(sql):
+    """(normalized SQL, 12-hex-digit id) for a statement."""
+    text = _STRING.sub("?", sql)
+    text = _NUMBER.sub("?", text)
+    text = _IN_LIST.sub("IN (?...)", text)
+    text = _SPACE.sub(" ", text).strip()
+    return text, hashlib.blake2b(text.encode("utf-8"), digest_size=6).hexdigest()
+
+
+def row_bytes(rows):
+    size = 0
+    for value in chain.from_iterable(rows):
+        if isinstance(value, (str, bytes)):
+            size += len(value)
+        elif value is not None:
+            size += 8
+    return size
+
+
+class QueryStats:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._entries = {}                 # id -> stats dict
+        self.slow = deque(maxlen=50)
+
+    def _limits(self):
+        cfg = get_config()
+        return float(cfg.get("slow_query_ms", 500) or 0), int(cfg.get("query_stats_max", 500))
+
+    def record(self, sql, seconds, rows=0, nbytes=0, error=False):
+        text, qid = fingerprint(sql)
+        slow_ms, max_entries = self._limits()
+        with self._lock:
+            entry = self._entries.get(qid)
+            if entry is None:
+                if len(self._entries) >= max_entries:
+                    del self._entries[min(self._entries, key=lambda k: self._entries[k]["total"])]
+                entry = self._entries[qid] = {"id": qid, "sql": text, "calls": 0, "errors": 0,
+                                              "rows": 0, "bytes": 0, "total": 0.0, "max": 0.0}
+            entry["calls"] += 1
+            entry["errors"] += bool(error)
+            entry["rows"] += rows
+            entry["bytes"] += nbytes
+            entry["total"] += seconds
+            if seconds > entry["max"]:
+                entry["max"] = seconds
+        ms = seconds * 1000
+        if slow_ms and ms >= slow_ms:
+            self.slow.append({"id": qid, "sql": text, "ms": round(ms, 3), "rows": rows,
+                              "at": time.strftime("%Y-%m-%dT%H:%M:%S")})
+            slow_log.warning("🐢 Slow query %.1fms, %d rows [%s] %s", ms, rows, qid, text)
+
+    def top(self, n=20, sort="total"):
+        """The `n` fingerprints with the highest total/avg/max time or calls; times in ms."""
+        with self._lock:
+            entries = [dict(e) for e in self._entries.values()]
+        for e in entries:
+            e["avg"] = e["total"] / e["calls"] if e["calls"] else 0.0
+        entries.sort(key=lambda e: e[sort], reverse=True)
+        out = []
+        for e in entries[:n]:
+            for key in ("total", "max", "avg"):
+                e[f"{key}_ms"] = round(e.pop(key) * 1000, 3)
+            out.append(e)
+        return out
+
+    def reset(self):
+        with self._lock:
+            self._entries.clear()
+            self.slow.clear()
+
+
+query_stats = QueryStats()
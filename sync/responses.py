@@ -0,0 +1,112 @@
+"""
+Response encoding shared by every view
+
+api_response(request, payload) returns JSON unless the client's Accept
+header prefers a binary encoding of the same payload:
+
+    Accept: application/msgpack   (or application/x-msgpack)
+    Accept: application/cbor
+
+Type mapping (JSON keeps what DjangoJSONEncoder does):
+
+                      json / msgpack           cbor
+    Decimal           string "61.00"           tag 4 decimal fraction (exact)
+    datetime          ISO-8601 string          tag 0 date/time string (local zone)
+    date              ISO-8601 string          tag 1004 full-date (RFC 8943)
+
+Both binary encoders are optional (`msgpack`, `cbor2` packages); a format
+whose package is missing is never chosen, so those clients get JSON.
+"""
+import json
+from datetime import date, datetime
+from decimal import Decimal
+
+from django.core.serializers.json import DjangoJSONEncoder
+from django.http import HttpResponse, JsonResponse
+from django.utils.cache import patch_vary_headers
+
+try:
+    import msgpack
+    MSGPACK_AVAILABLE = True
+except ImportError:
+    MSGPACK_AVAILABLE = False
+
+try:
+    import cbor2
+    CBOR_AVAILABLE = True
+except ImportError:
+    CBOR_AVAILABLE = False
+
+JSON = "application/json"
+MSGPACK = "application/msgpack"
+CBOR = "application/cbor"
+
+_ALIASES = {"application/x-msgpack": MSGPACK, "application/vnd.msgpack": MSGPACK}
+_LOCAL_TZ = datetime.now().astimezone().tzinfo
+
+
+def _available():
+    return [JSON] + ([MSGPACK] if MSGPACK_AVAILABLE else []) + ([CBOR] if CBOR_AVAILABLE else [])
+
+
+def negotiate(accept):
+    """Content type to answer with for an Accept header; JSON unless a binary type is preferred."""
+    best, best_q = JSON, 0.0
+    available = _available()
+    for part in (accept or "").split(","):
+        media, *params = [p.strip() for p in part.split(";")]
+        media = _ALIASES.get(media.lower(), media.lower())
+        if media not in available:
+            continue
+        q = 1.0
+        for param in params:
+            if param.startswith("q="):
+                try:
+                    q = float(param[2:])
+                except ValueError:
+                    q = 0.0
+        # ties go to JSON (listed first), so "*/*, application/cbor" stays JSON
+        if q > best_q or (q == best_q and media == JSON):
+            best, best_q = media, q
+    return best
+
+
+def _msgpack_default(obj):
+    if isinstance(obj, Decimal):
+        return str(obj)
+    if isinstance(obj, (datetime, date)):
+        return obj.isoformat()
+    raise TypeError(f"Cannot encode {type(obj).__name__} as msgpack")
+
+
+def encode(payload, content_type):
+    if content_type == MSGPACK:
+        return msgpack.packb(payload, default=_msgpack_default, use_bin_type=True)
+    if content_type == CBOR:
+        return cbor2.dumps(payload, timezone=_LOCAL_TZ, date_as_datetime=False)
+    raise ValueError(content_type)
+
+
+def api_response(request, payload, status=200, plain=False):
+    """
+    `payload` encoded as the client asked. `plain` means the payload only
+    holds json-native types (columnar rows), so JSON skips DjangoJSONEncoder.
+    """
+    content_type = negotiate(request.headers.get("Accept")) if request is not None else JSON
+    if content_type == JSON:
+        response = JsonResponse(payload, status=status,
+                                encoder=json.JSONEncoder if plain else DjangoJSONEncoder)
+    else:
+        response = HttpResponse(encode(payload, content_type), content_type=content_type,
+                                status=status)
+    patch_vary_headers(response, ("Accept",))
+    return response
+
+
+def decode(body, content_type):
+    """Inverse of encode() (JSON for anything else)."""
+    if content_type.startswith(MSGPACK):
+        return msgpack.unpackb(body, raw=False)
+    if content_type.startswith(CBOR):
+        return cbor2.loads(body)
+    return json.loads(body)
@@ -0,0 +1,206 @@
+"""
+Threaded WSGI server for production ("server": "threaded" in config.json)
+
+Django's runserver is a development server: one thread per connection with
+no upper bound, no keep-alive and no way to stop it cleanly. This server
+keeps the same standard-library base (wsgiref) but
+
+  • runs requests on a fixed pool of `server_threads` workers; when all are
+    busy it stops accepting, so extra tablets wait in the listen backlog
+    (`server_backlog`) instead of piling up threads
+  • speaks HTTP/1.1 keep-alive; an idle connection is closed after
+    `server_keepalive_timeout` seconds (it holds a worker while open)
+  • gives a client `server_request_timeout` seconds of socket inactivity
+    while sending a request or reading the response
+  • on CTRL-C / CTRL-BREAK / SIGTERM stops accepting, lets running requests
+    finish for up to `server_shutdown_timeout` seconds, then exits
+
+Responses without a Content-Length (streamed lists) close the connection.
+"""
+import logging
+import signal
+import socket
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from wsgiref.simple_server import ServerHandler, WSGIRequestHandler, WSGIServer
+
+SERVER_DEFAULTS = {
+    "server_threads": 16,
+    "server_backlog": 128,
+    "server_keepalive_timeout": 5,
+    "server_request_timeout": 30,
+    "server_shutdown_timeout": 10,
+}
+
+
+class _BodyReader:
+    """wsgi.input limited to Content-Length; the unread rest is drained after the response."""
+
+    def __init__(self, rfile, length):
+        self._rfile = rfile
+        self._left = length
+
+    def read(self, size=-1):
+        if self._left <= 0:
+            return b""
+        size = self._left if size is None or size < 0 else min(size, self._left)
+        data = self._rfile.read(size)
+        self._left -= len(data)
+        return data
+
+    def readline(self, size=-1):
+        if self._left <= 0:
+            return b""
+        size = self._left if size is None or size < 0 else min(size, self._left)
+        data = self._rfile.readline(size)
+        self._left -= len(data)
+        return data
+
+    def readlines(self, hint=-1):
+        return list(iter(self.readline, b""))
+
+    def __iter__(self):
+        return iter(self.readline, b"")
+
+    def drain(self):
+        while self.read(65536):
+            pass
+
+
+class _ResponseHandler(ServerHandler):
+    http_version = "1.1"
+
+    def cleanup_headers(self):
+        super().cleanup_headers()
+        rh = self.request_handler
+        if "Content-Length" not in self.headers or rh.server.stopping:
+            rh.close_connection = True
+        if rh.close_connection:
+            self.headers["Connection"] = "close"
+
+
+class _RequestHandler(WSGIRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def handle(self):
+        server = self.server
+        self.close_connection = False
+        timeout = server.request_timeout
+        while not self.close_connection and not server.stopping:
+            self.connection.settimeout(timeout)
+            try:
+                self.raw_requestline = self.rfile.readline(65537)
+            except (socket.timeout, OSError):
+                return
+            if not self.raw_requestline:
+                return
+            self.connection.settimeout(server.request_timeout)
+            if len(self.raw_requestline) > 65536:
+                self.requestline = self.request_version = self.command = ""
+                self.send_error(414)
+                return
+            if not self.parse_request():
+                return
+            if "chunked" in self.headers.get("Transfer-Encoding", "").lower():
+                self.send_error(411)          # the API only takes sized bodies
+                return
+            self._run_app()
+            timeout = server.keepalive_timeout
+
+    def _run_app(self):
+        try:
+            length = int(self.headers.get("Content-Length") or 0)
+        except ValueError:
+            length = 0
+        body = _BodyReader(self.rfile, length)
+        handler = _ResponseHandler(body, self.wfile, self.get_stderr(), self.get_environ(),
+                                   multithread=True)
+        handler.request_handler = self
+        handler.run(self.server.get_app())
+        body.drain()
+
+    def log_message(self, format, *args):
+        logging.info("🌐 %s %s", self.address_string(), format % args)
+
+
+class ThreadedWSGIServer(WSGIServer):
+    def __init__(self, address, app, threads=16, backlog=128, keepalive_timeout=5,
+                 request_timeout=30, shutdown_timeout=10):
+        self.request_queue_size = backlog     # listen() backlog, used by server_activate
+        super().__init__(address, _RequestHandler)
+        self.set_app(app)
+        self.keepalive_timeout = keepalive_timeout
+        self.request_timeout = request_timeout
+        self.shutdown_timeout = shutdown_timeout
+        self.threads = threads
+        self.stopping = False
+        self._pool = ThreadPoolExecutor(max_workers=threads, thread_name_prefix="http")
+        self._slots = threading.BoundedSemaphore(threads)
+        self._active = 0
+        self._idle = threading.Condition()
+
+    @classmethod
+    def from_config(cls, address, app, cfg):
+        opts = {k: cfg.get(k, v) for k, v in SERVER_DEFAULTS.items()}
+        return cls(address, app,
+                   threads=int(opts["server_threads"]),
+                   backlog=int(opts["server_backlog"]),
+                   keepalive_timeout=float(opts["server_keepalive_timeout"]),
+                   request_timeout=float(opts["server_request_timeout"]),
+                   shutdown_timeout=float(opts["server_shutdown_timeout"]))
+
+    def process_request(self, request, client_address):
+        # blocks the accept loop while every worker is busy (backpressure)
+        self._slots.acquire()
+        with self._idle:
+            self._active += 1
+        self._pool.submit(self._process, request, client_address)
+
+    def _process(self, request, client_address):
+        try:
+            self.finish_request(request, client_address)
+        except Exception:
+            self.handle_error(request, client_address)
+        finally:
+            self.shutdown_request(request)
+            self._slots.release()
+            with self._idle:
+                self._active -= 1
+                self._idle.notify_all()
+
+    def handle_error(self, request, client_address):
+        logging.exception("❌ Error serving %s", client_address)
+
+    def stop(self):
+        """Stop accepting, wait for running requests (bounded), release the socket."""
+        if self.stopping:
+            return
+        self.stopping = True
+        logging.info("🛑 Shutting down, waiting for %d connection(s)...", self._active)
+        self.shutdown()                       # returns once serve_forever has exited
+        with self._idle:
+            if not self._idle.wait_for(lambda: self._active == 0, self.shutdown_timeout):
+                logging.warning("⚠️ %d connection(s) still open after %.0fs",
+                                self._active, self.shutdown_timeout)
+        self._pool.shutdown(wait=False)
+        self.server_close()
+
+    def serve(self):
+        """serve_forever with CTRL-C / CTRL-BREAK / SIGTERM mapped to a graceful stop."""
+        stopper = threading.Thread(target=self.stop, name="http-stop")
+
+        def _on_signal(signum, frame):
+            # shutdown() waits for serve_forever, which runs on this thread
+            if not stopper.is_alive() and not self.stopping:
+                stopper.start()
+
+        for name in ("SIGINT", "SIGTERM", "SIGBREAK"):
+            if hasattr(signal, name):
+                signal.signal(getattr(signal, name), _on_signal)
+        try:
+            self.serve_forever()
+        finally:
+            if stopper.is_alive():
+                stopper.join()
+            else:
+                self.stop()
@@ -1,86 +1,558 @@
 """
 SQL Helper - Database connection management for SyncService
-Handles SAP SQL Anywhere database connections
+Handles SAP SQL Anywhere database connections (or the SQLite stand-in, see db_backends)
 """
-import os
-import json
-from pathlib import Path
-
-# Try to import sqlanydb, but don't fail if it's not available
-try:
-    import sqlanydb
-    SQLANYDB_AVAILABLE = True
-except ImportError:
-    SQLANYDB_AVAILABLE = False
-    print("WARNING: sqlanydb module not found. Database connections will not work.")
-    print("Install SAP SQL Anywhere client and run: pip install sqlanydb")
+import threading
+import time
+from collections import deque
+from contextlib import ExitStack, contextmanager
+
+from .config import get_config
+from .db_backends import SQLANYDB_AVAILABLE, get_backend
+from .query_stats import query_stats, row_bytes
+from .timing import current_timings, phase
+
+# Pool defaults (override in config.json)
+POOL_DEFAULTS = {
+    "pool_min_size": 2,          # connections opened ahead of demand and kept even when idle
+    "pool_max_size": 10,         # hard cap on open connections
+    "pool_idle_timeout": 300,    # seconds before a spare idle connection is closed
+    "pool_acquire_timeout": 10,  # seconds to wait for a free connection
+    "pool_ping_interval": 30,    # re-check liveness if idle longer than this
+}
+
+# Admission control defaults (override in config.json)
+ADMISSION_DEFAULTS = {
+    "db_max_concurrent": None,   # queries at once; None = pool_max_size
+    "db_queue_size": 50,         # requests allowed to wait for a slot
+    "db_queue_timeout": 5,       # seconds a request may wait before a 503
+}
 
 def _get_config():
-    """Load configuration from config.json"""
-    try:
-        # Look for config.json in parent directories
-        current_dir = Path(__file__).parent
-        config_paths = [
-            current_dir / "config.json",
-            current_dir.parent / "config.json",
-            current_dir.parent.parent / "config.json",
-        ]
-        
-        for config_path in config_paths:
-            if config_path.exists():
-                with open(config_path, 'r') as f:
-                    return json.load(f)
-        
-        # Return defaults if no config found
-        return {
-            "dsn": "pktc",
-            "db_uid": "dba",
-            "db_pwd": "sql"
-        }
-    except Exception as e:
-        print(f"Error loading config: {e}")
-        return {
-            "dsn": "pktc",
-            "db_uid": "dba",
-            "db_pwd": "sql"
-        }
+    """Current config.json (+ defaults), served from the in-memory cache in sync.config"""
+    return get_config().snapshot()
 
 def get_connection():
     """
-    Get a database connection to SAP SQL Anywhere
-    Returns a sqlanydb connection object
-    """
-    if not SQLANYDB_AVAILABLE:
-        raise ImportError(
-            "sqlanydb module not installed. "
-            "Install SAP SQL Anywhere client and run: pip install sqlanydb"
-        )
-    
-    config = _get_config()
-    
-    # Get credentials from environment variables or config
-    dsn = os.getenv("DB_DSN", config.get("dsn", "pktc"))
-    uid = os.getenv("DB_UID", config.get("db_uid", "dba"))
-    pwd = os.getenv("DB_PWD", config.get("db_pwd", "sql"))
-    
-    try:
-        conn = sqlanydb.connect(
-            DSN=dsn,
-            UID=uid,
-            PWD=pwd
-        )
-        return conn
-    except Exception as e:
-        print(f"Database connection failed: {e}")
-        print(f"DSN: {dsn}, UID: {uid}")
-        raise
+    Get a new (unpooled) database connection from the configured backend:
+    SAP SQL Anywhere via sqlanydb, or the SQLite stand-in (see db_backends)
+    """
+    return get_backend().connect()
+
+# ----------------------------- pooling ---------------------------------------
+class PoolTimeout(Exception):
+    """Raised when no pooled connection became free within the acquire timeout."""
+
+
+class _PooledConnection:
+    __slots__ = ("raw", "created", "last_used", "generation")
+
+    def __init__(self, raw, generation):
+        self.raw = raw
+        self.generation = generation
+        self.created = self.last_used = time.monotonic()
+
+
+class ConnectionPool:
+    """
+    Thread-safe pool of DB-API connections.
+
+    • at most `max_size` connections are open at once; extra callers wait
+      up to `acquire_timeout` seconds and then get PoolTimeout
+    • warm_in_background() opens connections until `min_size` are open, so
+      the first requests don't pay for the connect; spare connections idle
+      longer than `idle_timeout` are closed, but never below `min_size`
+    • a connection idle longer than `ping_interval` is checked with
+      SELECT 1 on checkout and silently replaced if it is dead
+    """
+
+    def __init__(self, factory=get_connection, min_size=2, max_size=10,
+                 idle_timeout=300, acquire_timeout=10, ping_interval=30):
+        self._factory = factory
+        self._idle = deque()             # most recently used on the right
+        self._in_use = {}                # id(raw) -> _PooledConnection
+        self._size = 0                   # idle + in use + being opened
+        self._generation = 0             # bumped by invalidate()
+        self._cond = threading.Condition()
+        self._closed = False
+        self._warming = False
+        self.configure(min_size, max_size, idle_timeout, acquire_timeout, ping_interval)
+
+    def configure(self, min_size, max_size, idle_timeout, acquire_timeout, ping_interval):
+        """Apply new limits; a smaller max_size takes effect as connections come back."""
+        if max_size < 1:
+            raise ValueError("max_size must be at least 1")
+        with self._cond:
+            self.min_size = max(0, min(min_size, max_size))
+            self.max_size = max_size
+            self.idle_timeout = idle_timeout
+            self.acquire_timeout = acquire_timeout
+            self.ping_interval = ping_interval
+            self._cond.notify_all()
+
+    def invalidate(self):
+        """
+        Retire every current connection (e.g. after a DSN change): idle ones
+        are closed now, checked-out ones when they are released.
+        """
+        with self._cond:
+            self._generation += 1
+            idle, self._idle = list(self._idle), deque()
+        for pooled in idle:
+            self._discard(pooled)
+
+    # -- checkout / checkin ---------------------------------------------------
+    def acquire(self, timeout=None):
+        """Check out a live connection (blocks while the pool is exhausted)."""
+        timeout = self.acquire_timeout if timeout is None else timeout
+        deadline = time.monotonic() + timeout
+        while True:
+            pooled = None
+            with self._cond:
+                if self._closed:
+                    raise RuntimeError("Connection pool is closed")
+                self._prune_idle()
+                if self._idle:
+                    pooled = self._idle.pop()
+                elif self._size < self.max_size:
+                    self._size += 1
+                else:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        raise PoolTimeout(
+                            f"No database connection free after {timeout}s "
+                            f"(pool max_size={self.max_size})"
+                        )
+                    self._cond.wait(remaining)
+                    continue
+
+            if pooled is None:
+                pooled = self._open()
+            elif not self._is_alive(pooled):
+                self._discard(pooled)
+                continue
+
+            with self._cond:
+                self._in_use[id(pooled.raw)] = pooled
+            return pooled.raw
+
+    def release(self, raw, discard=False):
+        """
+        Return a connection; `discard=True` closes it instead of reusing it.
+        A kept connection is rolled back first, so a read's open transaction
+        (and its locks) doesn't travel back into the pool; one that cannot
+        roll back is dropped.
+        """
+        with self._cond:
+            pooled = self._in_use.pop(id(raw), None)
+        if pooled is None:
+            return
+        if not discard:
+            try:
+                raw.rollback()
+            except Exception:
+                discard = True
+        with self._cond:
+            keep = not (discard or self._closed
+                        or pooled.generation != self._generation
+                        or self._size > self.max_size)
+            if keep:
+                pooled.last_used = time.monotonic()
+                self._idle.append(pooled)
+                self._cond.notify()
+        if not keep:
+            self._discard(pooled)
+
+    @contextmanager
+    def connection(self, timeout=None):
+        """
+        with pool.connection() as conn: ...
+        Always rolled back on check-in (see release()); commit inside the block.
+        """
+        raw = self.acquire(timeout)
+        try:
+            yield raw
+        finally:
+            self.release(raw)
+
+    # -- maintenance ----------------------------------------------------------
+    def warm(self):
+        """Open connections until `min_size` are open; stops quietly at the first failed connect."""
+        while True:
+            with self._cond:
+                if self._closed or self._size >= self.min_size:
+                    return
+                self._size += 1
+            try:
+                pooled = self._open()
+            except Exception:
+                return                   # DB unreachable: checkout will report it
+            with self._cond:
+                keep = not self._closed and pooled.generation == self._generation
+                if keep:
+                    self._idle.append(pooled)
+                    self._cond.notify()
+            if not keep:
+                self._discard(pooled)
+
+    def warm_in_background(self):
+        """warm() on a daemon thread (one at a time), so callers never wait for connects."""
+        with self._cond:
+            if self._warming or self._closed or self._size >= self.min_size:
+                return
+            self._warming = True
+
+        def run():
+            try:
+                self.warm()
+            finally:
+                with self._cond:
+                    self._warming = False
+
+        threading.Thread(target=run, name="pool-warm", daemon=True).start()
+
+    def close(self):
+        """Close idle connections now; in-use ones are closed when released."""
+        with self._cond:
+            self._closed = True
+            idle, self._idle = list(self._idle), deque()
+            self._cond.notify_all()
+        for pooled in idle:
+            self._discard(pooled)
+
+    def stats(self):
+        with self._cond:
+            return {
+                "size": self._size,
+                "idle": len(self._idle),
+                "in_use": len(self._in_use),
+                "min_size": self.min_size,
+                "max_size": self.max_size,
+            }
+
+    # -- internals ------------------------------------------------------------
+    def _open(self):
+        try:
+            return _PooledConnection(self._factory(), self._generation)
+        except BaseException:
+            with self._cond:
+                self._size -= 1
+                self._cond.notify()
+            raise
+
+    def _discard(self, pooled):
+        try:
+            pooled.raw.close()
+        except Exception:
+            pass
+        with self._cond:
+            self._size -= 1
+            self._cond.notify()
+        self.warm_in_background()        # a dead connection may leave us below min_size
+
+    def _is_alive(self, pooled):
+        if time.monotonic() - pooled.last_used < self.ping_interval:
+            return True
+        try:
+            cur = pooled.raw.cursor()
+            try:
+                cur.execute("SELECT 1")
+                cur.fetchone()
+            finally:
+                cur.close()
+            return True
+        except Exception:
+            return False
+
+    def _prune_idle(self):
+        # caller holds self._cond; oldest idle connections sit on the left
+        now = time.monotonic()
+        while (len(self._idle) > 0 and self._size > self.min_size
+               and now - self._idle[0].last_used > self.idle_timeout):
+            pooled = self._idle.popleft()
+            self._size -= 1
+            try:
+                pooled.raw.close()
+            except Exception:
+                pass
+
+
+# ----------------------------- admission control -----------------------------
+class DbOverloaded(Exception):
+    """The DB wait queue is full or the wait timed out; answer 503 + Retry-After."""
+
+    def __init__(self, message, retry_after):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+class AdmissionLimiter:
+    """
+    Caps concurrent DB work so a slow database is not buried under more
+    connections. Up to `max_concurrent` callers run; up to `max_queue` more
+    wait in FIFO-ish order for at most `queue_timeout` seconds; anyone else
+    is turned away at once with DbOverloaded.
+    """
+
+    def __init__(self, max_concurrent=10, max_queue=50, queue_timeout=5.0):
+        self._cond = threading.Condition()
+        self.configure(max_concurrent, max_queue, queue_timeout)
+        self.active = 0
+        self.waiting = 0
+        self.admitted = self.rejected = self.timed_out = 0
+        self.wait_total = self.wait_max = 0.0
+        self._hold_avg = 0.05            # EWMA of seconds a slot is held
+
+    def configure(self, max_concurrent, max_queue, queue_timeout):
+        with self._cond:
+            self.max_concurrent = max(1, max_concurrent)
+            self.max_queue = max(0, max_queue)
+            self.queue_timeout = queue_timeout
+            self._cond.notify_all()
+
+    def retry_after(self):
+        """Whole seconds until the queue has likely drained."""
+        backlog = (self.waiting + self.active) / self.max_concurrent
+        return max(1, min(30, int(backlog * self._hold_avg) + 1))
+
+    @contextmanager
+    def slot(self):
+        started = time.monotonic()
+        with self._cond:
+            if self.waiting or self.active >= self.max_concurrent:
+                if self.waiting >= self.max_queue:
+                    self.rejected += 1
+                    raise DbOverloaded("Database busy, queue full", self.retry_after())
+                self.waiting += 1
+                try:
+                    ok = self._cond.wait_for(lambda: self.active < self.max_concurrent,
+                                             self.queue_timeout)
+                finally:
+                    self.waiting -= 1
+                if not ok:
+                    self.timed_out += 1
+                    raise DbOverloaded("Database busy, timed out waiting", self.retry_after())
+            self.active += 1
+            self.admitted += 1
+            waited = time.monotonic() - started
+            self.wait_total += waited
+            self.wait_max = max(self.wait_max, waited)
+        timings = current_timings()
+        if timings is not None and waited:
+            timings["queue"] = timings.get("queue", 0.0) + waited
+        held = time.monotonic()
+        try:
+            yield
+        finally:
+            with self._cond:
+                self.active -= 1
+                self._hold_avg += 0.1 * ((time.monotonic() - held) - self._hold_avg)
+                self._cond.notify()
+
+    def stats(self):
+        with self._cond:
+            return {
+                "active": self.active,
+                "waiting": self.waiting,
+                "max_concurrent": self.max_concurrent,
+                "max_queue": self.max_queue,
+                "admitted": self.admitted,
+                "rejected": self.rejected,
+                "timed_out": self.timed_out,
+                "wait_avg_ms": round(self.wait_total / self.admitted * 1000, 3) if self.admitted else 0.0,
+                "wait_max_ms": round(self.wait_max * 1000, 3),
+            }
+
+
+_limiter = AdmissionLimiter()
+_limiter_config_version = None
+
+def get_limiter():
+    """Process-wide admission limiter, resized when config.json changes."""
+    global _limiter_config_version
+    config = get_config()
+    cfg = config.snapshot()
+    if _limiter_config_version != config.version:
+        cfg = {**POOL_DEFAULTS, **ADMISSION_DEFAULTS, **cfg}
+        _limiter.configure(int(cfg["db_max_concurrent"] or cfg["pool_max_size"]),
+                           int(cfg["db_queue_size"]), float(cfg["db_queue_timeout"]))
+        _limiter_config_version = config.version
+    return _limiter
+
+
+_pool = None
+_pool_lock = threading.Lock()
+_pool_config_version = None
+_pool_backend_key = None
+
+def _pool_settings(cfg):
+    cfg = {**POOL_DEFAULTS, **cfg}
+    return dict(
+        min_size=int(cfg["pool_min_size"]),
+        max_size=int(cfg["pool_max_size"]),
+        idle_timeout=float(cfg["pool_idle_timeout"]),
+        acquire_timeout=float(cfg["pool_acquire_timeout"]),
+        ping_interval=float(cfg["pool_ping_interval"]),
+    )
+
+def get_pool():
+    """
+    Process-wide pool, sized from config.json. When config.json or .env
+    changes, new sizes apply immediately and a changed backend or DSN/UID/PWD
+    retires the old connections, so no restart is needed.
+    """
+    global _pool, _pool_config_version, _pool_backend_key
+    config = get_config()
+    config.snapshot()                     # memory read; notices file edits
+    if _pool is not None and _pool_config_version == config.version:
+        return _pool
+    with _pool_lock:
+        if _pool_config_version == config.version:
+            return _pool
+        settings = _pool_settings(config.snapshot())
+        backend_key = get_backend().key
+        if _pool is None:
+            _pool = ConnectionPool(get_connection, **settings)
+        else:
+            _pool.configure(**settings)
+            if backend_key != _pool_backend_key:
+                _pool.invalidate()
+        _pool_backend_key = backend_key
+        _pool_config_version = config.version
+        _pool.warm_in_background()       # up to pool_min_size (again, after a retire)
+    return _pool
+
+# ----------------------------- instrumentation -------------------------------
+class InstrumentedCursor:
+    """
+    Cursor proxy that times execute and fetch ("query" / "fetch" phases of
+    the request) and reports each statement's total time, rows and bytes to
+    query_stats when the next statement starts or the cursor is closed.
+    """
+
+    def __init__(self, cur):
+        self._cur = cur
+        self._sql = None
+        self._elapsed = 0.0
+        self._rows = 0
+        self._bytes = 0
+
+    def _flush(self, error=False):
+        if self._sql is not None:
+            query_stats.record(self._sql, self._elapsed, self._rows, self._bytes, error)
+            self._sql = None
+
+    def _run(self, method, sql, *args):
+        self._flush()
+        self._sql, self._rows, self._bytes = sql, 0, 0
+        started = time.perf_counter()
+        try:
+            with phase("query"):
+                return method(sql, *args)
+        except Exception:
+            self._elapsed = time.perf_counter() - started
+            self._flush(error=True)
+            raise
+        finally:
+            if self._sql is not None:
+                self._elapsed = time.perf_counter() - started
+
+    def execute(self, sql, *args):
+        return self._run(self._cur.execute, sql, *args)
+
+    def executemany(self, sql, *args):
+        return self._run(self._cur.executemany, sql, *args)
+
+    def _fetch(self, method, *args):
+        started = time.perf_counter()
+        with phase("fetch"):
+            result = method(*args)
+        self._elapsed += time.perf_counter() - started
+        return result
+
+    def fetchone(self):
+        row = self._fetch(self._cur.fetchone)
+        if row is not None:
+            self._rows += 1
+            self._bytes += row_bytes((row,))
+        return row
+
+    def fetchmany(self, *args):
+        rows = self._fetch(self._cur.fetchmany, *args)
+        self._rows += len(rows)
+        self._bytes += row_bytes(rows)
+        return rows
+
+    def fetchall(self):
+        rows = self._fetch(self._cur.fetchall)
+        self._rows += len(rows)
+        self._bytes += row_bytes(rows)
+        return rows
+
+    def close(self):
+        self._flush()
+        self._cur.close()
+
+    def __getattr__(self, name):
+        return getattr(self._cur, name)
+
+    def __iter__(self):
+        return iter(self.fetchall())
+
+
+def pool_stats():
+    """get_pool().stats() without creating the pool (None before the first query)."""
+    pool = _pool
+    return pool.stats() if pool is not None else None
+
+def db_connection(timeout=None):
+    """
+    Pooled connection for the views:
+        with db_connection() as conn:
+            cur = conn.cursor()
+    The connection goes back to the pool (not closed) when the block ends.
+    """
+    return get_pool().connection(timeout)
+
+@contextmanager
+def db_cursor(timeout=None, commit=False):
+    """
+    Pooled connection + cursor; the cursor is closed when the block ends.
+    The whole block counts as the request's "db" phase (see timing.py), the
+    pool checkout inside it as "connect"; time spent waiting for an
+    admission slot is reported as "queue". The cursor is an
+    InstrumentedCursor (query/fetch phases, per-query stats).
+    With `commit`, the block's statements are committed when it ends (the
+    pool rolls them back if it raises); see db_transaction.
+    Raises DbOverloaded when the DB wait queue is full.
+    """
+    with get_limiter().slot(), phase("db"), ExitStack() as stack:
+        with phase("connect"):
+            conn = stack.enter_context(db_connection(timeout))
+        cur = InstrumentedCursor(conn.cursor())
+        try:
+            yield cur
+            if commit:
+                conn.commit()
+        finally:
+            try:
+                cur.close()
+            except Exception:
+                pass
+
+def db_transaction(timeout=None):
+    """
+    with db_transaction() as cur: ... - one transaction: committed when the
+    block ends, rolled back if it raises.
+    """
+    return db_cursor(timeout, commit=True)
 
 def test_connection():
     """Test database connectivity"""
-    if not SQLANYDB_AVAILABLE:
+    if get_backend().name == "sqlanydb" and not SQLANYDB_AVAILABLE:
         print("Cannot test connection - sqlanydb module not available")
         return False
-    
+
     try:
         conn = get_connection()
         cur = conn.cursor()
@@ -96,4 +568,4 @@ def test_connection():
 
 if __name__ == "__main__":
     # Test the connection when run directly
-    test_connection()
\ No newline at end of file
+    test_connection()
@@ -0,0 +1,88 @@
+"""
+Streaming JSON for the list endpoints
+
+Instead of fetchall() -> list of dicts -> one big JsonResponse buffer, rows
+are pulled with fetchmany() and written out batch by batch, so the first
+byte leaves as soon as the query returns and memory stays flat whatever the
+size of tb_item_master. Shape of the body:
+
+    {"status": "success", "items": [{...}, {...}], "count": 2}
+
+("count" comes last because it is only known at the end). No ETag is sent,
+since headers go out before the rows are read.
+"""
+import json
+import logging
+import sys
+from contextlib import ExitStack
+
+from django.core.serializers.json import DjangoJSONEncoder
+from django.http import StreamingHttpResponse
+from django.utils.cache import patch_vary_headers
+
+from .sql_helper import db_cursor
+
+_encoder = DjangoJSONEncoder()
+
+
+class _RowStream:
+    """
+    Iterable body that owns the pooled cursor. Django calls close() when the
+    response is finished or the client goes away, even if iteration never
+    started, so the connection always goes back to the pool.
+    """
+
+    def __init__(self, stack, chunks):
+        self._stack = stack
+        self._chunks = chunks
+
+    def __iter__(self):
+        return self._chunks
+
+    def close(self):
+        try:
+            self._chunks.close()
+        finally:
+            self._stack.close()
+
+
+def _chunks(cur, name, fields, batch_size):
+    encode = _encoder.encode
+    columns, pick = fields
+    count = 0
+    yield '{"status": "success", %s: [' % json.dumps(name)
+    try:
+        while True:
+            batch = cur.fetchmany(batch_size)
+            if not batch:
+                break
+            if pick is not None:
+                batch = [pick(r) for r in batch]
+            parts = [encode(dict(zip(columns, r))) for r in batch]
+            yield ("" if count == 0 else ", ") + ", ".join(parts)
+            count += len(batch)
+    except Exception:
+        # status line is already sent; a truncated body is the only signal left
+        logging.exception("Streaming %s failed after %d rows", name, count)
+        raise
+    yield '], "count": %d}' % count
+
+
+def stream_dataset(dataset, params, batch_size=500, with_optional=False):
+    """
+    StreamingHttpResponse for `dataset`. The query runs before returning, so
+    DB errors still become a normal 500 instead of a truncated 200.
+    """
+    stack = ExitStack()
+    try:
+        cur = stack.enter_context(db_cursor())
+        sql, args = dataset.select(params)
+        cur.execute(sql, args)
+    except BaseException:
+        if not stack.__exit__(*sys.exc_info()):
+            raise
+    body = _RowStream(stack, _chunks(cur, dataset.name, dataset.fields(with_optional), batch_size))
+    response = StreamingHttpResponse(body, content_type="application/json")
+    response["Cache-Control"] = "no-cache"
+    patch_vary_headers(response, ("Accept",))     # chosen because Accept asked for JSON
+    return response
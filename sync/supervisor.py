@@ -0,0 +1,240 @@
+"""
+SyncService.exe process supervisor
+
+Replaces the psutil.process_iter() scan in pair_check:
+
+  • PID file   - "syncservice.pid" next to the exe holds {"pid", "started"}
+                 (wall-clock time the file was written, no psutil needed);
+                 SyncService writes it on start, the supervisor on launch.
+                 Liveness = that one PID exists *and* was created before
+                 `started` (a recycled PID belongs to a younger process, so
+                 it is not mistaken for the service)
+  • cached     - status() re-checks at most every `supervisor_check_interval`
+                 seconds (default 2), otherwise it is a dict read
+  • one launch - an in-process lock plus an O_EXCL lock file serialize
+                 launches, so racing pair requests (or two processes) start
+                 at most one SyncService.exe
+  • restart    - a child that exits non-zero is restarted after 1, 2, 4 ...
+                 up to `supervisor_max_backoff` seconds; the delay resets
+                 once a child has stayed up for `supervisor_stable_after`
+                 seconds. Exit code 0 (a requested stop) is left alone
+"""
+import json
+import logging
+import os
+import subprocess
+import threading
+import time
+
+from .config import get_config
+
+PID_FILE = "syncservice.pid"
+LOCK_FILE = "syncservice.launch.lock"
+
+
+def _process_created(pid):
+    """Creation time of a running process, or None if there is no such process."""
+    import psutil
+    try:
+        return psutil.Process(pid).create_time()
+    except (psutil.NoSuchProcess, psutil.AccessDenied, ValueError):
+        return None
+
+
+def read_pid_file(path):
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            data = json.load(f)
+        return int(data["pid"]), float(data.get("started") or 0)
+    except (OSError, ValueError, KeyError, TypeError):
+        return None
+
+
+def write_pid_file(path, pid=None):
+    """Record `pid` (default: this process); called after the process exists, so started >= its creation."""
+    pid = pid or os.getpid()
+    tmp = f"{path}.{pid}.tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump({"pid": pid, "started": time.time()}, f)
+    os.replace(tmp, path)
+
+
+def pid_file_alive(path):
+    """PID recorded in `path` if that process is still the one that wrote it."""
+    entry = read_pid_file(path)
+    if entry is None:
+        return None
+    pid, started = entry
+    actual = _process_created(pid)
+    # 1s slack for coarse process clocks
+    if actual is None or (started and actual > started + 1.0):
+        return None
+    return pid
+
+
+class Supervisor:
+    def __init__(self, command, cwd, pid_file=None, lock_file=None):
+        self.command = list(command)
+        self.cwd = cwd
+        self.pid_file = pid_file or os.path.join(cwd, PID_FILE)
+        self.lock_file = lock_file or os.path.join(cwd, LOCK_FILE)
+        self._lock = threading.Lock()
+        self._child = None                 # Popen we started (for restarts)
+        self._monitor = None
+        self._stopping = False
+        self._status = {"running": False, "pid": None, "state": "unknown",
+                        "restarts": 0, "last_exit_code": None, "started_at": None}
+        self._checked_at = 0.0
+
+    # -------------------------- status --------------------------------------
+    def _cfg(self, key, default):
+        return float(get_config().get(key, default))
+
+    def status(self):
+        """Cheap health snapshot; the PID is re-verified at most every check interval."""
+        self._refresh_if_stale()
+        return dict(self._status)
+
+    def _refresh_if_stale(self):
+        if time.monotonic() - self._checked_at >= self._cfg("supervisor_check_interval", 2):
+            self._refresh()
+
+    def _refresh(self):
+        pid = pid_file_alive(self.pid_file)
+        self._status["running"] = pid is not None
+        self._status["pid"] = pid
+        if pid is not None:
+            self._status["state"] = "running"
+        elif self._status["state"] == "running":
+            self._status["state"] = "stopped"
+        self._checked_at = time.monotonic()
+
+    # -------------------------- launching -----------------------------------
+    def _acquire_launch_lock(self):
+        """Cross-process launch lock; a lock older than 30s is a crashed launcher's and is taken over."""
+        try:
+            fd = os.open(self.lock_file, os.O_CREAT | os.O_EXCL | os.O_WRONLY)
+        except FileExistsError:
+            try:
+                if time.time() - os.path.getmtime(self.lock_file) < 30:
+                    return False
+                os.remove(self.lock_file)
+                fd = os.open(self.lock_file, os.O_CREAT | os.O_EXCL | os.O_WRONLY)
+            except OSError:
+                return False
+        os.write(fd, str(os.getpid()).encode())
+        os.close(fd)
+        return True
+
+    def _release_launch_lock(self):
+        try:
+            os.remove(self.lock_file)
+        except OSError:
+            pass
+
+    def ensure_running(self):
+        """
+        ("running", status) if the service is already up, ("launched", status)
+        if this call started it, ("busy", status) if another process is
+        launching it right now. Launch failures raise. "running" comes from
+        the cached status; only a launch decision re-checks the PID file.
+        """
+        with self._lock:
+            self._refresh_if_stale()
+            if self._status["running"]:
+                return "running", dict(self._status)
+            if not self._acquire_launch_lock():
+                return "busy", dict(self._status)
+            try:
+                self._refresh()                  # someone may have won the race
+                if self._status["running"]:
+                    return "running", dict(self._status)
+                self._launch()
+            finally:
+                self._release_launch_lock()
+            self._start_monitor()
+            return "launched", dict(self._status)
+
+    def _launch(self):
+        self._child = subprocess.Popen(self.command, cwd=self.cwd)
+        write_pid_file(self.pid_file, self._child.pid)
+        self._status.update(running=True, pid=self._child.pid, state="running",
+                            started_at=time.time())
+        self._checked_at = time.monotonic()
+        logging.info("✅ SyncService started (PID %s)", self._child.pid)
+
+    # -------------------------- crash restart -------------------------------
+    def _start_monitor(self):
+        # caller holds self._lock; _watch clears _monitor under it before exiting
+        if self._monitor is None:
+            self._monitor = threading.Thread(target=self._watch, name="supervisor", daemon=True)
+            self._monitor.start()
+
+    def _stop_watching(self):
+        # caller holds self._lock
+        self._monitor = None
+
+    def _watch(self):
+        backoff = 1.0
+        while True:
+            with self._lock:
+                child = self._child
+                if child is None or self._stopping:
+                    return self._stop_watching()
+            started = time.monotonic()
+            code = child.wait()
+            with self._lock:
+                if self._stopping:
+                    return self._stop_watching()
+                if self._child is not child:
+                    continue                     # replaced meanwhile; watch the new one
+                self._status.update(running=False, pid=None, last_exit_code=code)
+                if code == 0:                    # clean exit / requested stop: not a crash
+                    self._status["state"] = "stopped"
+                    self._child = None
+                    logging.info("🛑 SyncService exited cleanly")
+                    return self._stop_watching()
+                self._status["state"] = "restarting"
+            if time.monotonic() - started >= self._cfg("supervisor_stable_after", 60):
+                backoff = 1.0
+            logging.warning("⚠️ SyncService exited with %s, restarting in %.0fs", code, backoff)
+            time.sleep(backoff)
+            backoff = min(backoff * 2, self._cfg("supervisor_max_backoff", 60))
+            with self._lock:
+                if self._stopping:
+                    return self._stop_watching()
+                if self._child is not child:
+                    continue                     # ensure_running launched one during the backoff
+                if pid_file_alive(self.pid_file) is not None:
+                    self._child = None           # started elsewhere meanwhile; not ours to watch
+                    self._refresh()
+                    return self._stop_watching()
+                try:
+                    self._launch()
+                    self._status["restarts"] += 1
+                except Exception:
+                    logging.exception("❌ Restart of SyncService failed")
+                    self._status["state"] = "failed"
+                    self._child = None
+                    return self._stop_watching()
+
+    def stop(self):
+        """Stop watching and terminate the child we started (tests, shutdown)."""
+        self._stopping = True
+        child = self._child
+        if child is not None and child.poll() is None:
+            child.terminate()
+            child.wait(5)
+
+
+_supervisor = None
+_supervisor_lock = threading.Lock()
+
+
+def get_supervisor(command, cwd):
+    """Process-wide Supervisor for `command` (created on first use)."""
+    global _supervisor
+    with _supervisor_lock:
+        if _supervisor is None or _supervisor.command != list(command):
+            _supervisor = Supervisor(command, cwd)
+        return _supervisor
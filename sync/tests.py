@@ -1,3 +1,1288 @@
-from django.test import TestCase
+import asyncio
+import gzip
+import http.client
+import importlib
+import io
+import json
+import logging
+import os
+import subprocess
+import sys
+import tempfile
+import threading
+import time
 
-# Create your tests here.
+from decimal import Decimal
+from unittest import mock, skipUnless
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.test import AsyncClient, SimpleTestCase, override_settings
+from PIL import Image
+
+from . import benchmarks
+from .compression import choose_encoding, compressed_bodies
+from .cache import MasterDataCache, master_cache
+from .config import ServiceConfig, get_config
+from .datasets import ITEMS, USER_SETTINGS, encode_cursor, fingerprints
+from .db_backends import SQLiteBackend, SqlAnywhereBackend
+from .server import ThreadedWSGIServer
+from .supervisor import Supervisor, pid_file_alive, write_pid_file
+from .timing import parse_server_timing, phase
+from .user_context import user_contexts
+from .responses import CBOR_AVAILABLE, MSGPACK_AVAILABLE, decode, negotiate
+from .delta import DeltaTracker
+from .executors import ResizableExecutor
+from .images import thumbnail_dir
+from .logs import configure_logging, stop_logging
+from .metrics import Histogram, Metrics, metrics
+from .query_stats import fingerprint, query_stats
+from .sql_helper import (AdmissionLimiter, ConnectionPool, DbOverloaded, PoolTimeout,
+                         get_connection, get_limiter, get_pool)
+
+
+class _FakeCursor:
+    def __init__(self, conn):
+        self.conn = conn
+
+    def execute(self, sql, params=None):
+        if not self.conn.alive:
+            raise RuntimeError("connection lost")
+
+    def fetchone(self):
+        return (1,)
+
+    def close(self):
+        pass
+
+
+class _FakeConnection:
+    def __init__(self):
+        self.alive = True
+        self.closed = False
+        self.rollbacks = 0
+
+    def cursor(self):
+        return _FakeCursor(self)
+
+    def rollback(self):
+        if not self.alive:
+            raise RuntimeError("connection lost")
+        self.rollbacks += 1
+
+    def close(self):
+        self.closed = True
+
+
+class ConnectionPoolTests(SimpleTestCase):
+    def make_pool(self, **kwargs):
+        self.opened = []
+
+        def factory():
+            conn = _FakeConnection()
+            self.opened.append(conn)
+            return conn
+
+        kwargs.setdefault("min_size", 0)
+        kwargs.setdefault("max_size", 2)
+        return ConnectionPool(factory, **kwargs)
+
+    def test_connection_is_reused(self):
+        pool = self.make_pool()
+        with pool.connection() as first:
+            pass
+        with pool.connection() as second:
+            pass
+        self.assertIs(first, second)
+        self.assertEqual(len(self.opened), 1)
+
+    def test_exhausted_pool_times_out(self):
+        pool = self.make_pool(max_size=1)
+        held = pool.acquire()
+        with self.assertRaises(PoolTimeout):
+            pool.acquire(timeout=0.05)
+        pool.release(held)
+
+    def test_waiter_gets_released_connection(self):
+        pool = self.make_pool(max_size=1)
+        held = pool.acquire()
+        got = []
+        waiter = threading.Thread(target=lambda: got.append(pool.acquire(timeout=2)))
+        waiter.start()
+        pool.release(held)
+        waiter.join()
+        self.assertEqual(got, [held])
+
+    def test_dead_connection_replaced_on_checkout(self):
+        pool = self.make_pool(ping_interval=0)
+        with pool.connection() as conn:
+            pass
+        conn.alive = False
+        with pool.connection() as fresh:
+            self.assertIsNot(fresh, conn)
+        self.assertTrue(conn.closed)
+        self.assertEqual(pool.stats()["size"], 1)
+
+    def test_idle_connections_recycled_above_min_size(self):
+        pool = self.make_pool(min_size=1, idle_timeout=0)
+        a, b = pool.acquire(), pool.acquire()
+        pool.release(a)
+        pool.release(b)
+        with pool.connection():
+            pass
+        self.assertEqual(pool.stats()["size"], 1)
+        self.assertTrue(a.closed)
+
+    def test_broken_connection_discarded_after_error(self):
+        pool = self.make_pool()
+        with self.assertRaises(ValueError):
+            with pool.connection() as conn:
+                conn.alive = False
+                raise ValueError("boom")
+        self.assertTrue(conn.closed)
+        self.assertEqual(pool.stats()["size"], 0)
+
+    def test_warm_opens_up_to_min_size(self):
+        pool = self.make_pool(min_size=2, max_size=3)
+        pool.warm()
+        self.assertEqual((pool.stats()["size"], pool.stats()["idle"]), (2, 2))
+        with pool.connection(), pool.connection():
+            pass
+        self.assertEqual(len(self.opened), 2)       # served by the warm connections
+
+        failing = ConnectionPool(mock.Mock(side_effect=RuntimeError("db down")), min_size=2)
+        failing.warm()
+        self.assertEqual(failing.stats()["size"], 0)
+
+    def test_checkin_rolls_back_and_drops_unrecoverable(self):
+        pool = self.make_pool()
+        with pool.connection() as conn:
+            pass
+        self.assertEqual(conn.rollbacks, 1)
+        self.assertEqual(pool.stats()["idle"], 1)
+        with pool.connection() as conn:
+            conn.alive = False
+        self.assertTrue(conn.closed)
+        self.assertEqual(pool.stats()["size"], 0)
+
+    def test_invalidate_retires_checked_out_connections(self):
+        pool = self.make_pool()
+        conn = pool.acquire()
+        pool.invalidate()
+        pool.release(conn)
+        self.assertTrue(conn.closed)
+        with pool.connection() as fresh:
+            self.assertIsNot(fresh, conn)
+
+
+class ServiceConfigTests(SimpleTestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+        self.edits = 0
+        self.write_config({"dsn": "FIRST", "config_check_interval": 0})
+
+    def write_config(self, data):
+        path = os.path.join(self.tmp.name, "config.json")
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(data, f)
+        # make sure the mtime moves even on coarse filesystem clocks
+        self.edits += 1
+        stamp = os.stat(path).st_mtime + self.edits
+        os.utime(path, (stamp, stamp))
+
+    def test_reloads_only_when_file_changes(self):
+        cfg = ServiceConfig([self.tmp.name])
+        self.assertEqual(cfg.get("dsn"), "FIRST")
+        version = cfg.version
+        cfg.get("dsn")
+        self.assertEqual(cfg.version, version)
+        self.write_config({"dsn": "SECOND", "pool_max_size": 3, "config_check_interval": 0})
+        self.assertEqual(cfg.get("dsn"), "SECOND")
+        self.assertEqual(cfg.get("pool_max_size"), 3)
+        self.assertEqual(cfg.version, version + 1)
+
+    def test_env_file_overrides_config(self):
+        with open(os.path.join(self.tmp.name, ".env"), "w", encoding="utf-8") as f:
+            f.write("DB_DSN=FROMENV   # comment\nDB_UID=waiter\n")
+        cfg = ServiceConfig([self.tmp.name])
+        dsn, uid, _ = cfg.db_params()
+        self.assertEqual((dsn, uid), ("FROMENV", "waiter"))
+
+    def test_bad_edit_keeps_last_good_config(self):
+        cfg = ServiceConfig([self.tmp.name])
+        with open(os.path.join(self.tmp.name, "config.json"), "w", encoding="utf-8") as f:
+            f.write("{ not json")
+        self.assertEqual(cfg.get("dsn"), "FIRST")
+
+    def test_relative_paths_resolve_next_to_config(self):
+        cfg = ServiceConfig([os.path.join(self.tmp.name, "missing"), self.tmp.name])
+        self.assertEqual(str(cfg.service_dir), self.tmp.name)
+        with mock.patch("sync.images.get_config", return_value=cfg), cfg.override(thumbnail_dir="thumbs"):
+            self.assertEqual(thumbnail_dir(), os.path.join(self.tmp.name, "thumbs"))
+
+    def test_override(self):
+        cfg = ServiceConfig([self.tmp.name])
+        with cfg.override(dsn="TEMP"):
+            self.assertEqual(cfg.get("dsn"), "TEMP")
+        self.assertEqual(cfg.get("dsn"), "FIRST")
+
+
+class StubDatabaseMixin:
+    """Point sql_helper at a freshly seeded SQLite stand-in for the test."""
+    seed = {"items": 25, "item_categories": 3, "tables": 6, "users": 2,
+            "settings_per_user": 3, "dine_categories": 4}
+    extra_config = {}
+
+    def setUp(self):
+        super().setUp()
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        self.tmpdir = tmp.name
+        override = get_config().override(
+            db_backend="sqlite",
+            sqlite_path=os.path.join(tmp.name, "stub.sqlite3"),
+            sqlite_seed=self.seed,
+            pool_min_size=0,
+            **self.extra_config,
+        )
+        override.__enter__()
+        self.addCleanup(override.__exit__, None, None, None)
+        fingerprints.clear()
+        compressed_bodies.clear()
+        master_cache.invalidate()
+        user_contexts.invalidate()
+
+    def login(self, userid="USER01", password="1234"):
+        resp = self.client.post("/login", json.dumps({"userid": userid, "password": password}),
+                                content_type="application/json")
+        self.assertEqual(resp.status_code, 200, resp.content)
+        return {"HTTP_AUTHORIZATION": f"Bearer {resp.json()['token']}"}
+
+
+class SQLiteBackendTests(StubDatabaseMixin, SimpleTestCase):
+    def test_seeded_row_counts(self):
+        conn = get_connection()
+        try:
+            cur = conn.cursor()
+            counts = {}
+            for table in ("tb_item_master", "dine_itemcategory", "dine_tables",
+                          "acc_users", "acc_userssettings", "dine_catagory"):
+                cur.execute(f"SELECT COUNT(*) FROM {table}")
+                counts[table] = cur.fetchone()[0]
+        finally:
+            conn.close()
+        self.assertEqual(counts, {
+            "tb_item_master": 25, "dine_itemcategory": 3, "dine_tables": 6,
+            "acc_users": 2, "acc_userssettings": 6, "dine_catagory": 4,
+        })
+
+    def test_endpoints_run_against_stand_in(self):
+        auth = self.login()
+        items = self.client.get("/items/", **auth).json()
+        self.assertEqual(items["count"], 25)
+        self.assertEqual(items["items"][0]["category"], "Category 2")
+        one = self.client.get("/items/", {"item_code": "I00003"}, **auth).json()
+        self.assertEqual(one["items"][0]["rate"], "61.00")
+        self.assertEqual(self.client.get("/dine-tables/", **auth).json()["count"], 6)
+        self.assertEqual(self.client.get("/user-settings/", {"uid": "USER02"}, **auth).json()["count"], 3)
+        self.assertEqual(self.client.get("/dine-categories/", **auth).json()["count"], 4)
+
+    def test_bad_password_rejected(self):
+        resp = self.client.post("/login", json.dumps({"userid": "USER01", "password": "nope"}),
+                                content_type="application/json")
+        self.assertEqual(resp.status_code, 401)
+
+    def test_latency_injection(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            backend = SQLiteBackend(os.path.join(tmp, "slow.sqlite3"), seed=self.seed,
+                                    connect_latency_ms=30, query_latency_ms=20)
+            started = time.perf_counter()
+            conn = backend.connect()
+            cur = conn.cursor()
+            cur.execute("SELECT COUNT(*) FROM dine_tables")
+            self.assertEqual(cur.fetchone()[0], 6)
+            conn.close()
+            self.assertGreaterEqual(time.perf_counter() - started, 0.05)
+
+
+class ETagTests(StubDatabaseMixin, SimpleTestCase):
+    def test_matching_if_none_match_gets_304(self):
+        auth = self.login()
+        first = self.client.get("/items/", **auth)
+        etag = first["ETag"]
+        self.assertTrue(etag.startswith('W/"'))
+        again = self.client.get("/items/", HTTP_IF_NONE_MATCH=etag, **auth)
+        self.assertEqual(again.status_code, 304)
+        self.assertEqual(again.content, b"")
+        self.assertEqual(again["ETag"], etag)
+
+    def test_recent_fingerprint_skips_the_query(self):
+        auth = self.login()
+        etag = self.client.get("/dine-tables/", **auth)["ETag"]
+        with mock.patch.object(type(ITEMS), "fetch", side_effect=AssertionError("queried")):
+            resp = self.client.get("/dine-tables/", HTTP_IF_NONE_MATCH=etag, **auth)
+        self.assertEqual(resp.status_code, 304)
+
+    def test_changed_data_gets_new_etag(self):
+        auth = self.login()
+        etag = self.client.get("/dine-categories/", **auth)["ETag"]
+        conn = get_connection()
+        conn.execute("UPDATE dine_catagory SET name = 'Drinks' WHERE catagorycode = 'CT01'")
+        conn.commit()
+        conn.close()
+        with get_config().override(etag_ttl=0, cache_ttl={"categories": 0}):
+            resp = self.client.get("/dine-categories/", HTTP_IF_NONE_MATCH=etag, **auth)
+        self.assertEqual(resp.status_code, 200)
+        self.assertNotEqual(resp["ETag"], etag)
+        self.assertEqual(resp.json()["categories"][0]["name"], "Drinks")
+
+    def test_filtered_requests_have_their_own_fingerprint(self):
+        auth = self.login()
+        full = self.client.get("/items/", **auth)["ETag"]
+        one = self.client.get("/items/", {"item_code": "I00001"}, **auth)
+        self.assertNotEqual(one["ETag"], full)
+        self.assertEqual(
+            self.client.get("/items/", {"item_code": "I00001"}, HTTP_IF_NONE_MATCH=full, **auth).status_code,
+            200,
+        )
+
+
+class DeltaSyncTests(StubDatabaseMixin, SimpleTestCase):
+    def execute(self, sql, args=()):
+        conn = get_connection()
+        conn.execute(sql, args)
+        conn.commit()
+        conn.close()
+
+    def test_delta_returns_only_changes(self):
+        auth = self.login()
+        full = self.client.get("/items/", **auth).json()
+        version = full["version"]
+
+        self.execute("UPDATE tb_item_master SET rate = 99 WHERE item_code = 'I00002'")
+        self.execute("DELETE FROM tb_item_master WHERE item_code = 'I00005'")
+        self.execute("INSERT INTO tb_item_master (item_code, item_name, category) VALUES ('I09999', 'New', 'C001')")
+        self.client.post("/cache/invalidate", json.dumps({"resource": "items"}),
+                         content_type="application/json", **auth)
+
+        delta = self.client.get("/items/", {"since": version}, **auth).json()
+        self.assertEqual(delta["mode"], "delta")
+        self.assertEqual(sorted(i["item_code"] for i in delta["items"]), ["I00002", "I09999"])
+        self.assertEqual(delta["removed"], ["I00005"])
+        self.assertNotEqual(delta["version"], version)
+
+        again = self.client.get("/items/", {"since": delta["version"]}, **auth).json()
+        self.assertEqual((again["mode"], again["count"], again["removed"]), ("delta", 0, []))
+
+    def test_unknown_version_falls_back_to_full(self):
+        auth = self.login()
+        resp = self.client.get("/items/", {"since": "stale"}, **auth).json()
+        self.assertEqual(resp["mode"], "full")
+        self.assertEqual(resp["count"], 25)
+
+    def test_changes_accumulate_across_versions(self):
+        tracker = DeltaTracker(ITEMS)
+        v1 = tracker.observe([("A", 1), ("B", 1), ("C", 1)])
+        tracker.observe([("A", 2), ("C", 1)])
+        tracker.observe([("A", 2), ("B", 3), ("C", 1)])
+        changed, removed = tracker.changes_since(v1)
+        self.assertEqual((changed, removed), ({"A", "B"}, set()))
+        self.assertIsNone(tracker.changes_since("unknown"))
+
+
+class StreamingTests(StubDatabaseMixin, SimpleTestCase):
+    extra_config = {"stream_batch_size": 4}
+
+    def test_streamed_body_matches_buffered(self):
+        auth = self.login()
+        buffered = self.client.get("/items/", **auth).json()
+        resp = self.client.get("/items/", {"stream": "1"}, **auth)
+        self.assertTrue(resp.streaming)
+        streamed = json.loads(b"".join(resp.streaming_content))
+        self.assertEqual(streamed["count"], buffered["count"])
+        self.assertEqual(streamed["items"], buffered["items"])
+        resp.close()
+        self.assertEqual(get_pool().stats()["in_use"], 0)
+
+    def test_unread_stream_returns_connection(self):
+        auth = self.login()
+        resp = self.client.get("/dine-tables/", {"stream": "1"}, **auth)
+        self.assertEqual(get_pool().stats()["in_use"], 1)
+        resp.close()
+        self.assertEqual(get_pool().stats()["in_use"], 0)
+
+    def test_empty_result(self):
+        auth = self.login()
+        resp = self.client.get("/dine-tables/", {"stream": "1", "tableno": "nope"}, **auth)
+        self.assertEqual(json.loads(b"".join(resp.streaming_content)),
+                         {"status": "success", "tables": [], "count": 0})
+        resp.close()
+
+
+class PaginationTests(StubDatabaseMixin, SimpleTestCase):
+    def collect(self, path, name, auth, **params):
+        seen, cursor, pages = [], None, 0
+        while True:
+            query = dict(params, **({"cursor": cursor} if cursor else {}))
+            body = self.client.get(path, query, **auth).json()
+            seen += body[name]
+            pages += 1
+            cursor = body["next_cursor"]
+            if not cursor:
+                return seen, pages
+
+    def test_items_paged_in_key_order(self):
+        auth = self.login()
+        items, pages = self.collect("/items/", "items", auth, limit=10)
+        self.assertEqual(pages, 3)
+        codes = [i["item_code"] for i in items]
+        self.assertEqual(codes, sorted(codes))
+        self.assertEqual(len(set(codes)), 25)
+
+    def test_composite_key_pages(self):
+        auth = self.login()
+        settings, _ = self.collect("/user-settings/", "settings", auth, limit=4)
+        keys = [(s["uid"], s["code"]) for s in settings]
+        self.assertEqual(keys, sorted(set(keys)))
+        self.assertEqual(len(keys), 6)
+
+    def test_bad_cursor_and_limit(self):
+        auth = self.login()
+        self.assertEqual(self.client.get("/items/", {"cursor": "garbage"}, **auth).status_code, 400)
+        self.assertEqual(self.client.get("/items/", {"limit": "x"}, **auth).status_code, 400)
+        for nested in ([[1]], [{"a": 1}]):
+            resp = self.client.get("/items/", {"limit": 5, "cursor": encode_cursor(nested)},
+                                   HTTP_IF_NONE_MATCH='W/"x"', **auth)
+            self.assertEqual(resp.status_code, 400)
+            self.assertEqual(resp.json()["detail"], "Invalid cursor")
+
+    def test_limit_is_capped(self):
+        auth = self.login()
+        with get_config().override(page_size_max=5):
+            body = self.client.get("/dine-tables/", {"limit": 100}, **auth).json()
+        self.assertEqual(body["count"], 5)
+        self.assertIsNotNone(body["next_cursor"])
+
+    def test_last_page_etag_changes_when_rows_follow(self):
+        auth = self.login()
+        with get_config().override(etag_ttl=0, cache_ttl={"tables": 0}):
+            full = self.client.get("/dine-tables/", {"limit": 6}, **auth)
+            self.assertIsNone(full.json()["next_cursor"])
+            conn = get_connection()
+            conn.execute("INSERT INTO dine_tables VALUES ('T07', 'Table 7', 'AC')")
+            conn.commit()
+            conn.close()
+            resp = self.client.get("/dine-tables/", {"limit": 6}, HTTP_IF_NONE_MATCH=full["ETag"], **auth)
+        self.assertEqual(resp.status_code, 200)
+        self.assertIsNotNone(resp.json()["next_cursor"])
+        self.assertNotEqual(resp["ETag"], full["ETag"])
+
+    def test_sql_anywhere_uses_top(self):
+        sql = SqlAnywhereBackend("dsn", "dba", "sql").limit_sql("SELECT a FROM t ORDER BY a", 11)
+        self.assertEqual(sql, "SELECT TOP 11 a FROM t ORDER BY a")
+
+
+class CompressionTests(StubDatabaseMixin, SimpleTestCase):
+    def test_gzip_negotiated_and_cached_per_etag(self):
+        auth = self.login()
+        plain = self.client.get("/items/", **auth)
+        self.assertFalse(plain.has_header("Content-Encoding"))
+        first = self.client.get("/items/", HTTP_ACCEPT_ENCODING="gzip", **auth)
+        self.assertEqual(first["Content-Encoding"], "gzip")
+        self.assertIn("Accept-Encoding", first["Vary"])
+        self.assertEqual(json.loads(gzip.decompress(first.content)), plain.json())
+        self.assertLess(len(first.content), len(plain.content))
+
+        hits = compressed_bodies.stats()["hits"]
+        second = self.client.get("/items/", HTTP_ACCEPT_ENCODING="gzip", **auth)
+        self.assertEqual(second.content, first.content)
+        self.assertEqual(compressed_bodies.stats()["hits"], hits + 1)
+
+    def test_small_responses_left_alone(self):
+        auth = self.login()
+        resp = self.client.get("/verify-token", HTTP_ACCEPT_ENCODING="gzip", **auth)
+        self.assertFalse(resp.has_header("Content-Encoding"))
+
+    def test_accept_encoding_negotiation(self):
+        self.assertEqual(choose_encoding("gzip, deflate"), "gzip")
+        self.assertIsNone(choose_encoding("identity"))
+        self.assertIsNone(choose_encoding("gzip;q=0"))
+        self.assertIsNone(choose_encoding(None))
+
+
+class MasterDataCacheTests(StubDatabaseMixin, SimpleTestCase):
+    def test_repeat_request_served_from_cache(self):
+        auth = self.login()
+        hits, misses = master_cache.hits.get("items", 0), master_cache.misses.get("items", 0)
+        with mock.patch.object(ITEMS, "fetch", wraps=ITEMS.fetch) as fetch:
+            first = self.client.get("/items/", **auth)
+            second = self.client.get("/items/", **auth)
+        self.assertEqual(fetch.call_count, 1)
+        self.assertEqual(first.content, second.content)
+        stats = self.client.get("/cache/stats", **auth).json()["cache"]["datasets"]["items"]
+        self.assertEqual((stats["hits"] - hits, stats["misses"] - misses, stats["entries"]), (1, 1, 1))
+
+    def test_invalidate_endpoint_forces_reload(self):
+        auth = self.login()
+        self.client.get("/items/", **auth)
+        resp = self.client.post("/cache/invalidate", json.dumps({"resource": "items"}),
+                                content_type="application/json", **auth)
+        self.assertEqual(resp.json()["entries_removed"], 1)
+        with mock.patch.object(ITEMS, "fetch", wraps=ITEMS.fetch) as fetch:
+            self.client.get("/items/", **auth)
+        self.assertEqual(fetch.call_count, 1)
+
+        resp = self.client.post("/cache/invalidate", json.dumps({"resource": "menu"}),
+                                content_type="application/json", **auth)
+        self.assertEqual(resp.status_code, 400)
+        for body in ("[1]", '"x"'):
+            resp = self.client.post("/cache/invalidate", body, content_type="application/json", **auth)
+            self.assertEqual(resp.status_code, 400)
+
+    def test_concurrent_misses_share_one_load(self):
+        cache = MasterDataCache()
+        started, release, calls = threading.Event(), threading.Event(), []
+
+        def loader():
+            calls.append(1)
+            started.set()
+            release.wait(2)
+            return [("I00001",)], "abc", None
+
+        results = []
+        threads = [threading.Thread(target=lambda: results.append(cache.get_or_load("items", (), loader)))
+                   for _ in range(4)]
+        threads[0].start()
+        started.wait(2)
+        for t in threads[1:]:
+            t.start()
+        time.sleep(0.05)
+        release.set()
+        for t in threads:
+            t.join()
+        self.assertEqual(len(calls), 1)
+        self.assertEqual(len(results), 4)
+
+    def test_zero_ttl_disables_caching(self):
+        cache = MasterDataCache()
+        calls = []
+        loader = lambda: calls.append(1) or ([], "x", None)
+        with get_config().override(cache_ttl={"settings": 0}):
+            cache.get_or_load("settings", (), loader)
+            cache.get_or_load("settings", (), loader)
+        self.assertEqual(len(calls), 2)
+
+
+class BootstrapTests(StubDatabaseMixin, SimpleTestCase):
+    def test_all_sections_in_one_response(self):
+        auth = self.login()
+        resp = self.client.get("/bootstrap/", **auth)
+        self.assertEqual(resp.status_code, 200)
+        body = resp.json()
+        self.assertEqual(len(body["items"]), 25)
+        self.assertEqual(len(body["tables"]), 6)
+        self.assertEqual(len(body["categories"]), 4)
+        self.assertEqual({s["uid"] for s in body["settings"]}, {"USER01"})
+        self.assertEqual(body["versions"]["items"],
+                         self.client.get("/items/", **auth).json()["version"])
+
+        again = self.client.get("/bootstrap/", HTTP_IF_NONE_MATCH=resp["ETag"], **auth)
+        self.assertEqual(again.status_code, 304)
+
+    def test_sections_load_concurrently(self):
+        auth = self.login()
+        barrier = threading.Barrier(4, timeout=2)
+        real_load = ITEMS.load.__func__
+
+        def load(dataset, params, page=None):
+            barrier.wait()                # deadlocks (BrokenBarrierError) if run one by one
+            return real_load(dataset, params, page)
+
+        with mock.patch("sync.datasets.Dataset.load", load):
+            resp = self.client.get("/bootstrap/", **auth)
+        self.assertEqual(resp.status_code, 200)
+
+    def test_parallel_db_time_stays_within_total(self):
+        auth = self.login()
+
+        def load(dataset, params, page=None):
+            with phase("db"):
+                time.sleep(0.05)
+            return [], dataset.name, None
+
+        with mock.patch("sync.datasets.Dataset.load", load):
+            resp = self.client.get("/bootstrap/", **auth)
+        timings = parse_server_timing(resp["Server-Timing"])
+        self.assertGreaterEqual(timings["db"], 0.05)
+        self.assertLessEqual(timings["db"], timings["total"])
+
+
+class ItemImageTests(StubDatabaseMixin, SimpleTestCase):
+    def setUp(self):
+        super().setUp()
+        Image.new("RGB", (800, 600), "red").save(os.path.join(self.tmpdir, "burger.png"))
+        conn = get_connection()
+        conn.execute("UPDATE tb_item_master SET image = 'burger.png' WHERE item_code = 'I00001'")
+        conn.commit()
+        conn.close()
+        override = get_config().override(image_root=self.tmpdir, image_sizes=[128],
+                                         thumbnail_dir=os.path.join(self.tmpdir, "thumbs"))
+        override.__enter__()
+        self.addCleanup(override.__exit__, None, None, None)
+
+    def test_images_are_opt_in(self):
+        auth = self.login()
+        plain = self.client.get("/items/", {"item_code": "I00001"}, **auth).json()["items"][0]
+        self.assertNotIn("image", plain)
+        full = self.client.get("/items/", {"item_code": "I00001", "images": "1"}, **auth).json()["items"][0]
+        self.assertEqual(full["image"], "burger.png")
+        self.assertRegex(full["image_url"], r"^/items/I00001/image\?v=[0-9a-f]+$")
+
+    def test_thumbnail_generated_once_and_cached_forever(self):
+        auth = self.login()
+        url = self.client.get("/items/", {"item_code": "I00001", "images": "1"},
+                              **auth).json()["items"][0]["image_url"]
+        with mock.patch("sync.images.Image.open", wraps=Image.open) as opened:
+            first = self.client.get(url + "&size=128", **auth)
+            second = self.client.get(url + "&size=128", **auth)
+        self.assertEqual(opened.call_count, 1)
+        self.assertEqual(first.status_code, 200)
+        self.assertIn("immutable", first["Cache-Control"])
+        with Image.open(io.BytesIO(b"".join(second.streaming_content))) as thumb:
+            self.assertEqual(thumb.size, (128, 96))
+
+        stale = self.client.get("/items/I00001/image?v=0000&size=128", **auth)
+        self.assertEqual(stale.status_code, 302)
+        self.assertEqual(stale["Location"], url + "&size=128")
+        self.assertEqual(self.client.get(url + "&size=77", **auth).status_code, 400)
+        self.assertEqual(self.client.get("/items/I00002/image", **auth).status_code, 404)
+
+
+class ColumnarFormatTests(StubDatabaseMixin, SimpleTestCase):
+    def test_columnar_matches_row_dicts(self):
+        auth = self.login()
+        rows = self.client.get("/items/", **auth).json()
+        resp = self.client.get("/items/", {"format": "columnar"}, **auth)
+        cols = resp.json()
+        self.assertEqual(cols["format"], "columnar")
+        self.assertEqual(cols["count"], rows["count"])
+        self.assertEqual([dict(zip(cols["columns"], r)) for r in cols["items"]], rows["items"])
+        self.assertIsInstance(cols["items"][0][cols["columns"].index("rate")], str)
+        self.assertLess(len(resp.content), len(json.dumps(rows)))
+        self.assertNotEqual(resp["ETag"], self.client.get("/items/", **auth)["ETag"])
+
+    def test_unknown_format_rejected(self):
+        auth = self.login()
+        resp = self.client.get("/dine-tables/", {"format": "xml"}, **auth)
+        self.assertEqual(resp.status_code, 400)
+
+
+class BinaryEncodingTests(StubDatabaseMixin, SimpleTestCase):
+    @skipUnless(MSGPACK_AVAILABLE, "msgpack not installed")
+    def test_msgpack_carries_same_data_as_json(self):
+        auth = self.login()
+        as_json = self.client.get("/items/", **auth).json()
+        resp = self.client.get("/items/", HTTP_ACCEPT="application/msgpack", **auth)
+        self.assertEqual(resp["Content-Type"], "application/msgpack")
+        self.assertIn("Accept", resp["Vary"])
+        self.assertEqual(decode(resp.content, resp["Content-Type"]), as_json)
+
+    @skipUnless(MSGPACK_AVAILABLE, "msgpack not installed")
+    def test_stream_request_still_honours_accept(self):
+        auth = self.login()
+        with get_config().override(stream_responses=True):
+            resp = self.client.get("/items/", {"stream": "1"}, HTTP_ACCEPT="application/msgpack", **auth)
+        self.assertFalse(resp.streaming)
+        self.assertEqual(resp["Content-Type"], "application/msgpack")
+        self.assertEqual(decode(resp.content, resp["Content-Type"])["count"], 25)
+
+    @skipUnless(CBOR_AVAILABLE, "cbor2 not installed")
+    def test_cbor_keeps_decimals_exact(self):
+        auth = self.login()
+        resp = self.client.get("/items/", {"item_code": "I00001"}, HTTP_ACCEPT="application/cbor", **auth)
+        item = decode(resp.content, resp["Content-Type"])["items"][0]
+        self.assertEqual(item["rate"], Decimal("47.00"))
+
+    def test_json_stays_the_default(self):
+        self.assertEqual(negotiate(None), "application/json")
+        self.assertEqual(negotiate("*/*"), "application/json")
+        self.assertEqual(negotiate("application/json, application/msgpack"), "application/json")
+        self.assertEqual(negotiate("text/html"), "application/json")
+        resp = self.client.get("/status", HTTP_ACCEPT="text/html")
+        self.assertEqual(resp["Content-Type"], "application/json")
+
+
+class ThreadedServerTests(SimpleTestCase):
+    def start(self, app, **kwargs):
+        server = ThreadedWSGIServer(("127.0.0.1", 0), app, **kwargs)
+        thread = threading.Thread(target=server.serve_forever)
+        thread.start()
+        self.addCleanup(thread.join, 5)
+        self.addCleanup(server.stop)
+        return server
+
+    def test_keep_alive_reuses_connection(self):
+        def app(environ, start_response):
+            body = environ["wsgi.input"].read().upper() or b"ok"
+            start_response("200 OK", [("Content-Type", "text/plain"), ("Content-Length", str(len(body)))])
+            return [body]
+
+        server = self.start(app, threads=2)
+        conn = http.client.HTTPConnection("127.0.0.1", server.server_port, timeout=5)
+        conn.request("POST", "/", body=b"abc")
+        self.assertEqual(conn.getresponse().read(), b"ABC")
+        sock = conn.sock
+        conn.request("GET", "/")
+        self.assertEqual(conn.getresponse().read(), b"ok")
+        self.assertIs(conn.sock, sock)
+        conn.close()
+
+    def test_stop_waits_for_running_request(self):
+        entered = threading.Event()
+
+        def app(environ, start_response):
+            entered.set()
+            time.sleep(0.2)
+            start_response("200 OK", [("Content-Length", "4")])
+            return [b"done"]
+
+        server = self.start(app, threads=1, shutdown_timeout=5)
+        result = []
+
+        def fetch():
+            conn = http.client.HTTPConnection("127.0.0.1", server.server_port, timeout=5)
+            conn.request("GET", "/")
+            result.append(conn.getresponse().read())
+
+        client = threading.Thread(target=fetch)
+        client.start()
+        entered.wait(2)
+        server.stop()
+        client.join(5)
+        self.assertEqual(result, [b"done"])
+
+
+@override_settings(ROOT_URLCONF="django_sync.asgi_urls")
+class AsyncViewTests(StubDatabaseMixin, SimpleTestCase):
+    async def test_async_views_match_sync_views(self):
+        auth = await sync_to_async(self.login)()
+        client = AsyncClient()
+        resp = await client.get("/items/", headers={"Authorization": auth["HTTP_AUTHORIZATION"]})
+        self.assertEqual(resp.status_code, 200)
+        self.assertEqual(len(resp.json()["items"]), 25)
+        self.assertIn("db;dur=", resp["Server-Timing"])
+
+    async def test_requests_run_concurrently_on_executor(self):
+        auth = {"Authorization": (await sync_to_async(self.login)())["HTTP_AUTHORIZATION"]}
+        barrier = threading.Barrier(3, timeout=2)
+        real_fetch = ITEMS.fetch
+
+        def fetch(*args, **kwargs):
+            barrier.wait()                # BrokenBarrierError unless 3 run at once
+            return real_fetch(*args, **kwargs)
+
+        client = AsyncClient()
+        with get_config().override(async_db_workers=3, cache_ttl={"items": 0}), \
+                mock.patch.object(ITEMS, "fetch", fetch):
+            responses = await asyncio.gather(*[
+                client.get("/items/", {"item_code": f"I0000{i}"}, headers=auth) for i in (1, 2, 3)
+            ])
+        self.assertEqual([r.status_code for r in responses], [200, 200, 200])
+
+    async def test_streamed_lists_are_async_iterators(self):
+        auth = {"Authorization": (await sync_to_async(self.login)())["HTTP_AUTHORIZATION"]}
+        resp = await AsyncClient().get("/items/", {"stream": "1"}, headers=auth)
+        self.assertTrue(resp.is_async)
+        body = b"".join([chunk async for chunk in resp.streaming_content])
+        self.assertEqual(json.loads(body)["count"], 25)
+
+    def test_asgi_entry_point_leaves_the_environment_alone(self):
+        with override_settings(ROOT_URLCONF="django_sync.urls"), \
+                mock.patch.dict(os.environ, {}, clear=False):
+            os.environ.pop("DJANGO_ROOT_URLCONF", None)
+            importlib.reload(importlib.import_module("django_sync.asgi"))
+            self.assertEqual(settings.ROOT_URLCONF, "django_sync.asgi_urls")
+            self.assertNotIn("DJANGO_ROOT_URLCONF", os.environ)
+
+    def test_executor_follows_configured_size(self):
+        pool = ResizableExecutor("test", lambda cfg: cfg.get("test_workers", 2))
+        with get_config().override(test_workers=2):
+            first = pool.get()
+            self.assertIs(pool.get(), first)
+        with get_config().override(test_workers=3):
+            self.assertIsNot(pool.get(), first)
+            self.assertEqual(pool.get()._max_workers, 3)
+        pool.get().shutdown()
+
+
+class UserContextTests(StubDatabaseMixin, SimpleTestCase):
+    def test_settings_travel_in_token(self):
+        resp = self.client.post("/login", json.dumps({"userid": "USER01", "password": "1234"}),
+                                content_type="application/json").json()
+        self.assertEqual(resp["settings"], ["S001", "S002", "S003"])
+        auth = {"HTTP_AUTHORIZATION": f"Bearer {resp['token']}"}
+        user_contexts._entries.pop("USER01")      # only the token claims are left
+        with mock.patch.object(USER_SETTINGS, "fetch") as fetch:
+            body = self.client.get("/verify-token", **auth).json()
+        fetch.assert_not_called()
+        self.assertEqual(body["settings"], ["S001", "S002", "S003"])
+
+    def test_invalidation_rereads_settings_for_old_tokens(self):
+        auth = self.login()
+        conn = get_connection()
+        conn.execute("INSERT INTO acc_userssettings VALUES ('USER01', 'S999')")
+        conn.commit()
+        conn.close()
+        time.sleep(0.01)
+        self.client.post("/cache/invalidate", json.dumps({"resource": "settings", "uid": "USER01"}),
+                         content_type="application/json", **auth)
+        loads = user_contexts.loads
+        body = self.client.get("/verify-token", **auth).json()
+        self.assertIn("S999", body["settings"])
+        self.client.get("/verify-token", **auth)
+        self.assertEqual(user_contexts.loads, loads + 1)
+
+    def test_settings_reload_under_overload_answers_503(self):
+        auth = self.login()
+        time.sleep(0.01)
+        user_contexts.invalidate("USER01")          # the token now needs a DB read
+        with get_config().override(db_max_concurrent=1, db_queue_size=0), get_limiter().slot():
+            resp = self.client.get("/verify-token", **auth)
+        self.assertEqual(resp.status_code, 503)
+        self.assertEqual(resp.json()["status"], "error")
+        self.assertIn("Retry-After", resp)
+
+
+class AdmissionControlTests(StubDatabaseMixin, SimpleTestCase):
+    def test_queue_full_is_rejected_immediately(self):
+        limiter = AdmissionLimiter(max_concurrent=1, max_queue=1, queue_timeout=2)
+        release, queued = threading.Event(), threading.Event()
+
+        def hold():
+            with limiter.slot():
+                release.wait(2)
+
+        def wait_in_queue():
+            queued.set()
+            with limiter.slot():
+                pass
+
+        holder = threading.Thread(target=hold)
+        holder.start()
+        while limiter.active == 0:
+            time.sleep(0.001)
+        waiter = threading.Thread(target=wait_in_queue)
+        waiter.start()
+        while limiter.waiting == 0:
+            time.sleep(0.001)
+        started = time.monotonic()
+        with self.assertRaises(DbOverloaded) as cm:
+            with limiter.slot():
+                pass
+        self.assertLess(time.monotonic() - started, 0.5)
+        self.assertGreaterEqual(cm.exception.retry_after, 1)
+        release.set()
+        holder.join()
+        waiter.join()
+        self.assertEqual(limiter.stats()["admitted"], 2)
+        self.assertEqual(limiter.stats()["rejected"], 1)
+
+    def test_wait_timeout(self):
+        limiter = AdmissionLimiter(max_concurrent=1, max_queue=5, queue_timeout=0.05)
+        with limiter.slot():
+            with self.assertRaises(DbOverloaded):
+                with limiter.slot():
+                    pass
+        self.assertEqual(limiter.stats()["timed_out"], 1)
+
+    def test_overload_answers_503_with_retry_after(self):
+        auth = self.login()
+        with mock.patch.object(ITEMS, "fetch", side_effect=DbOverloaded("Database busy, queue full", 3)):
+            resp = self.client.get("/items/", **auth)
+        self.assertEqual(resp.status_code, 503)
+        self.assertEqual(resp["Retry-After"], "3")
+        self.assertIn("db_admission", self.client.get("/status").json())
+
+
+class StartupTests(SimpleTestCase):
+    def setUp(self):
+        import SyncService
+        self.service = SyncService
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        self.tmpdir = tmp.name
+
+    def test_pid_file_claimed_without_psutil(self):
+        with mock.patch("sync.supervisor._process_created", side_effect=AssertionError("psutil used")):
+            self.assertTrue(self.service.claim_pid_file(self.tmpdir))     # no file yet
+            self.assertTrue(self.service.claim_pid_file(self.tmpdir))     # our own entry
+        path = os.path.join(self.tmpdir, "syncservice.pid")
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump({"pid": os.getpid(), "started": time.time() - 10 ** 6}, f)
+        self.assertIsNone(pid_file_alive(path))        # that PID's process is younger: recycled
+
+    def test_migrate_runs_until_the_db_itself_is_migrated(self):
+        from django.conf import settings
+        exe_dir = os.path.join(self.tmpdir, "exe")
+        db_dir = os.path.join(self.tmpdir, "extracted")
+        os.makedirs(exe_dir)
+        os.makedirs(db_dir)
+        db = os.path.join(db_dir, "db.sqlite3")
+        open(db, "wb").close()                                   # 0-byte DB as shipped
+        svc = self.service
+        with mock.patch.dict(settings.DATABASES["default"], NAME=db), \
+                mock.patch.object(svc, "schema_fingerprint", return_value="fp1"), \
+                mock.patch.object(svc, "apply_migrations") as migrate, \
+                mock.patch.object(svc, "_migrations_applied", return_value=False) as applied:
+            self.assertTrue(svc.migrate_if_needed(exe_dir))
+            self.assertTrue(os.path.exists(os.path.join(db_dir, ".schema_fingerprint")))
+            self.assertFalse(os.path.exists(os.path.join(exe_dir, ".schema_fingerprint")))
+            self.assertTrue(svc.migrate_if_needed(exe_dir))      # stamp matches, tables missing
+            applied.return_value = True
+            self.assertFalse(svc.migrate_if_needed(exe_dir))
+            svc.schema_fingerprint.return_value = "fp2"
+            self.assertTrue(svc.migrate_if_needed(exe_dir))
+        self.assertEqual(migrate.call_count, 3)
+
+    def test_ip_probes_are_bounded_by_the_timeout(self):
+        svc = self.service
+        with mock.patch.object(svc, "_probe_default_route", lambda out: out.append("10.0.0.5")), \
+                mock.patch.object(svc, "_probe_hostname", lambda out: time.sleep(2) or out.append("x")):
+            started = time.monotonic()
+            self.assertEqual(svc.ipv4_candidates(0.2), ["10.0.0.5"])
+        self.assertLess(time.monotonic() - started, 1.0)
+
+    def test_startup_timer_reports_each_step(self):
+        timer = self.service.StartupTimer()
+        t = time.perf_counter()
+        timer.step("config", t)
+        timer.step("migrate", t)
+        self.assertEqual([name for name, _ in timer.steps], ["config", "migrate"])
+        self.assertRegex(timer.report(), r"^⏱️ Startup \d+ms: config \d+ms, migrate \d+ms$")
+
+
+class SupervisorTests(SimpleTestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmpdir.cleanup)
+
+    def _supervisor(self, code="import time; time.sleep(30)"):
+        sup = Supervisor([sys.executable, "-c", code], self.tmpdir.name)
+        self.addCleanup(sup.stop)
+        return sup
+
+    def test_concurrent_pairs_launch_once(self):
+        sup = self._supervisor()
+        outcomes = []
+        with mock.patch("sync.supervisor.subprocess.Popen", wraps=subprocess.Popen) as popen:
+            threads = [threading.Thread(target=lambda: outcomes.append(sup.ensure_running()[0]))
+                       for _ in range(8)]
+            for t in threads:
+                t.start()
+            for t in threads:
+                t.join()
+        self.assertEqual(popen.call_count, 1)
+        self.assertEqual(sorted(outcomes), ["launched"] + ["running"] * 7)
+        self.assertEqual(pid_file_alive(sup.pid_file), sup.status()["pid"])
+
+    def test_existing_instance_is_not_relaunched(self):
+        sup = self._supervisor()
+        write_pid_file(sup.pid_file)             # this test process plays the running service
+        with mock.patch("sync.supervisor.subprocess.Popen") as popen:
+            outcome, health = sup.ensure_running()
+        popen.assert_not_called()
+        self.assertEqual((outcome, health["pid"]), ("running", os.getpid()))
+
+    def test_status_is_cached(self):
+        sup = self._supervisor()
+        sup.status()
+        with mock.patch("sync.supervisor.pid_file_alive") as alive:
+            for _ in range(100):
+                sup.status()
+        alive.assert_not_called()
+
+    def test_pair_requests_use_cached_status(self):
+        sup = self._supervisor()
+        write_pid_file(sup.pid_file)
+        self.assertEqual(sup.ensure_running()[0], "running")
+        with mock.patch("sync.supervisor.pid_file_alive") as alive:
+            for _ in range(100):
+                self.assertEqual(sup.ensure_running()[0], "running")
+        alive.assert_not_called()
+
+    def test_crashed_child_is_restarted(self):
+        sup = self._supervisor("import time, sys; time.sleep(0.2); sys.exit(3)")
+        self.assertEqual(sup.ensure_running()[0], "launched")
+        first = sup.status()["pid"]
+        deadline = time.monotonic() + 5
+        while sup.status()["restarts"] == 0 and time.monotonic() < deadline:
+            time.sleep(0.05)
+        health = sup.status()
+        self.assertEqual(health["restarts"], 1)
+        self.assertEqual(health["last_exit_code"], 3)
+        self.assertNotEqual(health["pid"], first)
+
+
+    def test_clean_exit_is_not_restarted(self):
+        sup = self._supervisor("pass")
+        with mock.patch("sync.supervisor.subprocess.Popen", wraps=subprocess.Popen) as popen:
+            sup.ensure_running()
+            deadline = time.monotonic() + 5
+            while sup.status()["state"] != "stopped" and time.monotonic() < deadline:
+                time.sleep(0.05)
+            time.sleep(0.2)
+        self.assertEqual(popen.call_count, 1)
+        self.assertEqual((sup.status()["last_exit_code"], sup.status()["restarts"]), (0, 0))
+
+    def test_child_launched_during_backoff_stays_monitored(self):
+        sup = self._supervisor("import sys; sys.exit(3)")
+        sup.ensure_running()
+        deadline = time.monotonic() + 5
+        while sup.status()["state"] != "restarting" and time.monotonic() < deadline:
+            time.sleep(0.01)
+        sup.command = [sys.executable, "-c", "import time; time.sleep(1.5)"]
+        self.assertEqual(sup.ensure_running()[0], "launched")    # inside the 1s backoff
+        replacement = sup._child
+        time.sleep(1.2)
+        self.assertIs(sup._child, replacement)                     # not relaunched over it
+        deadline = time.monotonic() + 3
+        while sup.status()["state"] != "stopped" and time.monotonic() < deadline:
+            time.sleep(0.05)
+        self.assertEqual(sup.status()["last_exit_code"], 0)       # its exit was seen
+
+
+class ApiProfileTests(StubDatabaseMixin, SimpleTestCase):
+    def test_api_profile_serves_sync_routes_only(self):
+        from django_sync import settings_api
+        self.assertNotIn("django.contrib.sessions", settings_api.INSTALLED_APPS)
+        with override_settings(MIDDLEWARE=settings_api.MIDDLEWARE, ROOT_URLCONF=settings_api.ROOT_URLCONF):
+            resp = self.client.get("/status")
+            self.assertEqual(resp.status_code, 200)
+            self.assertIn("total;dur=", resp["Server-Timing"])
+            self.assertNotIn("X-Frame-Options", resp)
+            self.assertEqual(self.client.get("/admin/").status_code, 404)
+            login = self.client.post("/login", json.dumps({"userid": "USER01", "password": "1234"}),
+                                     content_type="application/json")
+            self.assertEqual(login.status_code, 200)
+
+    def test_middleware_benchmark_reports_both_profiles(self):
+        run = benchmarks.run_middleware_benchmark(iterations=2, warmup=0, endpoints=["status"], size=20)
+        self.assertEqual(set(run["results"]), {"full", "api"})
+        self.assertLess(run["meta"]["middleware"]["api"], run["meta"]["middleware"]["full"])
+        self.assertIn("status", benchmarks.format_middleware_report(run))
+
+
+class MetricsTests(StubDatabaseMixin, SimpleTestCase):
+    def setUp(self):
+        super().setUp()
+        metrics.reset()
+
+    def test_routes_phases_and_gauges_are_exposed(self):
+        auth = self.login()
+        self.client.get("/items/", **auth)
+        self.client.get("/items/I00001/image", **auth)
+        resp = self.client.get("/metrics")
+        self.assertEqual(resp.status_code, 200)
+        self.assertTrue(resp["Content-Type"].startswith("text/plain; version=0.0.4"))
+        text = resp.content.decode()
+        self.assertIn('sync_requests_total{route="/items/",method="GET",status="200"} 1', text)
+        self.assertIn('route="/items/<str:item_code>/image"', text)
+        for name in ("connect", "query", "fetch", "rows", "json"):
+            self.assertIn(f'sync_phase_duration_seconds_count{{route="/items/",phase="{name}"}} 1', text)
+        self.assertIn('sync_request_duration_seconds_bucket{route="/items/",le="+Inf"} 1', text)
+        self.assertIn("sync_db_pool_in_use 0", text)
+        self.assertIn('sync_cache_misses_total{dataset="items"}', text)
+
+    def test_histogram_buckets_are_cumulative(self):
+        hist = Histogram()
+        for seconds in (0.0001, 0.003, 0.003, 20.0):
+            hist.observe(seconds)
+        lines = list(Metrics()._histogram_lines("h", {}, hist))
+        self.assertIn('h_bucket{le="0.0005"} 1', lines)
+        self.assertIn('h_bucket{le="0.005"} 3', lines)
+        self.assertIn('h_bucket{le="10.0"} 3', lines)
+        self.assertIn('h_bucket{le="+Inf"} 4', lines)
+        self.assertIn("h_count 4", lines)
+
+
+class QueryStatsTests(StubDatabaseMixin, SimpleTestCase):
+    def setUp(self):
+        super().setUp()
+        query_stats.reset()
+
+    def test_fingerprint_normalizes_literals(self):
+        a = fingerprint("SELECT TOP 501 *  FROM t WHERE code = 'I001' AND id IN (?, ?, ?)")
+        b = fingerprint("SELECT TOP 26 * FROM t\n WHERE code = 'X''9' AND id IN (?)")
+        self.assertEqual(a, b)
+        self.assertEqual(a[0], "SELECT TOP ? * FROM t WHERE code = ? AND id IN (?...)")
+        self.assertEqual(fingerprint("SELECT * FROM tb_item_master")[0], "SELECT * FROM tb_item_master")
+
+    def test_top_queries_endpoint(self):
+        auth = self.login()
+        for _ in range(2):
+            master_cache.invalidate()
+            self.client.get("/items/", **auth)
+        resp = self.client.get("/db/queries", {"top": 1}, **auth)
+        self.assertEqual(resp.status_code, 200)
+        body = resp.json()
+        self.assertEqual(body["count"], 1)
+        top = body["queries"][0]
+        self.assertIn("tb_item_master", top["sql"])
+        self.assertEqual((top["calls"], top["rows"]), (2, 2 * self.seed["items"]))
+        self.assertGreater(top["bytes"], 0)
+        self.assertEqual(self.client.get("/db/queries", {"sort": "x"}, **auth).status_code, 400)
+
+    def test_slow_queries_are_logged(self):
+        with get_config().override(slow_query_ms=5, sqlite_query_latency_ms=10):
+            with self.assertLogs("sync.slow_queries", "WARNING") as logs:
+                ITEMS.fetch({})
+        self.assertIn("tb_item_master", logs.output[0])
+        self.assertEqual(query_stats.slow[-1]["rows"], self.seed["items"])
+
+
+class QueuedLoggingTests(SimpleTestCase):
+    def setUp(self):
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        self.tmpdir = tmp.name
+        self.path = os.path.join(tmp.name, "service.log")
+        # back to the test run's console-only logging after the override
+        self.addCleanup(configure_logging, log_file=False)
+        override = get_config().override(log_file=self.path, log_console=False, log_max_bytes=400,
+                                         log_backup_count=2,
+                                         log_level={"root": "INFO", "sync.tests.quiet": "ERROR"})
+        override.__enter__()
+        self.addCleanup(override.__exit__, None, None, None)
+
+    def test_json_records_levels_and_rotation(self):
+        configure_logging()
+        logging.getLogger("sync.tests.quiet").warning("hidden")
+        for i in range(10):
+            logging.getLogger("sync.tests").info("line %d", i, extra={"route": "/items/"})
+        stop_logging()
+        self.assertTrue(os.path.exists(self.path + ".1"))         # rotated at 400 bytes
+        records = []
+        for path in (self.path + ".2", self.path + ".1", self.path):
+            if os.path.exists(path):
+                with open(path, encoding="utf-8") as f:
+                    records += [json.loads(line) for line in f]
+        self.assertEqual(records[-1]["msg"], "line 9")
+        self.assertEqual((records[-1]["logger"], records[-1]["route"]), ("sync.tests", "/items/"))
+        self.assertNotIn("hidden", [r["msg"] for r in records])
+
+    def test_relative_log_file_lands_in_service_dir(self):
+        with mock.patch.object(ServiceConfig, "service_dir", new_callable=mock.PropertyMock,
+                               return_value=self.tmpdir), \
+                get_config().override(log_file="logs/relative.log"):
+            configure_logging()
+            logging.getLogger("sync.tests").info("here")
+            stop_logging()
+        self.assertTrue(os.path.exists(os.path.join(self.tmpdir, "logs", "relative.log")))
+
+    def test_file_handler_can_be_left_out(self):
+        configure_logging(log_file=False)
+        logging.getLogger("sync.tests").info("console only")
+        stop_logging()
+        self.assertFalse(os.path.exists(self.path))
+
+    def test_full_queue_drops_instead_of_blocking(self):
+        with get_config().override(log_queue_size=1):
+            handler = configure_logging()
+            stop_logging()                             # nobody drains the queue now
+            started = time.monotonic()
+            for i in range(100):
+                logging.getLogger("sync.tests").info("line %d", i)
+        self.assertLess(time.monotonic() - started, 0.5)
+        self.assertEqual(handler.dropped, 99)
+
+
+class KotSubmissionTests(StubDatabaseMixin, SimpleTestCase):
+    order = {"tableno": "T01", "lines": [{"item_code": "I00001", "qty": 2, "notes": "no onion"},
+                                         {"item_code": "I00002", "qty": "1.5"}]}
+
+    def submit(self, auth, order=None, key="k-1"):
+        return self.client.post("/kot/", json.dumps(order or self.order), content_type="application/json",
+                                HTTP_IDEMPOTENCY_KEY=key, **auth)
+
+    def count(self, table):
+        conn = get_connection()
+        try:
+            return conn.execute(f"SELECT COUNT(*) FROM {table}").fetchone()[0]
+        finally:
+            conn.close()
+
+    def test_order_is_priced_and_stored_in_one_batch(self):
+        auth = self.login()
+        query_stats.reset()
+        resp = self.submit(auth)
+        self.assertEqual(resp.status_code, 201, resp.content)
+        kot = resp.json()["kot"]
+        self.assertEqual((kot["tableno"], kot["userid"], kot["item_count"]), ("T01", "USER01", 2))
+        self.assertEqual([line["rate"] for line in kot["lines"]], ["47.00", "54.00"])
+        self.assertEqual([line["amount"] for line in kot["lines"]], ["94.00", "81.00"])
+        self.assertEqual(kot["total"], "175.00")
+        self.assertEqual((self.count("dine_kot"), self.count("dine_kot_detail")), (1, 2))
+        inserts = [q for q in query_stats.top(50) if "dine_kot_detail" in q["sql"] and "INSERT" in q["sql"]]
+        self.assertEqual(inserts[0]["calls"], 1)
+
+    def test_retry_with_same_key_returns_the_same_ticket(self):
+        auth = self.login()
+        first = self.submit(auth).json()["kot"]
+        again = self.submit(auth)
+        self.assertEqual(again.status_code, 200)
+        self.assertTrue(again.json()["duplicate"])
+        self.assertEqual(again.json()["kot"], first)
+        self.assertEqual(self.count("dine_kot"), 1)
+
+        changed = {**self.order, "tableno": "T02"}
+        self.assertEqual(self.submit(auth, changed).status_code, 409)
+        self.assertEqual(self.submit(auth, changed, key="k-2").status_code, 201)
+
+    def test_missing_tables_are_created_on_first_order(self):
+        conn = get_connection()
+        conn.execute("DROP TABLE dine_kot_detail")
+        conn.execute("DROP TABLE dine_kot")
+        conn.commit()
+        conn.close()
+        self.assertEqual(self.submit(self.login()).status_code, 201)
+        self.assertEqual((self.count("dine_kot"), self.count("dine_kot_detail")), (1, 2))
+        self.assertIn("DEFAULT AUTOINCREMENT", dict(SqlAnywhereBackend("", "", "").kot_ddl())["dine_kot"])
+
+    def test_keys_are_scoped_to_the_user(self):
+        first = self.submit(self.login()).json()["kot"]
+        other = self.submit(self.login("USER02"), {**self.order, "tableno": "T02"})
+        self.assertEqual(other.status_code, 201)
+        self.assertEqual(other.json()["kot"]["userid"], "USER02")
+        self.assertNotEqual(other.json()["kot"]["kotno"], first["kotno"])
+
+    def test_invalid_orders_are_rejected_before_writing(self):
+        auth = self.login()
+        bad_item = {"tableno": "T01", "lines": [{"item_code": "NOPE", "qty": 1}]}
+        self.assertEqual(self.submit(auth, bad_item).json()["detail"], "Unknown item code(s): NOPE")
+        self.assertEqual(self.submit(auth, {**self.order, "tableno": "T99"}).status_code, 400)
+        inactive = {"tableno": "T01", "lines": [{"item_code": "I00017", "qty": 1}]}
+        self.assertEqual(self.submit(auth, inactive).json()["detail"], "Inactive item code(s): I00017")
+        self.assertEqual(self.submit(auth, {"tableno": "T01", "lines": [
+            {"item_code": "I00001", "qty": -1}]}).status_code, 400)
+        self.assertEqual(self.submit(auth, key="").status_code, 400)
+        self.assertEqual(self.count("dine_kot"), 0)
+
+
+class BenchmarkSuiteTests(SimpleTestCase):
+    def test_run_reports_phases_and_compares_to_baseline(self):
+        run = benchmarks.run_benchmarks(sizes=(20,), iterations=3, warmup=0,
+                                        endpoints=["items", "status"])
+        items = run["results"]["20"]["items"]
+        self.assertEqual(items["n"], 3)
+        self.assertGreater(items["db_p50"], 0)
+        self.assertGreater(items["json_p50"], 0)
+        self.assertEqual(benchmarks.compare(run, run), [])
+
+        slower = json.loads(json.dumps(run))
+        slower["results"]["20"]["items"]["p50"] = items["p50"] * 2 + 1
+        self.assertEqual(len(benchmarks.compare(slower, run)), 1)
+
+    def test_server_timing_header(self):
+        resp = self.client.get("/status")
+        self.assertIn("total;dur=", resp["Server-Timing"])
@@ -0,0 +1,99 @@
+"""
+Per-request phase timing
+
+    with phase("rows"):
+        data = [...]
+
+adds the elapsed time to the current request's timings. ServerTimingMiddleware
+opens a fresh timings dict per request and reports it in the standard
+`Server-Timing` header (milliseconds), which the benchmark suite reads back.
+Outside a request, phase() is a no-op.
+
+Phases used by the views:
+  db       - pooled connection checkout, execute and fetch (recorded by db_cursor)
+  connect  - the pool checkout part of db
+  query    - cursor.execute() part of db
+  fetch    - fetchall() part of db
+  rows     - turning DB rows into dicts
+  json     - encoding the response body
+
+metrics.py keeps histograms of the same phases per route for /metrics.
+"""
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+_timings = ContextVar("sync_timings", default=None)
+
+
+def start_request():
+    """Begin collecting for a new request; returns (timings dict, reset token)."""
+    timings = {}
+    return timings, _timings.set(timings)
+
+
+def end_request(token):
+    _timings.reset(token)
+
+
+def current_timings():
+    return _timings.get()
+
+
+@contextmanager
+def phase(name):
+    timings = _timings.get()
+    if timings is None:
+        yield
+        return
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        timings[name] = timings.get(name, 0.0) + (time.perf_counter() - started)
+
+
+def run_timed(func, *args):
+    """
+    (func(*args), timings) with the phases collected in a dict of their own -
+    for worker threads, which must not write into the request's dict while
+    other workers do.
+    """
+    timings, token = start_request()
+    try:
+        return func(*args), timings
+    finally:
+        end_request(token)
+
+
+def merge_parallel(parts):
+    """
+    Add the timings of work that ran side by side to the current request.
+    Each phase counts the slowest worker, not the sum, so db etc. stay
+    within the wall-clock time the request actually waited.
+    """
+    timings = _timings.get()
+    if timings is None:
+        return
+    merged = {}
+    for part in parts:
+        for name, secs in part.items():
+            merged[name] = max(merged.get(name, 0.0), secs)
+    for name, secs in merged.items():
+        timings[name] = timings.get(name, 0.0) + secs
+
+
+def format_server_timing(timings):
+    return ", ".join(f"{name};dur={secs * 1000:.3f}" for name, secs in timings.items())
+
+
+def parse_server_timing(header):
+    """'db;dur=1.5, json;dur=0.2' -> {"db": 0.0015, "json": 0.0002} (seconds)"""
+    out = {}
+    for part in (header or "").split(","):
+        name, _, params = part.strip().partition(";")
+        for param in params.split(";"):
+            key, _, value = param.strip().partition("=")
+            if key == "dur":
+                out[name] = float(value) / 1000.0
+    return out
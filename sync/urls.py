@@ -7,8 +7,15 @@ urlpatterns = [
     path("verify-token",  views.verify_token,  name="verify_token"),
     path("status",        views.get_status,    name="get_status"),
     path("items/", views.get_items, name="get_items"),
+    path("items/<str:item_code>/image", views.get_item_image, name="get_item_image"),
     path("dine-tables/", views.get_dine_tables, name="get_dine_tables"),
     path("user-settings/", views.get_user_settings, name="get_user_settings"),
     path("dine-categories/", views.get_dine_categories, name="get_dine_categories"),
+    path("bootstrap/", views.get_bootstrap, name="get_bootstrap"),
+    path("kot/", views.submit_kot, name="submit_kot"),
+    path("cache/invalidate", views.invalidate_cache, name="invalidate_cache"),
+    path("cache/stats", views.cache_stats, name="cache_stats"),
+    path("db/queries", views.query_stats_view, name="query_stats"),
+    path("metrics", views.get_metrics, name="get_metrics"),
 
 ]
\ No newline at end of file
@@ -0,0 +1,109 @@
+"""
+Per-user context (acc_userssettings codes) without a query per request
+
+login() reads the user's settings codes once and puts them in the JWT:
+
+    {"sub": "USER01", "iat": ..., "exp": ..., "stg": ["S001", "S002"], "sd": "<digest>"}
+
+jwt_required attaches request.user_context, built from those claims and
+kept in a small in-process cache keyed by sub, so authorized views get the
+user's settings without touching acc_userssettings.
+
+When settings change, POST /cache/invalidate {"resource": "settings"[, "uid": ...]}
+marks tokens issued before that moment as stale: their claims are ignored
+and the codes are re-read from the DB (once per `user_context_ttl` seconds,
+default 300) until the user logs in again.
+"""
+import hashlib
+import threading
+import time
+
+from .config import get_config
+from .datasets import USER_SETTINGS
+
+
+def settings_digest(codes):
+    h = hashlib.blake2b(digest_size=6)
+    for code in sorted(codes):
+        h.update(str(code).encode("utf-8"))
+        h.update(b"\x1e")
+    return h.hexdigest()
+
+
+class UserContext:
+    __slots__ = ("userid", "settings", "digest")
+
+    def __init__(self, userid, settings):
+        self.userid = userid
+        self.settings = tuple(sorted(settings))
+        self.digest = settings_digest(self.settings)
+
+    def has(self, code):
+        return code in self.settings
+
+    def claims(self):
+        """JWT claims carrying this context (see module docstring)."""
+        return {"stg": list(self.settings), "sd": self.digest}
+
+
+class UserContextCache:
+    def __init__(self):
+        self._entries = {}             # userid -> (UserContext, expires_at)
+        self._invalidated = {}         # userid -> time.time() of the last invalidation
+        self._invalidated_all = 0.0
+        self._lock = threading.Lock()
+        self.loads = 0                 # DB reads, for tests and /cache/stats
+
+    def _ttl(self):
+        return float(get_config().get("user_context_ttl", 300))
+
+    def _put(self, ctx):
+        with self._lock:
+            self._entries[ctx.userid] = (ctx, time.monotonic() + self._ttl())
+
+    def load(self, userid):
+        """Fresh context from acc_userssettings (login, stale tokens)."""
+        rows = USER_SETTINGS.fetch({"uid": userid})
+        ctx = UserContext(userid, [r[1] for r in rows])
+        self.loads += 1
+        self._put(ctx)
+        return ctx
+
+    def _stale(self, payload):
+        issued = payload.get("iat", 0)
+        with self._lock:
+            since = max(self._invalidated_all, self._invalidated.get(payload["sub"], 0.0))
+        return issued < since
+
+    def for_token(self, payload):
+        """Context for a decoded JWT; reads the DB only for stale or pre-context tokens."""
+        userid = payload["sub"]
+        stale = self._stale(payload)
+        with self._lock:
+            entry = self._entries.get(userid)
+        if entry and entry[1] > time.monotonic():
+            return entry[0]
+        codes = payload.get("stg")
+        if not stale and codes is not None and payload.get("sd") == settings_digest(codes):
+            ctx = UserContext(userid, codes)
+            self._put(ctx)
+            return ctx
+        return self.load(userid)
+
+    def invalidate(self, userid=None):
+        now = time.time()
+        with self._lock:
+            if userid is None:
+                self._entries.clear()
+                self._invalidated.clear()
+                self._invalidated_all = now
+            else:
+                self._entries.pop(userid, None)
+                self._invalidated[userid] = now
+
+    def stats(self):
+        with self._lock:
+            return {"users": len(self._entries), "db_loads": self.loads}
+
+
+user_contexts = UserContextCache()
@@ -1,21 +1,34 @@
 import os
-import jwt
-import psutil
-import subprocess
 import sys
 import json
 import logging
+import time
 from decimal import Decimal
 from datetime import datetime, date, timedelta
 from functools import wraps
 from decimal import Decimal, ROUND_HALF_UP
-from django.http import JsonResponse
+from django.http import FileResponse, HttpResponse, HttpResponseNotModified, HttpResponseRedirect
+from django.utils.functional import SimpleLazyObject
+from django.utils.http import parse_etags
 from django.views.decorators.csrf import csrf_exempt
 from django.views.decorators.http import require_http_methods
 
-from .sql_helper import get_connection, _get_config
+from .bootstrap import load_sections
+from .cache import master_cache
+from .datasets import (DATASETS, DINE_CATEGORIES, DINE_TABLES, ITEMS, USER_SETTINGS,
+                       decode_cursor, encode_cursor, fingerprint, fingerprints)
+from .delta import tracker_for
+from .images import ImageNotFound, allowed_sizes, image_file, image_url
+from .kot import KotConflict, KotInvalid, idempotency_key, submit_order
+from .metrics import CONTENT_TYPE as METRICS_CONTENT_TYPE, metrics
+from .query_stats import query_stats
+from .responses import JSON, api_response, negotiate
+from .sql_helper import DbOverloaded, db_cursor, get_limiter, _get_config
+from .streaming import stream_dataset
+from .supervisor import get_supervisor
+from .timing import phase
+from .user_context import user_contexts
 
-logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s")
 
 PAIR_PASSWORD = os.getenv("PAIR_PASSWORD", "IMC-MOBILE")
 
@@ -31,23 +44,45 @@ def _extract_token(request):
         return None
     return hdr.split(" ", 1)[1]
 
+# jwt, psutil and subprocess are imported where used: a cold SyncService.exe
+# start should not pay for modules the first request may not need
 def _decode(token):
+    import jwt
     return jwt.decode(token, JWT_SECRET, algorithms=[JWT_ALGO])
 
+class _ContextUnavailable(Exception):
+    """request.user_context could not be loaded; `error` is the DB error behind it."""
+
+    def __init__(self, error):
+        super().__init__(str(error))
+        self.error = error
+
+def _load_context(payload):
+    try:
+        return user_contexts.for_token(payload)
+    except Exception as e:
+        raise _ContextUnavailable(e) from e
+
 def jwt_required(view_func):
     @wraps(view_func)
     def _wrapped(request, *args, **kwargs):
+        import jwt
         token = _extract_token(request)
         if not token:
-            return JsonResponse({"detail": "Token missing"}, status=401)
+            return api_response(request, {"detail": "Token missing"}, status=401)
         try:
             payload = _decode(token)
             request.userid = payload["sub"]
+            # settings codes from the token claims; no DB unless invalidated
+            request.user_context = SimpleLazyObject(lambda: _load_context(payload))
         except jwt.ExpiredSignatureError:
-            return JsonResponse({"detail": "Token expired"}, status=401)
+            return api_response(request, {"detail": "Token expired"}, status=401)
         except jwt.PyJWTError:
-            return JsonResponse({"detail": "Invalid token"}, status=401)
-        return view_func(request, *args, **kwargs)
+            return api_response(request, {"detail": "Invalid token"}, status=401)
+        try:
+            return view_func(request, *args, **kwargs)
+        except _ContextUnavailable as e:         # the lazy settings reload hit the DB and failed
+            return _error_response(request, e)
     return _wrapped
 
 def _to_float(x):
@@ -82,6 +117,199 @@ def _coerce_date(v):
     return date.today()
 
 
+def _etag_matches(etag, if_none_match):
+    # weak comparison (RFC 9110 13.1.2): ignore the W/ prefix on both sides
+    if "*" in if_none_match:
+        return True
+    bare = etag[2:] if etag.startswith("W/") else etag
+    return any((tag[2:] if tag.startswith("W/") else tag) == bare for tag in if_none_match)
+
+def _not_modified(etag):
+    response = HttpResponseNotModified()
+    response["ETag"] = etag
+    return response
+
+def _page_params(request, dataset):
+    """(after key, limit) for a paginated request, None otherwise; ValueError if malformed."""
+    limit, cursor = request.GET.get("limit"), request.GET.get("cursor")
+    if limit is None and cursor is None:
+        return None
+    cfg = _get_config()
+    max_limit = int(cfg.get("page_size_max", 1000))
+    try:
+        limit = int(limit) if limit is not None else int(cfg.get("page_size_default", 200))
+    except ValueError:
+        raise ValueError("limit must be an integer")
+    if limit < 1:
+        raise ValueError("limit must be at least 1")
+    after = decode_cursor(cursor, dataset) if cursor else None
+    return after, min(limit, max_limit)
+
+def _wants_stream(request):
+    # the streamed body is JSON only; msgpack/CBOR clients get the buffered response
+    if negotiate(request.headers.get("Accept")) != JSON:
+        return False
+    flag = request.GET.get("stream")
+    if flag is not None:
+        return flag.lower() in ("1", "true", "yes")
+    return bool(_get_config().get("stream_responses", False))
+
+def _wants_images(request, dataset):
+    return bool(dataset.optional) and request.GET.get("images", "").lower() in ("1", "true", "yes")
+
+def _error_response(request, e):
+    """500 for a failed request; 503 + Retry-After when the DB is shedding load."""
+    if isinstance(e, _ContextUnavailable):
+        e = e.error
+    if isinstance(e, DbOverloaded):
+        logging.warning("⏳ %s (%s %s)", e, request.method, request.path)
+        response = api_response(request, {"status": "error", "detail": str(e),
+                                          "retry_after": e.retry_after}, status=503)
+        response["Retry-After"] = str(e.retry_after)
+        return response
+    return api_response(request, {"status": "error", "detail": str(e)}, status=500)
+
+def _wants_columnar(request):
+    fmt = request.GET.get("format", "json").lower()
+    if fmt not in ("json", "columnar"):
+        raise ValueError("format must be json or columnar")
+    return fmt == "columnar"
+
+def _rows_body(dataset, rows, with_images, columnar):
+    """
+    The rows part of a list response: {"items": [{...}, ...]}, or with
+    ?format=columnar {"format": "columnar", "columns": [...], "items": [[...], ...]}.
+    Asking for images adds a versioned "image_url" to every row.
+    """
+    urls = None
+    if with_images and "image" in dataset.index:
+        code, image = dataset.index["item_code"], dataset.index["image"]
+        urls = [image_url(r[code], r[image]) for r in rows]
+    if columnar:
+        columns, data = dataset.to_columns(rows, with_images)
+        if urls is not None:
+            columns = columns + ("image_url",)
+            for values, url in zip(data, urls):
+                values.append(url)
+        return {"format": "columnar", "columns": list(columns), dataset.name: data}
+    data = dataset.to_dicts(rows, with_images)
+    if urls is not None:
+        for d, url in zip(data, urls):
+            d["image_url"] = url
+    return {dataset.name: data}
+
+def _list_response(request, payload, columnar):
+    # columnar bodies hold only plain json types (see Dataset.to_columns)
+    with phase("json"):
+        return api_response(request, payload, plain=columnar)
+
+def _dataset_response(request, dataset):
+    """
+    Shared body of the master-data list views.
+
+    Sends a weak ETag fingerprint of the rows. A matching If-None-Match gets a
+    304 without serializing; if the fingerprint was seen in the last
+    `etag_ttl` seconds (config.json, default 30) it is answered before even
+    querying the DB.
+
+    ?limit=N[&cursor=...] pages through the rows in natural-key order;
+    the body then carries "next_cursor" (null on the last page).
+
+    ?stream=1 (or "stream_responses": true in config.json) streams the rows
+    in fetchmany batches instead (see streaming.py; no ETag in that mode).
+    Only JSON is streamed; a msgpack/CBOR Accept gets the buffered body.
+
+    ?images=1 adds the opt-in columns (the item image path and image_url).
+
+    ?format=columnar sends one "columns" header and the rows as arrays
+    (never streamed).
+    """
+    try:
+        page = _page_params(request, dataset)
+        columnar = _wants_columnar(request)
+    except ValueError as e:
+        return api_response(request, {"detail": str(e)}, status=400)
+
+    with_images = _wants_images(request, dataset)
+    variant = (".img" if with_images else "") + (".col" if columnar else "")
+    if_none_match = parse_etags(request.headers.get("If-None-Match", ""))
+    filter_key = dataset.filter_key(request.GET)
+    cache_key = (dataset.name, filter_key, page and (tuple(page[0] or ()), page[1]), variant)
+    etag_ttl = float(_get_config().get("etag_ttl", 30))
+
+    try:
+        if if_none_match and etag_ttl > 0:
+            known = fingerprints.get(cache_key)
+            if known and _etag_matches(known, if_none_match):
+                return _not_modified(known)
+        if not page and not columnar and _wants_stream(request):
+            return stream_dataset(dataset, request.GET,
+                                  int(_get_config().get("stream_batch_size", 500)), with_images)
+        rows, version, next_key = dataset.load(request.GET, page)
+        etag = f'W/"{version}{variant}"'
+        fingerprints.put(cache_key, etag, etag_ttl)
+        tracker = None if (filter_key or page) else tracker_for(dataset)
+        if tracker:
+            tracker.observe(rows, version)
+        if if_none_match and _etag_matches(etag, if_none_match):
+            return _not_modified(etag)
+
+        payload = {
+            "status": "success",
+            "count": len(rows),
+            **_rows_body(dataset, rows, with_images, columnar),
+        }
+        if tracker:
+            payload["version"] = version     # pass back as ?since= for a delta
+        if page:
+            payload["next_cursor"] = encode_cursor(next_key) if next_key else None
+        response = _list_response(request, payload, columnar)
+        response["ETag"] = etag
+        response["Cache-Control"] = "no-cache"   # keep the copy, but revalidate
+        return response
+
+    except Exception as e:
+        return _error_response(request, e)
+
+def _delta_response(request, dataset, since):
+    """
+    Only the rows that changed since version `since`:
+        {"mode": "delta", "since": ..., "version": ..., "items": [...], "removed": [...]}
+    Falls back to the full list ("mode": "full") when `since` is unknown or too old.
+    """
+    try:
+        columnar = _wants_columnar(request)
+    except ValueError as e:
+        return api_response(request, {"detail": str(e)}, status=400)
+    tracker = tracker_for(dataset)
+    try:
+        rows, version, _ = dataset.load({})
+        tracker.observe(rows, version)
+        changes = tracker.changes_since(since)
+        if changes is None:
+            selected, removed, mode = rows, [], "full"
+        else:
+            changed, removed = changes
+            ki = tracker.key_index
+            selected = [r for r in rows if r[ki] in changed] if changed else []
+            removed, mode = sorted(removed), "delta"
+
+        response = _list_response(request, {
+            "status": "success",
+            "mode": mode,
+            "since": since,
+            "version": version,
+            "count": len(selected),
+            **_rows_body(dataset, selected, _wants_images(request, dataset), columnar),
+            "removed": removed,
+        }, columnar)
+        response["Cache-Control"] = "no-cache"
+        return response
+
+    except Exception as e:
+        return _error_response(request, e)
+
+
 # ------------------ endpoints ------------------
 @csrf_exempt
 @require_http_methods(["POST"])
@@ -89,13 +317,13 @@ def pair_check(request):
     try:
         data = json.loads(request.body or b"{}")
     except Exception:
-        return JsonResponse({"detail": "Invalid JSON"}, status=400)
+        return api_response(request, {"detail": "Invalid JSON"}, status=400)
 
-    logging.info("📱 Pair check request from: %s", data)
+    logging.info("📱 Pair check request from: %s", request.META.get("REMOTE_ADDR"))
 
     if data.get("password") != PAIR_PASSWORD:
         logging.error("❌ Invalid password")
-        return JsonResponse({"detail": "Invalid password"}, status=401)
+        return api_response(request, {"detail": "Invalid password"}, status=401)
 
     exe_name = "SyncService.exe"
     base_dir = os.path.dirname(sys.executable) if getattr(sys, "frozen", False) else os.path.dirname(os.path.abspath(__file__))
@@ -103,23 +331,24 @@ def pair_check(request):
 
     if not os.path.exists(exe_path):
         logging.error("❌ SyncService.exe not found at %s", exe_path)
-        return JsonResponse({"detail": "SyncService.exe not found"}, status=404)
-
-    for proc in psutil.process_iter(["pid", "name"]):
-        try:
-            if proc.info["name"] and "SyncService.exe" in proc.info["name"]:
-                logging.info("🔄 SyncService already running (PID %s)", proc.info["pid"])
-                return JsonResponse({"status": "success", "message": "SyncService already running", "pair_successful": True})
-        except Exception:
-            continue
+        return api_response(request, {"detail": "SyncService.exe not found"}, status=404)
 
+    supervisor = get_supervisor([exe_path], base_dir)
     try:
-        subprocess.Popen([exe_path], cwd=base_dir)
-        logging.info("✅ SyncService started")
-        return JsonResponse({"status": "success", "message": "SyncService launched successfully", "pair_successful": True})
+        outcome, health = supervisor.ensure_running()
     except Exception as e:
         logging.error("❌ Failed to start SyncService: %s", e)
-        return JsonResponse({"detail": f"Failed to start sync service: {e}"}, status=500)
+        return api_response(request, {"detail": f"Failed to start sync service: {e}"}, status=500)
+
+    if outcome == "launched":
+        message = "SyncService launched successfully"
+    elif outcome == "busy":
+        message = "SyncService is being started"
+    else:
+        logging.info("🔄 SyncService already running (PID %s)", health["pid"])
+        message = "SyncService already running"
+    return api_response(request, {"status": "success", "message": message, "pair_successful": True,
+                                  "service": health})
 
 
 @csrf_exempt
@@ -136,47 +365,49 @@ def login(request):
         userid = (data.get("userid") or "").strip()
         password = (data.get("password") or "").strip()
     except Exception:
-        return JsonResponse({"detail": "Invalid JSON"}, status=400)
+        return api_response(request, {"detail": "Invalid JSON"}, status=400)
 
     if not userid or not password:
-        return JsonResponse({"detail": "userid & password required"}, status=400)
+        return api_response(request, {"detail": "userid & password required"}, status=400)
 
     logging.info("🔐 Login attempt for user: %s", userid)
 
     try:
-        conn = get_connection()
-        cur = conn.cursor()
-        # SQL Anywhere compatible positional parameters (?)
-        cur.execute("SELECT id, pass FROM acc_users WHERE id = ? AND pass = ?", (userid, password))
-        row = cur.fetchone()
+        with db_cursor() as cur:
+            # SQL Anywhere compatible positional parameters (?)
+            cur.execute("SELECT id, pass FROM acc_users WHERE id = ? AND pass = ?", (userid, password))
+            row = cur.fetchone()
+        context = user_contexts.load(userid) if row else None
+    except DbOverloaded as busy:
+        return _error_response(request, busy)
     except Exception as dbx:
         logging.exception("DB error during login")
-        return JsonResponse({"detail": f"DB error: {dbx}"}, status=500)
-    finally:
-        try:
-            cur.close(); conn.close()
-        except Exception:
-            pass
+        return api_response(request, {"detail": f"DB error: {dbx}"}, status=500)
 
     if not row:
         logging.warning("❌ Invalid credentials")
-        return JsonResponse({"detail": "Invalid credentials"}, status=401)
+        return api_response(request, {"detail": "Invalid credentials"}, status=401)
 
-    payload = {"sub": userid, "exp": datetime.utcnow() + timedelta(days=7)}
+    payload = {"sub": userid, "iat": time.time(), "exp": datetime.utcnow() + timedelta(days=7),
+               **context.claims()}
+    import jwt
     token = jwt.encode(payload, JWT_SECRET, algorithm=JWT_ALGO)
     # PyJWT v2 returns a str already; in v1 it may be bytes
     if isinstance(token, bytes):
         token = token.decode("utf-8")
 
     logging.info("✅ Login successful")
-    return JsonResponse({"status": "success", "message": "Login successful", "user_id": row[0], "token": token})
+    return api_response(request, {"status": "success", "message": "Login successful", "user_id": row[0], "token": token,
+                                  "settings": list(context.settings)})
 
 
 @jwt_required
 @require_http_methods(["GET"])
 def verify_token(request):
     logging.info("✅ Token verified for user: %s", request.userid)
-    return JsonResponse({"status": "success", "userid": request.userid})
+    ctx = request.user_context
+    return api_response(request, {"status": "success", "userid": request.userid,
+                                  "settings": list(ctx.settings), "settings_digest": ctx.digest})
 
 
 
@@ -188,7 +419,7 @@ def get_status(request):
     cfg = _get_config()
     primary = cfg.get("ip", "unknown")
     all_ips = cfg.get("all_ips", [])
-    return JsonResponse({
+    return api_response(request, {
         "status": "online",
         "message": "SyncAnywhere server is running",
         "primary_ip": primary,
@@ -196,6 +427,7 @@ def get_status(request):
         "connection_urls": [f"http://{ip}:8000" for ip in all_ips],
         "pair_password_hint": f"Password starts with: {PAIR_PASSWORD[:3]}...",
         "server_time": datetime.now().isoformat(),
+        "db_admission": get_limiter().stats(),     # queue depth, waits, 503s
         "instructions": {
             "mobile_setup": "Try connecting to any of the URLs listed in 'connection_urls'",
             "troubleshooting": [
@@ -211,90 +443,64 @@ def get_status(request):
 @jwt_required
 @require_http_methods(["GET"])
 def get_items(request):
-    item_code = request.GET.get("item_code")
+    """
+    GET /items/
+    GET /items/?item_code=I001
+    GET /items/?since=<version>   only items added/changed/removed since that version
+    GET /items/?limit=100&cursor=<next_cursor>
+    GET /items/?images=1                 include "image" and "image_url"
+    GET /items/?format=columnar          {"columns": [...], "items": [[...], ...]}
+    """
+    since = request.GET.get("since")
+    if since is not None and not request.GET.get("item_code"):
+        return _delta_response(request, ITEMS, since)
+    return _dataset_response(request, ITEMS)
 
-    try:
-        conn = get_connection()
-        cur = conn.cursor()
-
-        if item_code:
-            cur.execute("""
-                SELECT
-                    i.item_code,
-                    i.item_name,
-                    i.rate,
-                    i.rate1,
-                    i.rate2,
-                    i.kitchen,
-                    i.activity,
-                    i.image,
-                    c.name,
-                    i.taxper,
-                    i.longname
-                FROM tb_item_master i
-                LEFT JOIN dine_itemcategory c
-                    ON i.category = c.code
-                WHERE i.item_code = ?
-            """, (item_code,))
-        else:
-            cur.execute("""
-                SELECT
-                    i.item_code,
-                    i.item_name,
-                    i.rate,
-                    i.rate1,
-                    i.rate2,
-                    i.kitchen,
-                    i.activity,
-                    i.image,
-                    c.name,
-                    i.taxper,
-                    i.longname
-                FROM tb_item_master i
-                LEFT JOIN dine_itemcategory c
-                    ON i.category = c.code
-            """)
-
-        rows = cur.fetchall()
-
-        data = []
-        for r in rows:
-            data.append({
-                "item_code": r[0],
-                "item_name": r[1],
-                "rate": r[2],
-                "rate1": r[3],
-                "rate2": r[4],
-                "kitchen": r[5],
-                "activity": r[6],
-                "image": r[7],
-
-                # ✅ ONLY CATEGORY NAME
-                "category": r[8],
-
-                "taxper": r[9],
-                "longname": r[10]
-            })
-
-        return JsonResponse({
-            "status": "success",
-            "count": len(data),
-            "items": data
-        })
 
-    except Exception as e:
-        return JsonResponse(
-            {"status": "error", "detail": str(e)},
-            status=500
-        )
+@jwt_required
+@require_http_methods(["GET"])
+def get_item_image(request, item_code):
+    """
+    GET /items/<code>/image?v=<digest>             original file
+    GET /items/<code>/image?v=<digest>&size=256    thumbnail (size from "image_sizes")
+    With the current ?v= the response may be cached forever; a stale ?v=
+    redirects to the current URL.
+    """
+    size = request.GET.get("size")
+    if size is not None:
+        try:
+            size = int(size)
+        except ValueError:
+            size = None
+        if size not in allowed_sizes():
+            return api_response(request, {"detail": "Unsupported size", "sizes": allowed_sizes()}, status=400)
 
-    finally:
+    try:
+        rows, _, _ = ITEMS.load({"item_code": item_code})
+        if not rows:
+            return api_response(request, {"detail": "Item not found"}, status=404)
         try:
-            cur.close()
-            conn.close()
-        except Exception:
-            pass
+            path, content_type, version = image_file(rows[0][ITEMS.index["image"]], size)
+        except ImageNotFound:
+            return api_response(request, {"detail": "Image not found"}, status=404)
 
+        requested = request.GET.get("v")
+        if requested and requested != version:
+            url = f"/items/{item_code}/image?v={version}" + (f"&size={size}" if size else "")
+            return HttpResponseRedirect(url)
+
+        etag = f'"{version}-{size or 0}"'
+        if_none_match = parse_etags(request.headers.get("If-None-Match", ""))
+        if if_none_match and _etag_matches(etag, if_none_match):
+            return _not_modified(etag)
+
+        response = FileResponse(open(path, "rb"), content_type=content_type)
+        response["ETag"] = etag
+        response["Cache-Control"] = "public, max-age=31536000, immutable" if requested else "no-cache"
+        return response
+
+    except Exception as e:
+        return _error_response(request, e)
 
 
 @jwt_required
@@ -303,62 +509,10 @@ def get_dine_tables(request):
     """
     GET /dine-tables/
     GET /dine-tables/?tableno=T01
+    GET /dine-tables/?limit=50&cursor=<next_cursor>
     """
+    return _dataset_response(request, DINE_TABLES)
 
-    tableno = request.GET.get("tableno")
-
-    try:
-        conn = get_connection()
-        cur = conn.cursor()
-
-        if tableno:
-            # 🔹 Particular table
-            cur.execute("""
-                SELECT
-                    tableno,
-                    description,
-                    section
-                FROM dine_tables
-                WHERE tableno = ?
-            """, (tableno,))
-        else:
-            # 🔹 All tables
-            cur.execute("""
-                SELECT
-                    tableno,
-                    description,
-                    section
-                FROM dine_tables
-            """)
-
-        rows = cur.fetchall()
-
-        data = []
-        for r in rows:
-            data.append({
-                "tableno": r[0],
-                "description": r[1],
-                "section": r[2]
-            })
-
-        return JsonResponse({
-            "status": "success",
-            "count": len(data),
-            "tables": data
-        })
-
-    except Exception as e:
-        return JsonResponse(
-            {"status": "error", "detail": str(e)},
-            status=500
-        )
-
-    finally:
-        try:
-            cur.close()
-            conn.close()
-        except Exception:
-            pass
 
 @jwt_required
 @require_http_methods(["GET"])
@@ -366,117 +520,167 @@ def get_user_settings(request):
     """
     GET /user-settings/
     GET /user-settings/?uid=USER01
+    GET /user-settings/?limit=200&cursor=<next_cursor>
+    """
+    return _dataset_response(request, USER_SETTINGS)
+
+
+@jwt_required
+@require_http_methods(["GET"])
+def get_dine_categories(request):
+    """
+    GET /dine-categories/
+    GET /dine-categories/?catagorycode=FD
     """
+    return _dataset_response(request, DINE_CATEGORIES)
 
-    uid = request.GET.get("uid")
 
+@jwt_required
+@require_http_methods(["GET"])
+def get_bootstrap(request):
+    """
+    GET /bootstrap/            (settings of the logged-in user)
+    GET /bootstrap/?uid=USER02
+    items + tables + categories + settings in one response, queried in
+    parallel. "versions" holds each section's fingerprint (the items one
+    works as /items/?since=...); the ETag covers all four.
+    """
+    uid = request.GET.get("uid") or request.userid
+    sections = [(ITEMS, {}), (DINE_TABLES, {}), (DINE_CATEGORIES, {}), (USER_SETTINGS, {"uid": uid})]
     try:
-        conn = get_connection()
-        cur = conn.cursor()
-
-        if uid:
-            # 🔹 Particular user
-            cur.execute("""
-                SELECT
-                    uid,
-                    code
-                FROM acc_userssettings
-                WHERE uid = ?
-            """, (uid,))
-        else:
-            # 🔹 All users settings
-            cur.execute("""
-                SELECT
-                    uid,
-                    code
-                FROM acc_userssettings
-            """)
-
-        rows = cur.fetchall()
-
-        data = []
-        for r in rows:
-            data.append({
-                "uid": r[0],
-                "code": r[1]
-            })
-
-        return JsonResponse({
-            "status": "success",
-            "count": len(data),
-            "settings": data
-        })
+        loaded = load_sections(sections)
+        versions = {name: version for name, (_, version) in loaded.items()}
+        for dataset, params in sections:
+            tracker = None if params else tracker_for(dataset)
+            if tracker:
+                tracker.observe(*loaded[dataset.name])
+        etag = 'W/"%s"' % fingerprint(sorted(versions.items()))
+        if_none_match = parse_etags(request.headers.get("If-None-Match", ""))
+        if if_none_match and _etag_matches(etag, if_none_match):
+            return _not_modified(etag)
+
+        payload = {"status": "success", "uid": uid, "versions": versions}
+        for dataset, _ in sections:
+            payload[dataset.name] = dataset.to_dicts(loaded[dataset.name][0])
+        with phase("json"):
+            response = api_response(request, payload)
+        response["ETag"] = etag
+        response["Cache-Control"] = "no-cache"
+        return response
 
     except Exception as e:
-        return JsonResponse(
-            {"status": "error", "detail": str(e)},
-            status=500
-        )
+        return _error_response(request, e)
 
-    finally:
-        try:
-            cur.close()
-            conn.close()
-        except Exception:
-            pass
+
+# Accepted names for /cache/invalidate: dataset names plus the URL spellings
+CACHE_RESOURCES = {
+    **{name: name for name in DATASETS},
+    "dine-tables": DINE_TABLES.name,
+    "user-settings": USER_SETTINGS.name,
+    "dine-categories": DINE_CATEGORIES.name,
+}
 
 
+@csrf_exempt
 @jwt_required
-@require_http_methods(["GET"])
-def get_dine_categories(request):
+@require_http_methods(["POST"])
+def submit_kot(request):
     """
-    GET /dine-categories/
-    GET /dine-categories/?catagorycode=FD
+    POST /kot/   Idempotency-Key: <client-generated id>
+    { "tableno": "T01", "lines": [ {"item_code": "I00001", "qty": 2, "notes": ""} ] }
+    201 with the stored ticket; a retry with the same key answers 200 with
+    the same ticket ("duplicate": true). See kot.py.
     """
+    try:
+        data = json.loads(request.body or b"{}")
+    except Exception:
+        return api_response(request, {"detail": "Invalid JSON"}, status=400)
+    if not isinstance(data, dict):
+        return api_response(request, {"detail": "Invalid JSON"}, status=400)
+
+    try:
+        key = idempotency_key(request, data)
+        ticket, duplicate = submit_order(request.userid, key, data)
+    except KotInvalid as e:
+        return api_response(request, {"detail": str(e)}, status=400)
+    except KotConflict as e:
+        return api_response(request, {"detail": str(e)}, status=409)
+    except DbOverloaded as busy:
+        return _error_response(request, busy)
+    except Exception as e:
+        logging.exception("❌ KOT submission failed")
+        return _error_response(request, e)
+    return api_response(request, {"status": "success", "duplicate": duplicate, "kot": ticket},
+                        status=200 if duplicate else 201)
 
-    catagorycode = request.GET.get("catagorycode")
 
+@csrf_exempt
+@jwt_required
+@require_http_methods(["POST"])
+def invalidate_cache(request):
+    """
+    POST /cache/invalidate  { "resource": "items" }   (omit resource = everything)
+    POST /cache/invalidate  { "resource": "settings", "uid": "USER02" }
+    Call after editing the menu/tables so tablets see the change right away;
+    "settings" also makes existing tokens re-read the user's settings codes.
+    """
     try:
-        conn = get_connection()
-        cur = conn.cursor()
-
-        if catagorycode:
-            # 🔹 Particular category
-            cur.execute("""
-                SELECT
-                    catagorycode,
-                    name
-                FROM dine_catagory
-                WHERE catagorycode = ?
-            """, (catagorycode,))
-        else:
-            # 🔹 All categories
-            cur.execute("""
-                SELECT
-                    catagorycode,
-                    name
-                FROM dine_catagory
-            """)
-
-        rows = cur.fetchall()
-
-        data = []
-        for r in rows:
-            data.append({
-                "catagorycode": r[0],
-                "name": r[1]
-            })
-
-        return JsonResponse({
-            "status": "success",
-            "count": len(data),
-            "categories": data
-        })
+        data = json.loads(request.body or b"{}")
+    except Exception:
+        return api_response(request, {"detail": "Invalid JSON"}, status=400)
+    if not isinstance(data, dict):
+        return api_response(request, {"detail": "Invalid JSON"}, status=400)
+
+    resource = data.get("resource") or request.GET.get("resource")
+    name = None
+    if resource:
+        name = CACHE_RESOURCES.get(resource)
+        if name is None:
+            return api_response(request, {"detail": f"Unknown resource: {resource}",
+                                          "resources": sorted(CACHE_RESOURCES)}, status=400)
+
+    removed = master_cache.invalidate(name)
+    fingerprints.clear(name)
+    if name in (None, USER_SETTINGS.name):
+        user_contexts.invalidate(data.get("uid") or None)
+    logging.info("🧹 Cache invalidated by %s: %s (%d entries)", request.userid, name or "all", removed)
+    return api_response(request, {
+        "status": "success",
+        "invalidated": name or "all",
+        "entries_removed": removed,
+        "cache": master_cache.stats(),
+        "user_contexts": user_contexts.stats(),
+    })
 
-    except Exception as e:
-        return JsonResponse(
-            {"status": "error", "detail": str(e)},
-            status=500
-        )
 
-    finally:
-        try:
-            cur.close()
-            conn.close()
-        except Exception:
-            pass
+@jwt_required
+@require_http_methods(["GET"])
+def cache_stats(request):
+    """GET /cache/stats - entries, bytes and hit/miss counters per dataset"""
+    return api_response(request, {"status": "success", "cache": master_cache.stats(),
+                                  "user_contexts": user_contexts.stats()})
+
+
+@jwt_required
+@require_http_methods(["GET"])
+def query_stats_view(request):
+    """
+    GET /db/queries?top=20&sort=total - slowest query fingerprints (ms)
+    sort: total | avg | max | calls; "slow" lists the latest slow-query log entries.
+    """
+    sort = request.GET.get("sort", "total")
+    if sort not in ("total", "avg", "max", "calls"):
+        return api_response(request, {"detail": "sort must be total, avg, max or calls"}, status=400)
+    try:
+        top = max(1, int(request.GET.get("top", 20)))
+    except ValueError:
+        return api_response(request, {"detail": "top must be an integer"}, status=400)
+    queries = query_stats.top(top, sort)
+    return api_response(request, {"status": "success", "count": len(queries), "queries": queries,
+                                  "slow": list(query_stats.slow)})
+
+
+@require_http_methods(["GET"])
+def get_metrics(request):
+    """GET /metrics - request counters, latency histograms and pool/cache gauges (Prometheus text)"""
+    return HttpResponse(metrics.render(), content_type=METRICS_CONTENT_TYPE)